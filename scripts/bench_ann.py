@@ -0,0 +1,68 @@
+# scripts/bench_ann.py
+"""
+Recall@k vs latency of the local IVF index against exact search.
+
+    python scripts/bench_ann.py                        # synthetic clustered vectors
+    python scripts/bench_ann.py --archive              # latest embeddings archive snapshot
+    python scripts/bench_ann.py --n 200000 --nprobe 1 4 16 64
+"""
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+
+from src.ann_index import IVFIndex
+from src.local_index import LocalVectorIndex
+
+
+def synthetic(n: int, dim: int, clusters: int, seed: int = 0) -> LocalVectorIndex:
+    """Gaussian blobs on the unit sphere, roughly like topic-clustered embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vecs = centers[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return LocalVectorIndex([f"id{i}" for i in range(n)], vecs)
+
+
+def _timed(fn, queries, k):
+    out, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        out.append({r["id"] for r in fn(q, k)})
+        lat.append((time.perf_counter() - t0) * 1000)
+    return out, np.array(lat)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--archive", action="store_true", help="benchmark the latest archive snapshot")
+    ap.add_argument("--n", type=int, default=50000)
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--clusters", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--nlist", type=int, default=0, help="0 = 4*sqrt(n)")
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    args = ap.parse_args()
+
+    base = LocalVectorIndex.load_from_archive() if args.archive else synthetic(args.n, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    # held-out style queries: perturbed copies of indexed vectors
+    queries = base.vectors[rng.choice(len(base), args.queries)] + 0.05 * rng.normal(size=(args.queries, base.dim))
+
+    t0 = time.perf_counter()
+    ivf = IVFIndex.build(base, nlist=args.nlist or None)
+    print(f"vectors={len(base)} dim={base.dim} nlist={ivf.nlist} build={time.perf_counter() - t0:.1f}s")
+
+    truth, exact_ms = _timed(lambda q, k: base.search(q, top_k=k), queries, args.k)
+    print(f"{'exact':>10}  recall@{args.k}=1.000  p50={np.percentile(exact_ms, 50):7.2f}ms"
+          f"  p99={np.percentile(exact_ms, 99):7.2f}ms")
+    for nprobe in args.nprobe:
+        found, ms = _timed(lambda q, k: ivf.search(q, top_k=k, nprobe=nprobe), queries, args.k)
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        print(f"{'nprobe=' + str(nprobe):>10}  recall@{args.k}={recall:.3f}  p50={np.percentile(ms, 50):7.2f}ms"
+              f"  p99={np.percentile(ms, 99):7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
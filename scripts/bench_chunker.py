@@ -0,0 +1,81 @@
+# scripts/bench_chunker.py
+"""
+Splitting throughput (MB/s) of src.chunker against LangChain's
+RecursiveCharacterTextSplitter, for one large text and for many page-sized documents.
+
+    python scripts/bench_chunker.py                     # ~20 MB of synthetic prose
+    python scripts/bench_chunker.py --file big.txt --parallel 4
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src import chunker
+from src.config import settings
+
+WORDS = ["contract", "termination", "notice", "party", "policy", "retention", "data", "the", "of", "and",
+         "shall", "within", "days", "written", "agreement", "security", "access", "review", "a", "to"]
+
+
+def synthetic(mb: float, seed: int = 0) -> str:
+    """Paragraphs of a few lines each, roughly like extracted PDF / DOCX text."""
+    rng = random.Random(seed)
+    paras, size = [], 0
+    while size < mb * 1024 * 1024:
+        lines = [" ".join(rng.choices(WORDS, k=rng.randint(6, 24))) + "." for _ in range(rng.randint(1, 6))]
+        paras.append("\n".join(lines))
+        size += len(paras[-1]) + 2
+    return "\n\n".join(paras)
+
+
+def _timed(label: str, fn, mb: float, repeat: int):
+    best, chunks = float("inf"), 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        chunks = len(fn())
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<34} {mb / best:8.1f} MB/s  {chunks} chunks  {best * 1000:.0f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--file", help="UTF-8 text file to split (default: synthetic text)")
+    ap.add_argument("--mb", type=float, default=20, help="size of the synthetic text")
+    ap.add_argument("--chunk-size", type=int, default=1000)
+    ap.add_argument("--overlap", type=int, default=120)
+    ap.add_argument("--parallel", type=int, default=0, help="also time the process pool with this many workers")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = synthetic(args.mb)
+    mb = len(text.encode("utf-8")) / (1024 * 1024)
+    pages = [{"page_content": p, "metadata": {"source": "bench", "page": i}}
+             for i, p in enumerate(text[i:i + 3000] for i in range(0, len(text), 3000))]
+    print(f"{mb:.1f} MB, {len(pages)} pages of 3000 chars, chunk_size={args.chunk_size} overlap={args.overlap}")
+
+    lc = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.overlap,
+                                        separators=list(chunker.SEPARATORS))
+    _timed("langchain split_text", lambda: lc.split_text(text), mb, args.repeat)
+    _timed("chunker.split_text", lambda: chunker.split_text(text, args.chunk_size, args.overlap), mb, args.repeat)
+    _timed("langchain split_documents (pages)",
+           lambda: lc.split_documents([type("Doc", (), p) for p in pages]), mb, args.repeat)
+    _timed("chunker.split_documents (pages)",
+           lambda: chunker.split_documents(pages, args.chunk_size, args.overlap), mb, args.repeat)
+
+    if args.parallel:
+        settings.CHUNK_PARALLEL_WORKERS = args.parallel
+        settings.CHUNK_PARALLEL_MIN_CHARS = 1
+        chunker.split_text("warm\n\nup " * 10, args.chunk_size, args.overlap)   # start the workers
+        _timed(f"chunker.split_text ({args.parallel} processes)",
+               lambda: chunker.split_text(text, args.chunk_size, args.overlap), mb, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# scripts/bench_search.py
+"""
+Load generator for the query API: fires GET /search at a fixed concurrency and
+reports throughput and latency percentiles.
+
+    python scripts/bench_search.py --url http://localhost:8000 --concurrency 64 --requests 2000
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+DEFAULT_QUERIES = [
+    "What is the refund policy?",
+    "How do I reset my password?",
+    "Quarterly revenue by region",
+    "Onboarding checklist for new employees",
+    "Data retention requirements",
+]
+
+
+def _pct(sorted_ms, p):
+    return sorted_ms[min(len(sorted_ms) - 1, int(round(p / 100 * (len(sorted_ms) - 1))))]
+
+
+async def _worker(client, url, queries, k, remaining, latencies, errors):
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        t0 = time.perf_counter()
+        try:
+            r = await client.get(url, params={"q": random.choice(queries), "k": k})
+            r.raise_for_status()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except httpx.HTTPError:
+            errors[0] += 1
+
+
+async def run(url, concurrency, total, k, queries):
+    latencies, errors, remaining = [], [0], [total]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_worker(client, f"{url.rstrip('/')}/search", queries, k,
+                                       remaining, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    print(f"requests={total} concurrency={concurrency} errors={errors[0]} elapsed={elapsed:.1f}s "
+          f"throughput={len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print(f"latency ms: mean={statistics.mean(latencies):.1f} p50={_pct(latencies, 50):.1f} "
+              f"p90={_pct(latencies, 90):.1f} p99={_pct(latencies, 99):.1f} max={latencies[-1]:.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://localhost:8000")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--queries-file", help="one query per line (default: a few built-in queries)")
+    args = ap.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    asyncio.run(run(args.url, args.concurrency, args.requests, args.k, queries))
+
+
+if __name__ == "__main__":
+    main()
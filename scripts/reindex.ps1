@@ -0,0 +1,2 @@
+# Rebuilds the search index from the embeddings archive (no re-embedding) inside the running container
+docker compose exec vector-pipeline python -m src.reindex @args
@@ -0,0 +1,233 @@
+# src/ann_index.py
+from __future__ import annotations
+import json
+import logging
+import math
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from azure.core.exceptions import ResourceNotFoundError
+
+from .config import settings
+from .archive_store import list_archive_blobs
+from .blob_store import get_container_client
+from .kmeans import nearest_centroid, train_kmeans
+from .local_index import LocalVectorIndex
+from .search_index import FILTERABLE_FIELDS
+
+log = logging.getLogger("ann_index")
+
+# text columns are stored as UTF-8 bytes plus (start, end) spans per row; start -1 = None
+_TEXT_COLUMNS = ("contents", *FILTERABLE_FIELDS)
+# meta.json last: it is written after (and names the build of) every other file
+_FILES = ("vectors.npy", "centroids.npy", "offsets.npy", "ids.npy",
+          *(f"{c}{ext}" for c in _TEXT_COLUMNS for ext in (".bin", ".spans.npy")), "meta.json")
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over a LocalVectorIndex. Vectors are clustered with
+    k-means into `nlist` lists and stored list by list, so a query scores the
+    `nprobe` closest centroids and then only the rows of those lists (contiguous
+    slices, which stay cheap when the vectors are memory-mapped from disk).
+    Larger nprobe → higher recall, slower queries; nprobe = nlist is exact search.
+
+    The lists are never rewritten after build: rows added later (upserts, newer archive
+    partitions) go to `delta`, a small exact index searched alongside, and rows deleted
+    or replaced are masked out of the lists. A persisted index records the snapshot
+    files it was built from and is rebuilt once its partition lists other files.
+    """
+
+    def __init__(self, base: LocalVectorIndex, centroids: np.ndarray, offsets: np.ndarray, nprobe: int | None = None):
+        self.base = base            # rows ordered by list
+        self.centroids = centroids
+        self.offsets = offsets      # list l holds rows offsets[l]:offsets[l + 1]
+        self.nprobe = nprobe or settings.ANN_NPROBE
+        self.delta = LocalVectorIndex([], np.zeros((0, base.vectors.shape[1]), dtype=np.float32))
+        self.removed = np.zeros(len(base), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.base) - int(self.removed.sum()) + len(self.delta)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, base: LocalVectorIndex, nlist: int | None = None, nprobe: int | None = None,
+              iters: int = 20, seed: int = 0) -> "IVFIndex":
+        """nlist defaults to ANN_NLIST, or 4·√n when that is 0."""
+        if not len(base):
+            return cls(base, np.zeros((0, base.vectors.shape[1]), dtype=np.float32), np.zeros(1, dtype=np.int64), nprobe)
+        nlist = nlist or settings.ANN_NLIST or int(4 * math.sqrt(len(base)))
+        centroids = train_kmeans(base.vectors, nlist, iters=iters, seed=seed)
+        index = cls(base, centroids, np.zeros(len(centroids) + 1, dtype=np.int64), nprobe)
+        index._assign()
+        return index
+
+    def _assign(self):
+        """Puts every row into its closest list and re-orders the base rows list by list."""
+        assign = nearest_centroid(self.base.vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        self.base = self.base.take(order)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=self.nlist)))).astype(np.int64)
+
+    # ── queries ──────────────────────────────────────────────────────────────────
+    def probe_rows(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = max(1, min(nprobe, self.nlist))
+        lists = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        return np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+
+    def search(self, query_vector, top_k: int = 5, filters: dict | None = None, nprobe: int | None = None) -> List[dict]:
+        q = self.base.unit_query(query_vector)
+        if q is None or not len(self):
+            return []
+        hits = []
+        if len(self.base):
+            rows = self.probe_rows(q, nprobe or self.nprobe)
+            rows = rows[~self.removed[rows]]
+            mask = self.base.filter_mask(filters)
+            if mask is not None:
+                rows = rows[mask[rows]]
+            hits = self.base.top_k(q, rows, top_k)
+        if len(self.delta):
+            hits = sorted(hits + self.delta.search(q, top_k, filters), key=lambda h: -h["score"])[:top_k]
+        return hits
+
+    # ── updates (go to the exact delta index; the persisted lists stay read-only) ─
+    def _mask(self, ids) -> int:
+        rows = [self.base._pos[i] for i in ids if i in self.base._pos]
+        rows = [r for r in rows if not self.removed[r]]
+        self.removed[rows] = True
+        return len(rows)
+
+    def upsert(self, items) -> int:
+        n = self.delta.upsert(items)
+        self._mask(self.delta.ids)
+        return n
+
+    def delete(self, ids) -> int:
+        ids = list(ids)
+        return self._mask(ids) + self.delta.delete(ids)
+
+    def merge(self, newer: LocalVectorIndex) -> int:
+        """Adds (or replaces) the rows of another index, e.g. partitions written after this one."""
+        if not len(newer):
+            return 0
+        self.delta = LocalVectorIndex.concat([self.delta, newer])
+        self._mask(newer.ids)
+        return len(newer)
+
+    # ── persistence ──────────────────────────────────────────────────────────────
+    def save(self, directory: str | Path, files: List[str] | None = None):
+        """
+        Writes the built lists; rows in `delta` are not persisted (they come from newer partitions).
+        `files` are the archive files the index was built from (see for_partition).
+        """
+        d = Path(directory)
+        d.mkdir(parents=True, exist_ok=True)
+        (d / "meta.json").unlink(missing_ok=True)
+        np.save(d / "vectors.npy", np.ascontiguousarray(self.base.vectors, dtype=np.float32))
+        np.save(d / "centroids.npy", self.centroids.astype(np.float32))
+        np.save(d / "offsets.npy", self.offsets)
+        np.save(d / "ids.npy", self.base.ids.astype(str))
+        _save_text(d, "contents", self.base.contents)
+        for f in FILTERABLE_FIELDS:
+            _save_text(d, f, self.base.columns[f])
+        (d / "meta.json").write_text(json.dumps({"version": 2, "nprobe": self.nprobe, "files": files}),
+                                     encoding="utf-8")
+
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> "IVFIndex":
+        """Opens a saved index; with mmap the vectors stay on disk and are paged in per probed list."""
+        d = Path(directory)
+        meta = _read_meta(d)
+        base = LocalVectorIndex.from_arrays(
+            np.load(d / "ids.npy").astype(object),
+            np.load(d / "vectors.npy", mmap_mode="r" if mmap else None),
+            {f: _load_text(d, f) for f in FILTERABLE_FIELDS},
+            _load_text(d, "contents"),
+        )
+        return cls(base, np.load(d / "centroids.npy"), np.load(d / "offsets.npy"), meta.get("nprobe"))
+
+    @staticmethod
+    def _blob_prefix(partition: str) -> str:
+        # next to the snapshot it was built from
+        return f"embeddings-archive/ann/{partition.strip('/')}/"
+
+    def save_to_blob(self, partition: str, directory: str | Path, files: List[str] | None = None):
+        self.save(directory, files)
+        cc = get_container_client()
+        for name in _FILES:
+            with open(Path(directory) / name, "rb") as f:
+                cc.get_blob_client(self._blob_prefix(partition) + name).upload_blob(
+                    f, overwrite=True, max_concurrency=settings.BLOB_DOWNLOAD_CONCURRENCY)
+
+    @classmethod
+    def load_from_blob(cls, partition: str, directory: str | Path, files: List[str] | None = None) -> "IVFIndex":
+        """
+        Downloads the index files once into `directory` (reused on restart) and memory-maps them.
+        With `files`, an index built from other archive files counts as missing
+        (ResourceNotFoundError), locally and in Blob.
+        """
+        d = Path(directory)
+        if not (all((d / name).exists() for name in _FILES) and _built_from(_read_meta(d), files)):
+            cc = get_container_client()
+            prefix = cls._blob_prefix(partition)
+            if not _built_from(json.loads(cc.get_blob_client(prefix + "meta.json").download_blob().readall()), files):
+                raise ResourceNotFoundError(f"IVF index of {partition} was built from other archive files")
+            d.mkdir(parents=True, exist_ok=True)
+            (d / "meta.json").unlink(missing_ok=True)
+            for name in _FILES:
+                with open(d / name, "wb") as f:
+                    cc.get_blob_client(prefix + name).download_blob(
+                        max_concurrency=settings.BLOB_DOWNLOAD_CONCURRENCY).readinto(f)
+        return cls.load(d)
+
+    @classmethod
+    def for_partition(cls, partition: str) -> "IVFIndex":
+        """
+        The persisted index of an archive snapshot, built (and persisted) on first use and
+        again whenever later runs have added files to the partition.
+        """
+        directory = Path(settings.ANN_CACHE_DIR) / partition.strip("/")
+        fmt = settings.LOCAL_INDEX_ARCHIVE_FORMAT
+        files = list_archive_blobs(fmt, partition)
+        try:
+            return cls.load_from_blob(partition, directory, files)
+        except ResourceNotFoundError:
+            for name in _FILES:
+                (directory / name).unlink(missing_ok=True)
+        log.info("No current IVF index for %s; building it from the archive", partition)
+        index = cls.build(LocalVectorIndex.load_from_archive(partition, fmt))
+        index.save_to_blob(partition, directory, files)
+        log.info("Built IVF index: %d vectors in %d lists", len(index), index.nlist)
+        return cls.load(directory)
+
+
+def _read_meta(d: Path) -> dict:
+    return json.loads((d / "meta.json").read_text(encoding="utf-8"))
+
+
+def _built_from(meta: dict, files: List[str] | None) -> bool:
+    return files is None or meta.get("files") == files
+
+
+def _save_text(d: Path, name: str, values: np.ndarray):
+    encoded = [None if v is None else str(v).encode("utf-8") for v in values]
+    lengths = np.fromiter((0 if b is None else len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    starts[[b is None for b in encoded]] = -1
+    np.save(d / f"{name}.spans.npy", np.stack([starts, ends], axis=1) if len(encoded) else np.zeros((0, 2), np.int64))
+    (d / f"{name}.bin").write_bytes(b"".join(b for b in encoded if b))
+
+
+def _load_text(d: Path, name: str) -> np.ndarray:
+    spans = np.load(d / f"{name}.spans.npy")
+    data = (d / f"{name}.bin").read_bytes()
+    out = np.empty(len(spans), dtype=object)
+    for i, (start, end) in enumerate(spans.tolist()):
+        out[i] = None if start < 0 else data[start:end].decode("utf-8")
+    return out
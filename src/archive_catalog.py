@@ -0,0 +1,195 @@
+# src/archive_catalog.py
+from __future__ import annotations
+import json
+import logging
+import datetime as dt
+from typing import Callable, Dict, List
+
+import pyarrow.parquet as pq
+from azure.core.exceptions import ResourceNotFoundError
+
+from .archive_store import (SNAPSHOT_MARKER, _BlobFile, _blob_clients, _is_complete, _now_utc_iso,
+                            _partition_listing, _update_json, latest_partition, list_archive_blobs)
+
+log = logging.getLogger("archive_catalog")
+
+CATALOG_BLOB = "_catalog.json"          # under embeddings-archive/
+COMPACTED_PREFIX = "compacted/"          # partitions written by archive_compaction
+
+
+def partition_hour_bounds(partition: str) -> tuple[str | None, str | None]:
+    """[start, end) of an hourly y=/m=/d=/h= partition as ISO timestamps; (None, None) otherwise."""
+    try:
+        fields = dict(p.split("=", 1) for p in partition.strip("/").split("/"))
+        start = dt.datetime(int(fields["y"]), int(fields["m"]), int(fields["d"]), int(fields["h"]))
+    except (KeyError, ValueError):
+        return None, None
+    end = start + dt.timedelta(hours=1)
+    return start.isoformat(timespec="seconds") + "Z", end.isoformat(timespec="seconds") + "Z"
+
+
+def parquet_file_stats(blob_path: str) -> dict:
+    """Row count and created_at range of a Parquet file, from its footer only (ranged reads)."""
+    container_client, _ = _blob_clients("")
+    meta = pq.ParquetFile(_BlobFile(container_client.get_blob_client(blob_path))).metadata
+    names = [meta.schema.column(i).name for i in range(meta.num_columns)]
+    lo = hi = None
+    if "created_at" in names:
+        col = names.index("created_at")
+        for g in range(meta.num_row_groups):
+            st = meta.row_group(g).column(col).statistics
+            if st is None or not st.has_min_max:
+                continue
+            lo = st.min if lo is None else min(lo, st.min)
+            hi = st.max if hi is None else max(hi, st.max)
+    return {"rows": meta.num_rows, "min_created_at": lo, "max_created_at": hi}
+
+
+class ArchiveCatalog:
+    """
+    Small index of the embeddings archive, persisted as embeddings-archive/_catalog.json:
+        { "<fmt>/<partition>": { "files", "rows", "min_created_at", "max_created_at",
+                                 "compacted_into"?, "sources"? } }
+    Readers prune partitions by time (partitions()) or load just the current state
+    (current(): the latest compacted generation plus the partitions written after it)
+    instead of listing and downloading every hourly snapshot. Writers change it through
+    update(), so concurrent ingest runs and compactions never drop each other's entries.
+    """
+
+    def __init__(self, entries: Dict[str, dict] | None = None):
+        self.entries: Dict[str, dict] = entries or {}
+
+    # ── persistence ──────────────────────────────────────────────────────────────
+    @staticmethod
+    def _blob():
+        container_client, path = _blob_clients(CATALOG_BLOB)
+        return container_client.get_blob_client(path)
+
+    @classmethod
+    def load(cls) -> "ArchiveCatalog":
+        try:
+            data = cls._blob().download_blob().readall()
+        except ResourceNotFoundError:
+            return cls()
+        return cls(json.loads(data).get("partitions", {}))
+
+    @classmethod
+    def update(cls, change: Callable[["ArchiveCatalog"], object]) -> "ArchiveCatalog":
+        """
+        Loads the catalog, applies `change` to it and saves it (unless nothing changed) with
+        an etag condition; when another writer saved in between, it is loaded again and
+        `change` re-applied. Returns the catalog as saved.
+        """
+        result = cls()
+
+        def apply(data: dict | None) -> dict | None:
+            nonlocal result
+            result = cls((data or {}).get("partitions", {}))
+            before = json.dumps(result.entries, sort_keys=True)
+            change(result)
+            if json.dumps(result.entries, sort_keys=True) == before:
+                return None
+            return {"version": 1, "updated_at": _now_utc_iso(), "partitions": result.entries}
+
+        _update_json(cls._blob(), apply)
+        return result
+
+    # ── bookkeeping ──────────────────────────────────────────────────────────────
+    def record(self, fmt: str, partition: str, files: List[str], rows: int | None = None,
+               min_created_at: str | None = None, max_created_at: str | None = None, **extra):
+        lo, hi = partition_hour_bounds(partition)
+        entry = self.entries.setdefault(f"{fmt}/{partition.strip('/')}", {})
+        if set(files) - set(entry.get("files", ())):
+            entry.pop("compacted_into", None)       # rows written after the last compaction
+        entry.update(files=sorted(files), rows=rows, min_created_at=min_created_at or lo,
+                     max_created_at=max_created_at or hi, **extra)
+
+    def refresh(self) -> int:
+        """
+        Catalogs complete partitions that are missing (legacy ones, or snapshots whose
+        catalog update failed) and drops entries of deleted partitions; returns how many
+        entries changed. Parquet stats come from file footers, NPZ rows from snapshot markers.
+        """
+        changed = 0
+        for fmt in ("parquet", "npz"):
+            listing = {p: names for p, names in _partition_listing(fmt).items() if _is_complete(names, fmt)}
+            for key in [k for k in self.entries if k.startswith(fmt + "/") and k[len(fmt) + 1:] not in listing]:
+                del self.entries[key]
+                changed += 1
+            for partition, names in listing.items():
+                if f"{fmt}/{partition}" in self.entries:
+                    continue
+                files = list_archive_blobs(fmt, partition)
+                stats: dict = {"rows": None}
+                if SNAPSHOT_MARKER in names:
+                    container_client, prefix = _blob_clients(f"{fmt}/{partition}/")
+                    marker = json.loads(container_client.get_blob_client(prefix + SNAPSHOT_MARKER)
+                                        .download_blob().readall())
+                    stats = {k: marker.get(k) for k in ("rows", "min_created_at", "max_created_at")}
+                if fmt == "parquet":
+                    per_file = [parquet_file_stats(f) for f in files]
+                    lows = [s["min_created_at"] for s in per_file if s["min_created_at"]]
+                    highs = [s["max_created_at"] for s in per_file if s["max_created_at"]]
+                    stats = {"rows": sum(s["rows"] for s in per_file),
+                             "min_created_at": min(lows) if lows else None,
+                             "max_created_at": max(highs) if highs else None}
+                self.record(fmt, partition, files, **stats)
+                changed += 1
+        return changed
+
+    # ── queries ──────────────────────────────────────────────────────────────────
+    def partitions(self, fmt: str = "parquet", since: str | None = None, until: str | None = None,
+                   compacted: bool = False) -> List[str]:
+        """
+        Hourly partitions (oldest first) whose rows may fall in [since, until]; entries
+        without timestamps are always kept. compacted=True lists compacted generations instead.
+        """
+        out = []
+        for key, e in self.entries.items():
+            fkey, _, partition = key.partition("/")
+            if fkey != fmt or partition.startswith(COMPACTED_PREFIX) != compacted:
+                continue
+            if since and e.get("max_created_at") and e["max_created_at"] < since:
+                continue
+            if until and e.get("min_created_at") and e["min_created_at"] > until:
+                continue
+            out.append(partition)
+        return sorted(out)
+
+    def latest_compaction(self, fmt: str = "parquet") -> str | None:
+        gens = self.partitions(fmt, compacted=True)
+        return gens[-1] if gens else None
+
+    def current(self, fmt: str = "parquet") -> List[str]:
+        """
+        Partitions that together hold the latest version of every chunk, oldest first:
+        the latest compacted generation, then every partition not (fully) merged into it.
+        """
+        gen = self.latest_compaction(fmt)
+        rest = [p for p in self.partitions(fmt) if not self.entries[f"{fmt}/{p}"].get("compacted_into")]
+        return ([gen] if gen else []) + rest
+
+    def files(self, fmt: str, partitions: List[str]) -> List[str]:
+        return [f for p in partitions for f in self.entries[f"{fmt}/{p}"]["files"]]
+
+
+def current_partitions(fmt: str = "parquet") -> List[str]:
+    """
+    What to load for the latest state of the archive, oldest first: the catalog's current()
+    once a compaction exists, otherwise the latest partition as before.
+    """
+    catalog = ArchiveCatalog.load()
+    if catalog.latest_compaction(fmt):
+        return catalog.current(fmt)
+    latest = latest_partition(fmt)
+    return [latest] if latest else []
+
+
+def record_snapshot(fmt: str, partition: str, marker: dict):
+    """Adds a freshly committed snapshot to the catalog (best effort: refresh() catches up)."""
+    try:
+        ArchiveCatalog.update(lambda catalog: catalog.record(
+            fmt, partition, marker["files"], marker.get("rows"), marker.get("min_created_at"),
+            marker.get("max_created_at"), **{k: marker[k] for k in ("sources",) if k in marker}))
+    except Exception as e:
+        log.warning("Could not update the archive catalog for %s/%s: %s", fmt, partition, e)
@@ -0,0 +1,154 @@
+# src/archive_compaction.py
+"""
+Merges the hourly embeddings-archive partitions into one compacted generation that
+holds only the latest version of every chunk:
+
+    python -m src.archive_compaction                  # compact everything not compacted yet
+    python -m src.archive_compaction --delete-inputs  # ... and delete every merged partition
+"""
+from __future__ import annotations
+import argparse
+import logging
+import datetime as dt
+from typing import Iterator, List, Set
+
+import numpy as np
+import pandas as pd
+
+from .config import settings
+from .archive_catalog import COMPACTED_PREFIX, ArchiveCatalog
+from .archive_store import _blob_clients, _read_parquet_table, from_vector_table, iter_vector_tables
+from .chunk_batch import ChunkBatch
+from .archive_writer import ArchiveSnapshot
+from .manifest import BlobManifest
+
+log = logging.getLogger("archive_compaction")
+
+_KEY_COLUMNS = ["id", "created_at"]
+_ROW_COLUMNS = ["id", "fileName", "chunkId", "docType", "content", "created_at", "vector", "vector_scale", "vector_b64"]
+
+
+def live_chunk_ids() -> Set[str] | None:
+    """Chunk ids the index currently holds according to the ingest manifest (None = unknown)."""
+    manifest = BlobManifest.load()
+    if not manifest.entries:
+        return None
+    return {cid for name in manifest.entries for cid in manifest.chunk_ids(name)}
+
+
+def latest_rows(files: List[str], live_ids: Set[str] | None = None) -> pd.DataFrame:
+    """
+    (file, row) of the newest version of every chunk id across `files` (oldest file first),
+    sorted by id. Reads only the id and created_at columns; later files win ties.
+    """
+    frames = []
+    for i, path in enumerate(files):
+        keys = _read_parquet_table(path, _KEY_COLUMNS).to_pandas()
+        if "created_at" not in keys:
+            keys["created_at"] = ""
+        keys["file"], keys["row"] = i, np.arange(len(keys))
+        frames.append(keys)
+    if not frames:
+        return pd.DataFrame(columns=["id", "created_at", "file", "row"])
+    keys = pd.concat(frames, ignore_index=True).fillna({"created_at": ""})
+    keys = keys.sort_values(["id", "created_at", "file", "row"]).drop_duplicates("id", keep="last")
+    if live_ids is not None:
+        keys = keys[keys["id"].isin(live_ids)]
+    return keys.reset_index(drop=True)
+
+
+def latest_batches(files: List[str], keys: pd.DataFrame, columns: List[str] | None = None) -> Iterator[ChunkBatch]:
+    """
+    The rows selected by latest_rows() as ChunkBatches, read file by file and row group
+    by row group, so only about ARCHIVE_ROW_GROUP_ROWS rows are in memory at once.
+    Rows come in file order, not in the id order of `keys`.
+    """
+    for i, path in enumerate(files):
+        rows = np.sort(keys.loc[keys["file"] == i, "row"].to_numpy())
+        if not len(rows):
+            continue
+        start = 0
+        for table, vectors in iter_vector_tables(path, settings.ARCHIVE_ROW_GROUP_ROWS, columns or _ROW_COLUMNS):
+            lo, hi = np.searchsorted(rows, [start, start + table.num_rows])
+            if hi > lo:
+                picked = rows[lo:hi] - start
+                yield from_vector_table(table.take(picked), vectors[picked])
+            start += table.num_rows
+
+
+def compact_archive(codec: str | None = None, prune_deleted: bool = True,
+                    delete_inputs: bool = False) -> str | None:
+    """
+    Compacts the previous generation plus every partition written since into
+    embeddings-archive/{parquet,npz}/compacted/v=<timestamp>/, then updates the catalog.
+    With prune_deleted, chunks no longer in the ingest manifest are dropped as well.
+    Returns the new partition, or None when there was nothing new to compact.
+    """
+    catalog = ArchiveCatalog.update(lambda c: c.refresh())
+    sources = catalog.current("parquet")
+    previous = catalog.latest_compaction("parquet")
+    if not [p for p in sources if p != previous]:
+        log.info("Archive compaction: nothing new since %s", previous)
+        return None
+
+    files = catalog.files("parquet", sources)
+    merged_files = {key: list(e["files"]) for key, e in catalog.entries.items()
+                    if key.partition("/")[2] in sources}
+    keys = latest_rows(files, live_chunk_ids() if prune_deleted else None)
+    log.info("Archive compaction: %d partitions, %d files → %d chunks", len(sources), len(files), len(keys))
+
+    partition = COMPACTED_PREFIX + dt.datetime.utcnow().strftime("v=%Y%m%dT%H%M%S%f")
+    with ArchiveSnapshot(partition=partition, codec=codec, info={"sources": sources}) as snapshot:
+        for batch in latest_batches(files, keys):
+            snapshot.write(batch)
+
+    def mark_merged(catalog: ArchiveCatalog):
+        for fmt in ("parquet", "npz"):
+            for p in sources:
+                entry = catalog.entries.get(f"{fmt}/{p}")
+                # a run that added files to the partition meanwhile keeps it in current()
+                if entry is not None and entry["files"] == merged_files.get(f"{fmt}/{p}"):
+                    entry["compacted_into"] = partition
+
+    catalog = ArchiveCatalog.update(mark_merged)
+    log.info("Archive compaction: wrote %s (%d chunks)", partition, len(keys))
+
+    if delete_inputs:
+        # everything merged so far, including partitions left behind by earlier runs
+        merged = {key.partition("/")[2] for key, e in catalog.entries.items() if e.get("compacted_into")}
+        delete_partitions(sorted(merged))
+    return partition
+
+
+def delete_partitions(partitions: List[str]):
+    """Deletes partitions merged into a newer generation (both formats) and drops them from the catalog."""
+    container_client, prefix = _blob_clients("")
+    for fmt in ("parquet", "npz"):
+        for p in partitions:
+            part_prefix = f"{prefix}{fmt}/{p.strip('/')}/"
+            for b in container_client.list_blobs(name_starts_with=part_prefix):
+                if "/" not in b.name[len(part_prefix):]:
+                    container_client.get_blob_client(b.name).delete_blob()
+
+    def drop(catalog: ArchiveCatalog):
+        for fmt in ("parquet", "npz"):
+            for p in partitions:
+                catalog.entries.pop(f"{fmt}/{p}", None)
+
+    ArchiveCatalog.update(drop)
+    log.info("Archive compaction: deleted %d merged partitions", len(partitions))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--codec", default=None, help="vector codec of the output (default: ARCHIVE_VECTOR_CODEC)")
+    ap.add_argument("--keep-deleted", action="store_true",
+                    help="keep chunks that are no longer in the ingest manifest")
+    ap.add_argument("--delete-inputs", action="store_true", help="delete the merged partitions afterwards")
+    args = ap.parse_args()
+    compact_archive(codec=args.codec, prune_deleted=not args.keep_deleted, delete_inputs=args.delete_inputs)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    main()
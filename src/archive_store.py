@@ -1,85 +1,354 @@
 # src/archive_store.py
 from __future__ import annotations
-import io, os, base64, json, datetime as dt
+import io, os, base64, json, random, time, datetime as dt
+from typing import Callable
 import numpy as np
 import pandas as pd
-from azure.storage.blob import BlobServiceClient
+import pyarrow as pa
+import pyarrow.parquet as pq
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
 from .config import settings
+from .blob_store import get_container_client
+from . import vector_codecs
+from .chunk_batch import ChunkBatch, as_chunk_batch
 
 def _blob_clients(subpath: str):
-    bs = BlobServiceClient.from_connection_string(settings.AZURE_BLOB_CONNECTION_STRING)
-    container = settings.AZURE_BLOB_CONTAINER
     # store under a subfolder called "embeddings-archive"
-    return bs.get_container_client(container), f"embeddings-archive/{subpath}"
+    return get_container_client(settings.AZURE_BLOB_CONTAINER), f"embeddings-archive/{subpath}"
 
 def _now_utc_iso():
     return dt.datetime.utcnow().replace(tzinfo=None).isoformat(timespec="seconds") + "Z"
 
-def to_records_with_serialized_vectors(chunks: list[dict]) -> pd.DataFrame:
-    """
-    chunks[i]: { id, chunkId, content, metadata:{source,type}, vector: list[float] }
-    """
-    rows = []
-    for c in chunks:
-        vec = np.asarray(c["vector"], dtype=np.float32)
-        rows.append({
-            "id": c["id"],
-            "fileName": c["metadata"].get("source",""),
-            "chunkId": c["chunkId"],
-            "docType": c["metadata"].get("type","unknown"),
-            "content": c["content"],
-            "vector_dim": int(vec.shape[0]),
-            "vector_b64": base64.b64encode(vec.tobytes()).decode("ascii"),
-            "vector_mean": float(vec.mean()),
-            "vector_norm": float(np.linalg.norm(vec)),
-            "created_at": _now_utc_iso()
-        })
-    return pd.DataFrame(rows)
-
-def save_parquet_to_blob(df: pd.DataFrame, partition: str | None = None) -> str:
-    """
-    Writes a Parquet snapshot to Blob: embeddings-archive/parquet/<partition>/vectors.parquet
+def default_partition() -> str:
+    """Hourly partition path used for archive snapshots, e.g. y=2024/m=05/d=01/h=13."""
+    return dt.datetime.utcnow().strftime("y=%Y/m=%m/d=%d/h=%H")
+
+def _archive_codec(codec: str | None) -> str:
+    return vector_codecs.check_codec(codec or settings.ARCHIVE_VECTOR_CODEC)
+
+# Arrow value type of the "vector" column for each codec
+_ARROW_VALUE_TYPES = {"float32": pa.float32(), "float16": pa.float16(), "int8": pa.int8(), "pq": pa.uint8()}
+VECTOR_COLUMN = "vector"
+
+def to_vector_table(chunks: ChunkBatch | list[dict], codec: str | None = None,
+                    codebook: np.ndarray | None = None) -> pa.Table:
+    """
+    `chunks` is a ChunkBatch, or chunk dicts { id, chunkId, content, metadata:{source,type}, vector, created_at? }.
+    One row per chunk; vectors go into a FixedSizeList<type, dim> column built straight
+    from the batch's matrix (no per-row encoding). The codec (ARCHIVE_VECTOR_CODEC by default) and
+    a PQ codebook are kept in the schema metadata; int8 adds a vector_scale column.
+    Pass `codebook` to encode PQ with an existing codebook instead of training one.
+    """
+    codec = _archive_codec(codec)
+    batch = as_chunk_batch(chunks)
+    vecs = batch.vectors
+    enc = vector_codecs.encode(vecs, codec, codebook=codebook, pq_subvectors=settings.ARCHIVE_PQ_SUBVECTORS or None)
+    stored = enc.get("vectors", enc.get("codes"))
+    n = len(batch)
+    now = _now_utc_iso()
+
+    columns = {
+        "id": pa.array(batch.ids, pa.string()),
+        "fileName": pa.array(batch.sources, pa.string()),
+        "chunkId": pa.array(batch.chunk_ids, pa.string()),
+        "docType": pa.array(batch.doc_types, pa.string()),
+        "content": pa.array(batch.contents, pa.string()),
+        "vector_dim": pa.array(np.full(n, vecs.shape[1], dtype=np.int32)),
+        VECTOR_COLUMN: pa.FixedSizeListArray.from_arrays(
+            pa.array(stored.reshape(-1), type=_ARROW_VALUE_TYPES[codec]), stored.shape[1]),
+        "vector_mean": pa.array(vecs.mean(axis=1)),
+        "vector_norm": pa.array(np.linalg.norm(vecs, axis=1)),
+        # rows carried over by compaction keep their original timestamp
+        "created_at": pa.array([t or now for t in batch.created_at or [None] * n], pa.string()),
+    }
+    if codec == "int8":
+        columns["vector_scale"] = pa.array(enc["scales"])
+    metadata = {b"vector_codec": codec.encode()}
+    if codec == "pq":
+        buf = io.BytesIO()
+        np.save(buf, enc["codebook"], allow_pickle=False)
+        metadata[b"pq_codebook"] = buf.getvalue()
+    return pa.table(columns, metadata=metadata)
+
+def save_parquet_to_blob(table: pa.Table | pd.DataFrame, partition: str | None = None,
+                         filename: str = "vectors.parquet") -> str:
+    """
+    Writes a Parquet snapshot to Blob: embeddings-archive/parquet/<partition>/<filename>
     Returns the blob path used.
     """
-    partition = partition or dt.datetime.utcnow().strftime("y=%Y/m=%m/d=%d/h=%H")
-    container_client, path_prefix = _blob_clients(f"parquet/{partition}/vectors.parquet")
+    partition = partition or default_partition()
+    container_client, path_prefix = _blob_clients(f"parquet/{partition}/{filename}")
 
     # write to in-memory parquet
     buf = io.BytesIO()
-    df.to_parquet(buf, index=False)
+    if isinstance(table, pd.DataFrame):
+        table.to_parquet(buf, index=False)
+    else:
+        pq.write_table(table, buf)
     buf.seek(0)
 
+    # upload from the buffer itself; getvalue() would copy the whole snapshot again
     blob = container_client.get_blob_client(path_prefix)
-    blob.upload_blob(buf.getvalue(), overwrite=True, content_type="application/octet-stream")
+    blob.upload_blob(buf, overwrite=True, content_type="application/octet-stream")
     return path_prefix
 
-def save_npz_to_blob(chunks: list[dict], partition: str | None = None) -> str:
+def npz_meta(batch: ChunkBatch) -> list[str]:
+    """The per-chunk "meta" entries of NPZ snapshots."""
+    return [json.dumps({"fileName": source, "chunkId": chunk_id, "docType": doc_type})
+            for source, chunk_id, doc_type in zip(batch.sources, batch.chunk_ids, batch.doc_types)]
+
+def save_npz_to_blob(chunks: ChunkBatch | list[dict], partition: str | None = None, filename: str = "vectors.npz",
+                     codec: str | None = None) -> str:
     """
-    Stores only vectors + ids in NPZ (compact, fast reload).
+    Stores only vectors + ids in NPZ (compact, fast reload). Vectors are encoded with
+    `codec` (ARCHIVE_VECTOR_CODEC by default), recorded in the file's "codec" entry.
     """
-    partition = partition or dt.datetime.utcnow().strftime("y=%Y/m=%m/d=%d/h=%H")
-    container_client, path_prefix = _blob_clients(f"npz/{partition}/vectors.npz")
+    partition = partition or default_partition()
+    container_client, path_prefix = _blob_clients(f"npz/{partition}/{filename}")
+    codec = _archive_codec(codec)
 
-    ids = [c["id"] for c in chunks]
-    vecs = np.stack([np.asarray(c["vector"], dtype=np.float32) for c in chunks])
-    meta = np.array([json.dumps({"fileName": c["metadata"].get("source",""),
-                                 "chunkId": c["chunkId"],
-                                 "docType": c["metadata"].get("type","unknown")})
-                     for c in chunks], dtype=object)
+    batch = as_chunk_batch(chunks)
+    meta = np.array(npz_meta(batch), dtype=object)
+    encoded = vector_codecs.encode(batch.vectors, codec, pq_subvectors=settings.ARCHIVE_PQ_SUBVECTORS or None)
 
     buf = io.BytesIO()
-    np.savez_compressed(buf, ids=np.array(ids), vectors=vecs, meta=meta)
+    np.savez_compressed(buf, ids=np.array(batch.ids), meta=meta, codec=np.array(codec), **encoded)
     buf.seek(0)
 
     blob = container_client.get_blob_client(path_prefix)
-    blob.upload_blob(buf.getvalue(), overwrite=True, content_type="application/octet-stream")
+    blob.upload_blob(buf, overwrite=True, content_type="application/octet-stream")
     return path_prefix
 
-def load_parquet_from_blob(blob_path: str) -> pd.DataFrame:
-    container_client, _ = _blob_clients("")  # we only need container reference
-    bc = container_client.get_blob_client(blob_path)
-    data = bc.download_blob().readall()
-    return pd.read_parquet(io.BytesIO(data))
+class _BlobFile(io.RawIOBase):
+    """Seekable read-only view of a blob: every read is a ranged GET, so a Parquet reader
+    fetches only the footer and the column chunks it was asked for."""
+
+    def __init__(self, blob_client):
+        self._bc = blob_client
+        self._size = blob_client.get_blob_properties().size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._size}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, b):
+        n = min(len(b), self._size - self._pos)
+        if n <= 0:
+            return 0
+        data = self._bc.download_blob(offset=self._pos, length=n).readall()
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+def _read_parquet_table(source: str | bytes, columns: list[str] | None = None) -> pa.Table:
+    """`source` is a blob path or the file's bytes; unknown projected columns are ignored."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        pf = pq.ParquetFile(io.BytesIO(source))
+    else:
+        container_client, _ = _blob_clients("")  # we only need container reference
+        bc = container_client.get_blob_client(source)
+        wants_vectors = columns is None or VECTOR_COLUMN in columns or "vector_b64" in columns
+        # one GET for the whole file when the vectors are needed anyway, ranged reads otherwise
+        pf = pq.ParquetFile(io.BytesIO(bc.download_blob().readall()) if wants_vectors else _BlobFile(bc))
+    if columns is not None:
+        columns = [c for c in columns if c in pf.schema_arrow.names]
+    return pf.read(columns=columns)
+
+def load_parquet_from_blob(blob_path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Snapshot as a DataFrame; with `columns` only those column chunks are downloaded."""
+    return _read_parquet_table(blob_path, columns).to_pandas()
+
+def _vector_matrix(col: pa.ChunkedArray) -> np.ndarray:
+    """FixedSizeList column → (n, dim) ndarray viewing the Arrow buffer (no copy for one chunk)."""
+    arr = col.chunk(0) if col.num_chunks == 1 else col.combine_chunks()
+    width = arr.type.list_size
+    flat = arr.values.slice(arr.offset * width, len(arr) * width)
+    return flat.to_numpy(zero_copy_only=True).reshape(len(arr), width)
+
+def read_vector_table(source: str | bytes, columns: list[str] | None = None,
+                      decode: bool = True) -> tuple[pa.Table, np.ndarray | None]:
+    """
+    Reads a Parquet snapshot → (table of the other columns, (n, dim) vectors or None).
+    `columns` projects the read; leave out "vector" and the vector bytes are never
+    downloaded. float32 vectors are returned zero-copy; other codecs are decoded to
+    float32 unless decode=False (then the stored codes come back as they are).
+    Snapshots in the older base64 layout (vector_b64) are decoded too.
+    """
+    if columns is not None and VECTOR_COLUMN in columns:
+        columns = _with_vector_columns(columns)
+    return _split_vectors(_read_parquet_table(source, columns), decode)
+
+def iter_vector_tables(blob_path: str, batch_rows: int = 2048, columns: list[str] | None = None,
+                       decode: bool = True):
+    """
+    Like read_vector_table, but streams a Parquet snapshot blob batch by batch with ranged
+    reads, so only about `batch_rows` rows are in memory at once. Yields (table, vectors).
+    """
+    if columns is not None and VECTOR_COLUMN in columns:
+        columns = _with_vector_columns(columns)
+    container_client, _ = _blob_clients("")
+    pf = pq.ParquetFile(_BlobFile(container_client.get_blob_client(blob_path)))
+    if columns is not None:
+        columns = [c for c in columns if c in pf.schema_arrow.names]
+    schema = pf.schema_arrow if columns is None else pa.schema([pf.schema_arrow.field(c) for c in columns],
+                                                              metadata=pf.schema_arrow.metadata)
+    for batch in pf.iter_batches(batch_size=batch_rows, columns=columns):
+        yield _split_vectors(pa.Table.from_batches([batch], schema=schema), decode)
+
+def from_vector_table(table: pa.Table, vectors: np.ndarray) -> ChunkBatch:
+    """Rows read back by read_vector_table / iter_vector_tables as a ChunkBatch (the inverse of to_vector_table)."""
+    n = table.num_rows
+
+    def col(name: str) -> list:
+        return table.column(name).to_pylist() if name in table.column_names else [None] * n
+
+    created_at = [t or None for t in col("created_at")]
+    metadata = [{"source": s or "", "type": t or "unknown"} for s, t in zip(col("fileName"), col("docType"))]
+    return ChunkBatch(col("id"), [c or "" for c in col("chunkId")], [c or "" for c in col("content")], metadata,
+                      np.ascontiguousarray(vectors, dtype=np.float32), created_at if any(created_at) else None)
+
+def _with_vector_columns(columns: list[str]) -> list[str]:
+    # the columns a codec needs next to "vector", plus the legacy base64 layout
+    return list(dict.fromkeys([*columns, "vector_scale", "vector_b64"]))
+
+def _split_vectors(table: pa.Table, decode: bool = True) -> tuple[pa.Table, np.ndarray | None]:
+    meta = table.schema.metadata or {}
+    if VECTOR_COLUMN in table.column_names:
+        codec = meta.get(b"vector_codec", b"float32").decode()
+        stored = _vector_matrix(table.column(VECTOR_COLUMN))
+        rest = table.drop_columns([VECTOR_COLUMN])
+        if not decode or codec == "float32":
+            return rest, stored
+        if codec == "float16":
+            return rest, stored.astype(np.float32)
+        if codec == "int8":
+            return rest, vector_codecs.int8_decode(stored, table.column("vector_scale").to_numpy())
+        codebook = np.load(io.BytesIO(meta[b"pq_codebook"]), allow_pickle=False)
+        return rest, vector_codecs.pq_decode(stored, codebook)
+
+    if "vector_b64" in table.column_names:
+        # snapshots from before the vector column: base64 float32 per row
+        raw = b"".join(base64.b64decode(b) for b in table.column("vector_b64").to_pylist())
+        vectors = np.frombuffer(raw, dtype=np.float32).reshape(table.num_rows, -1)
+        return table.drop_columns(["vector_b64"]), vectors
+    return table, None
+
+# Per-partition markers written by archive_writer.ArchiveSnapshot: a snapshot is complete once
+# SNAPSHOT_MARKER exists; a pending marker alone (one per run, see pending_marker) means its
+# commit has not finished yet.
+SNAPSHOT_MARKER = "_snapshot.json"
+PENDING_MARKER = "_pending.json"        # the single pending marker of older writers
+
+def pending_marker(stem: str) -> str:
+    """Pending marker of the run writing the files named `stem`, so concurrent runs never share one."""
+    return f"_pending-{stem}.json"
+
+def is_pending_marker(name: str) -> bool:
+    return name == PENDING_MARKER or (name.startswith("_pending-") and name.endswith(".json"))
+
+_UPDATE_ATTEMPTS = 10
+
+def _update_json(blob_client, update: Callable[[dict | None], dict | None]) -> dict | None:
+    """
+    Read-modify-write of a small JSON blob that several runs may update at once (snapshot
+    markers, the catalog). `update` gets the current content (None when the blob does not
+    exist) and returns the new one, or None to leave the blob as it is. The write only
+    succeeds if the blob is unchanged since it was read (etag If-Match, or create-only);
+    on 412 / 409 it is read again and `update` applied again. Returns what was stored.
+    """
+    for attempt in range(_UPDATE_ATTEMPTS):
+        try:
+            stream = blob_client.download_blob()
+            current, etag = json.loads(stream.readall()), stream.properties.etag
+        except ResourceNotFoundError:
+            current, etag = None, None
+        payload = update(current)
+        if payload is None:
+            return current
+        data = json.dumps(payload, sort_keys=True).encode("utf-8")
+        try:
+            if etag is None:
+                blob_client.upload_blob(data, overwrite=False, content_type="application/json")
+            else:
+                blob_client.upload_blob(data, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified,
+                                        content_type="application/json")
+            return payload
+        except (ResourceModifiedError, ResourceExistsError):
+            # another run wrote in between: back off a little (jittered) and redo the update on its version
+            time.sleep(random.uniform(0, min(1.0, 0.02 * 2 ** attempt)))
+    raise RuntimeError(f"JSON blob still changing after {_UPDATE_ATTEMPTS} conditional writes")
+
+def _partition_listing(fmt: str) -> dict:
+    """{partition: blob names directly under it} for one format."""
+    container_client, prefix = _blob_clients(f"{fmt}/")
+    parts: dict = {}
+    for b in container_client.list_blobs(name_starts_with=prefix):
+        partition, _, name = b.name[len(prefix):].rpartition("/")
+        parts.setdefault(partition, set()).add(name)
+    return parts
+
+def _is_complete(names: set, fmt: str) -> bool:
+    if SNAPSHOT_MARKER in names:
+        return True
+    # partitions written before snapshot markers existed have neither marker
+    return not any(is_pending_marker(n) for n in names) and any(n.endswith(f".{fmt}") for n in names)
+
+def latest_partition(fmt: str = "npz") -> str | None:
+    """
+    Most recent complete partition in `fmt` (partitions are zero-padded y=/m=/d=/h=).
+    Partitions whose snapshot commit has not finished are skipped.
+    """
+    parts = [p for p, names in _partition_listing(fmt).items() if _is_complete(names, fmt)]
+    return max(parts) if parts else None
+
+def list_archive_blobs(fmt: str = "npz", partition: str | None = None) -> list[str]:
+    """
+    Blob paths of one archive snapshot: the files listed by its snapshot marker, or every
+    `fmt` file of a legacy partition. Without `partition` the most recent one is used.
+    """
+    partition = partition or latest_partition(fmt)
+    if partition is None:
+        return []
+    container_client, prefix = _blob_clients(f"{fmt}/{partition.strip('/')}/")
+    names = {b.name[len(prefix):] for b in container_client.list_blobs(name_starts_with=prefix)}
+    names = {n for n in names if "/" not in n}
+    if SNAPSHOT_MARKER in names:
+        marker = container_client.get_blob_client(prefix + SNAPSHOT_MARKER).download_blob().readall()
+        return sorted(json.loads(marker)["files"])
+    if any(is_pending_marker(n) for n in names):
+        return []
+    return sorted(prefix + n for n in names if n.endswith(f".{fmt}"))
+
+def load_npz_from_blob(blob_path: str) -> dict:
+    """
+    Arrays of an NPZ snapshot written by save_npz_to_blob: "ids", "meta", "codec", the
+    encoded arrays as stored, and "vectors" decoded to float32 whatever the codec.
+    """
+    container_client, _ = _blob_clients("")
+    data = container_client.get_blob_client(blob_path).download_blob().readall()
+    return read_npz(data)
+
+def read_npz(data: bytes) -> dict:
+    # meta is an object array of JSON strings, hence allow_pickle
+    with np.load(io.BytesIO(data), allow_pickle=True) as npz:
+        arrays = {k: npz[k] for k in npz.files}
+    # snapshots written before codecs were recorded are plain float32
+    codec = str(arrays.pop("codec", "float32"))
+    arrays["vectors"] = vector_codecs.decode(arrays, codec)
+    arrays["codec"] = codec
+    return arrays
 
 def decode_vector_b64(b64: str) -> np.ndarray:
     return np.frombuffer(base64.b64decode(b64), dtype=np.float32)
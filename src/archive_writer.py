@@ -0,0 +1,353 @@
+# src/archive_writer.py
+from __future__ import annotations
+import io
+import os
+import json
+import uuid
+import base64
+import shutil
+import logging
+import tempfile
+import zipfile
+import datetime as dt
+from typing import Dict, List
+
+import numpy as np
+import pyarrow.parquet as pq
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobBlock
+
+from .config import settings
+from . import vector_codecs
+from .archive_catalog import record_snapshot
+from .archive_store import (SNAPSHOT_MARKER, _archive_codec, _blob_clients, _now_utc_iso, _update_json,
+                            default_partition, is_pending_marker, npz_meta, pending_marker, to_vector_table)
+from .chunk_batch import ChunkBatch, as_chunk_batch
+
+log = logging.getLogger("archive_writer")
+
+
+class BlockUploadStream(io.RawIOBase):
+    """
+    Write-only stream into a block blob: bytes are staged as blocks of ARCHIVE_BLOCK_BYTES
+    while they are produced. Nothing is visible until the block list is committed.
+    """
+
+    def __init__(self, blob_client, block_bytes: int | None = None):
+        self.blob_client = blob_client
+        self.block_bytes = block_bytes or settings.ARCHIVE_BLOCK_BYTES
+        self.block_ids: List[str] = []
+        # a fresh prefix per attempt, so leftovers of a crashed attempt are never reused
+        self._attempt = uuid.uuid4().hex[:12]
+        self._buf = bytearray()
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def write(self, b) -> int:
+        self._buf += b
+        self._pos += len(b)
+        while len(self._buf) >= self.block_bytes:
+            self._stage(bytes(self._buf[: self.block_bytes]))
+            del self._buf[: self.block_bytes]
+        return len(b)
+
+    def _stage(self, data: bytes):
+        # block ids must be base64 and of equal length within a blob
+        block_id = base64.b64encode(f"{self._attempt}-{len(self.block_ids):08d}".encode()).decode()
+        self.blob_client.stage_block(block_id, data)
+        self.block_ids.append(block_id)
+
+    def finish(self) -> List[str]:
+        """Stages the remaining bytes; returns all block ids (to commit later)."""
+        if self._buf or not self.block_ids:
+            self._stage(bytes(self._buf))
+            self._buf.clear()
+        return self.block_ids
+
+
+def _commit_blocks(blob_client, block_ids: List[str]):
+    blob_client.commit_block_list([BlobBlock(block_id=b) for b in block_ids])
+
+
+class _ParquetPart:
+    """One Parquet file written row group by row group (ARCHIVE_ROW_GROUP_ROWS rows each)."""
+
+    def __init__(self, blob_client, codec: str):
+        self.stream = BlockUploadStream(blob_client)
+        self.codec = codec
+        self.codebook: np.ndarray | None = None     # pq: set by ArchiveSnapshot before the first write
+        self.writer: pq.ParquetWriter | None = None
+        self.pending = ChunkBatch([], [], [], [])
+
+    def write(self, batch: ChunkBatch):
+        self.pending = ChunkBatch.concat([self.pending, batch])
+        size = settings.ARCHIVE_ROW_GROUP_ROWS
+        while len(self.pending) >= size:
+            n = len(self.pending)
+            group, self.pending = self.pending.take(range(size)), self.pending.take(range(size, n))
+            self._write_group(group)
+
+    def _write_group(self, batch: ChunkBatch):
+        table = to_vector_table(batch, self.codec, codebook=self.codebook)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.stream, table.schema)
+        self.writer.write_table(table)
+
+    def finish(self) -> List[str]:
+        if len(self.pending):
+            self._write_group(self.pending)
+            self.pending = ChunkBatch([], [], [], [])
+        if self.writer is not None:
+            self.writer.close()
+        return self.stream.finish()
+
+
+class _NpzPart:
+    """
+    One NPZ file. np.savez needs every array up front, so vector bytes are spooled
+    (memory up to ARCHIVE_SPOOL_MAX_BYTES, then scratch disk) and zipped into the
+    block stream on finish; ids and meta stay in memory (small next to the vectors).
+    """
+
+    def __init__(self, blob_client, codec: str):
+        self.stream = BlockUploadStream(blob_client)
+        self.codec = codec
+        self.codebook: np.ndarray | None = None     # pq: set by ArchiveSnapshot before the first write
+        self.ids: List[str] = []
+        self.meta: List[str] = []
+        self.spools: Dict[str, tempfile.SpooledTemporaryFile] = {}
+        self.layout: Dict[str, tuple] = {}   # array name → (dtype, row shape)
+
+    def write(self, batch: ChunkBatch):
+        encoded = vector_codecs.encode(batch.vectors, self.codec, codebook=self.codebook)
+        encoded.pop("codebook", None)
+        for name, arr in encoded.items():
+            if name not in self.spools:
+                os.makedirs(settings.INGEST_SCRATCH_DIR, exist_ok=True)
+                self.spools[name] = tempfile.SpooledTemporaryFile(
+                    max_size=settings.ARCHIVE_SPOOL_MAX_BYTES, dir=settings.INGEST_SCRATCH_DIR)
+                self.layout[name] = (arr.dtype, arr.shape[1:])
+            self.spools[name].write(np.ascontiguousarray(arr).tobytes())
+        self.ids.extend(batch.ids)
+        self.meta.extend(npz_meta(batch))
+
+    def finish(self) -> List[str]:
+        with zipfile.ZipFile(self.stream, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            small = {"ids": np.array(self.ids), "meta": np.array(self.meta, dtype=object),
+                     "codec": np.array(self.codec)}
+            if self.codebook is not None:
+                small["codebook"] = self.codebook
+            for name, arr in small.items():
+                with zf.open(f"{name}.npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array(member, arr, allow_pickle=True)
+            for name, spool in self.spools.items():
+                dtype, row_shape = self.layout[name]
+                with zf.open(f"{name}.npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array_header_2_0(member, {
+                        "descr": np.lib.format.dtype_to_descr(dtype),
+                        "fortran_order": False,
+                        "shape": (len(self.ids), *row_shape),
+                    })
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, member, 1 << 20)
+                spool.close()
+        return self.stream.finish()
+
+
+class ArchiveSnapshot:
+    """
+    Streams one archive snapshot (Parquet and/or NPZ) into
+    embeddings-archive/<fmt>/<partition>/<name>.<fmt> while ingestion runs. The default
+    name is unique per run (vectors-<UTC timestamp>-<random>), so several runs in the same
+    hour add files to the partition instead of replacing each other's.
+
+    Bytes are staged as uncommitted blocks as they are produced, so memory stays at
+    about one row group plus one block. commit() then
+      1) finishes the files and writes this run's pending marker (_pending-<name>.json)
+         with every file's block list,
+      2) commits each file's block list,
+      3) adds the files to SNAPSHOT_MARKER (kept from earlier runs) and removes the pending marker.
+    Runs committing to the same partition at once each have their own pending marker, and
+    SNAPSHOT_MARKER and the catalog are updated with conditional writes (etag If-Match,
+    retried on 412), so neither run's files are lost.
+    Readers skip partitions that have a pending marker but no snapshot marker, so a
+    crash at any point never exposes a half-written snapshot, and resume_pending_commits()
+    can finish step 2–3 later (staged blocks are kept by the service for 7 days).
+    Committed snapshots are added to the archive catalog (see archive_catalog).
+
+    With the pq codec the first ARCHIVE_PQ_TRAIN_ROWS rows are held back until one
+    codebook has been trained on their vectors; every file of the snapshot shares it.
+    """
+
+    def __init__(self, partition: str | None = None, codec: str | None = None,
+                 formats=("parquet", "npz"), name: str | None = None, info: dict | None = None):
+        self.partition = partition or default_partition()
+        # timestamp first: files sort in write order, and later files win when ids repeat
+        name = name or f"vectors-{dt.datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        self.codec = _archive_codec(codec)
+        self.info = dict(info or {})    # extra fields for the snapshot marker
+        self.rows = 0
+        self.min_created_at: str | None = None
+        self.max_created_at: str | None = None
+        self._stamped_now = False       # some rows get created_at = time of writing
+        self._pending = pending_marker(name)
+        self.committed = False
+        self._pq_held: List[ChunkBatch] = []           # rows waiting for the codebook, without vectors
+        self._pq_sample: np.ndarray | None = None      # ... and their vectors, in one preallocated matrix
+        self._pq_rows = 0
+        self._pq_trained = self.codec != "pq"
+        self._parts = {}
+        self._paths = {}
+        for fmt in formats:
+            cc, path = _blob_clients(f"{fmt}/{self.partition}/{name}.{fmt}")
+            self._paths[fmt] = path
+            part_cls = _ParquetPart if fmt == "parquet" else _NpzPart
+            self._parts[fmt] = part_cls(cc.get_blob_client(path), self.codec)
+
+    def __enter__(self) -> "ArchiveSnapshot":
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None and not self.committed:
+            self.commit()
+
+    @property
+    def paths(self) -> Dict[str, str]:
+        return dict(self._paths)
+
+    def write(self, chunks: ChunkBatch | List[dict]):
+        """Appends embedded chunks (a ChunkBatch, or chunk dicts)."""
+        if not len(chunks):
+            return
+        batch = as_chunk_batch(chunks)
+        if self._pq_trained:
+            self._write_parts(batch)
+        else:
+            self._hold_back(batch)
+        self.rows += len(batch)
+        stamps = [t or "" for t in batch.created_at or [None] * len(batch)]
+        lo = min(stamps) or _now_utc_iso()
+        self._stamped_now = self._stamped_now or not all(stamps)
+        self.min_created_at = min(self.min_created_at or lo, lo)
+        self.max_created_at = max(self.max_created_at or "", max(stamps)) or None
+
+    def _write_parts(self, batch: ChunkBatch):
+        for part in self._parts.values():
+            part.write(batch)
+
+    def _hold_back(self, batch: ChunkBatch):
+        """Keeps rows until the PQ sample is full; trains the codebook then and writes them."""
+        size = _pq_sample_rows()
+        if self._pq_sample is None:
+            self._pq_sample = np.empty((size, batch.dim), dtype=np.float32)
+        n = min(len(batch), size - self._pq_rows)
+        self._pq_sample[self._pq_rows:self._pq_rows + n] = batch.vectors[:n]
+        self._pq_held.append(ChunkBatch(batch.ids[:n], batch.chunk_ids[:n], batch.contents[:n], batch.metadata[:n],
+                                        None, None if batch.created_at is None else batch.created_at[:n]))
+        self._pq_rows += n
+        if self._pq_rows == size:
+            self._train_codebook()
+            if n < len(batch):
+                self._write_parts(batch.take(range(n, len(batch))))
+
+    def _train_codebook(self):
+        """Trains the shared PQ codebook on the held-back vectors, then writes the held-back rows."""
+        sample = self._pq_sample[:self._pq_rows]
+        codebook = vector_codecs.pq_train(sample, settings.ARCHIVE_PQ_SUBVECTORS or None)
+        for part in self._parts.values():
+            part.codebook = codebook
+        start = 0
+        for held in self._pq_held:
+            held.vectors = sample[start:start + len(held)]
+            start += len(held)
+            self._write_parts(held)
+        self._pq_held, self._pq_sample, self._pq_trained = [], None, True
+
+    def commit(self) -> Dict[str, str]:
+        """Makes the snapshot visible; returns {format: blob path}."""
+        if self.committed:
+            return self.paths
+        if not self.rows:
+            self.committed = True
+            return {}
+        if not self._pq_trained:
+            self._train_codebook()      # fewer rows than the sample size: train on all of them
+        if self._stamped_now:
+            self.max_created_at = _now_utc_iso()
+        pending = {fmt: dict(self.info, files={self._paths[fmt]: part.finish()}, rows=self.rows, codec=self.codec,
+                             min_created_at=self.min_created_at, max_created_at=self.max_created_at)
+                   for fmt, part in self._parts.items()}
+        cc, _ = _blob_clients("")
+        for fmt, record in pending.items():
+            _upload_json(cc, _marker(fmt, self.partition, self._pending), record)
+        for fmt, record in pending.items():
+            _finish_commit(cc, fmt, self.partition, record, self._pending)
+        self.committed = True
+        return self.paths
+
+
+def _pq_sample_rows() -> int:
+    # at least one row per centroid (256 per sub-space); the number of sub-vectors does not matter
+    return max(256, settings.ARCHIVE_PQ_TRAIN_ROWS)
+
+
+def _marker(fmt: str, partition: str, name: str) -> str:
+    return _blob_clients(f"{fmt}/{partition.strip('/')}/{name}")[1]
+
+
+def _upload_json(cc, path: str, payload: dict):
+    cc.get_blob_client(path).upload_blob(json.dumps(payload).encode("utf-8"), overwrite=True,
+                                         content_type="application/json")
+
+
+def _merge_marker(earlier: dict | None, record: dict) -> dict:
+    """The snapshot marker after adding one run's files to a partition's earlier runs."""
+    marker = dict(record, files=sorted(record["files"]),
+                  committed_at=dt.datetime.utcnow().isoformat(timespec="seconds") + "Z")
+    if not earlier:
+        return marker
+    if set(marker["files"]) <= set(earlier["files"]):
+        return dict(earlier, committed_at=marker["committed_at"])     # a repeated commit
+    lows = [t for t in (earlier.get("min_created_at"), record.get("min_created_at")) if t]
+    highs = [t for t in (earlier.get("max_created_at"), record.get("max_created_at")) if t]
+    rows = None if earlier.get("rows") is None else earlier["rows"] + record["rows"]
+    return dict(marker, files=sorted(set(earlier["files"]) | set(marker["files"])), rows=rows,
+                min_created_at=min(lows) if lows else None, max_created_at=max(highs) if highs else None)
+
+
+def _finish_commit(cc, fmt: str, partition: str, record: dict, pending: str):
+    """Steps 2–3 of ArchiveSnapshot.commit; safe to repeat."""
+    for path, block_ids in record["files"].items():
+        _commit_blocks(cc.get_blob_client(path), block_ids)
+    blob = cc.get_blob_client(_marker(fmt, partition, SNAPSHOT_MARKER))
+    marker = _update_json(blob, lambda earlier: _merge_marker(earlier, record))
+    try:
+        cc.get_blob_client(_marker(fmt, partition, pending)).delete_blob()
+    except ResourceNotFoundError:
+        pass
+    record_snapshot(fmt, partition, marker)
+
+
+def resume_pending_commits() -> int:
+    """Finishes snapshot commits interrupted after their blocks were staged; returns how many."""
+    cc, prefix = _blob_clients("")
+    resumed = 0
+    for b in cc.list_blobs(name_starts_with=prefix):
+        fmt, _, rest = b.name[len(prefix):].partition("/")
+        partition, _, name = rest.rpartition("/")
+        if not partition or not is_pending_marker(name):
+            continue
+        record = json.loads(cc.get_blob_client(b.name).download_blob().readall())
+        try:
+            _finish_commit(cc, fmt, partition, record, name)
+            resumed += 1
+            log.info("Resumed archive commit for %s/%s", fmt, partition)
+        except ResourceNotFoundError as e:
+            # staged blocks expired: the snapshot cannot be completed any more
+            log.warning("Cannot resume archive commit for %s/%s: %s", fmt, partition, e)
+    return resumed
@@ -0,0 +1,117 @@
+# src/batching.py
+from __future__ import annotations
+import math
+import re
+from typing import Any, List, Sequence
+
+try:  # exact counts when tiktoken is available; otherwise a conservative estimate
+    import tiktoken
+    _ENC = tiktoken.get_encoding("cl100k_base")  # text-embedding-3-* / ada-002 tokenizer
+except Exception:  # pragma: no cover - depends on the environment
+    _ENC = None
+
+from .config import settings
+
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count of `text` for the embedding model. Without tiktoken this errs on the
+    high side (max of chars/4 and word+punctuation pieces) so batches never overflow.
+    """
+    if not text:
+        return 1
+    if _ENC is not None:
+        return max(1, len(_ENC.encode(text, disallowed_special=())))
+    return max(1, math.ceil(len(text) / 4), len(_PIECES.findall(text)))
+
+
+class BatchStats:
+    """Counters for how full the embedding requests of a run were."""
+
+    def __init__(self, max_inputs: int, max_tokens: int):
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.batches = 0
+        self.inputs = 0
+        self.tokens = 0
+
+    def record(self, n_inputs: int, n_tokens: int):
+        self.batches += 1
+        self.inputs += n_inputs
+        self.tokens += n_tokens
+
+    @property
+    def token_fill_ratio(self) -> float:
+        """Share of the per-request token budget actually used, averaged over batches."""
+        return self.tokens / (self.batches * self.max_tokens) if self.batches else 0.0
+
+    @property
+    def input_fill_ratio(self) -> float:
+        return self.inputs / (self.batches * self.max_inputs) if self.batches else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "batches": self.batches,
+            "inputs": self.inputs,
+            "tokens": self.tokens,
+            "token_fill_ratio": round(self.token_fill_ratio, 4),
+            "input_fill_ratio": round(self.input_fill_ratio, 4),
+        }
+
+
+class TokenBudgetBatcher:
+    """
+    Incremental packer for streams: add() items one at a time and get back the
+    full batch whenever the next item would not fit.
+    """
+
+    def __init__(self, max_inputs: int | None = None, max_tokens: int | None = None,
+                 stats: BatchStats | None = None):
+        self.max_inputs = max_inputs or settings.EMBED_MAX_BATCH_INPUTS
+        self.max_tokens = max_tokens or settings.EMBED_MAX_BATCH_TOKENS
+        self.stats = stats or BatchStats(self.max_inputs, self.max_tokens)
+        self._items: List[Any] = []
+        self._tokens = 0
+
+    def add(self, item: Any, n_tokens: int) -> List[Any] | None:
+        """Queues `item` costing `n_tokens`; returns the previous batch if it had to be closed."""
+        full = None
+        if self._items and (len(self._items) >= self.max_inputs or self._tokens + n_tokens > self.max_tokens):
+            full = self.flush()
+        self._items.append(item)
+        self._tokens += n_tokens
+        return full
+
+    def flush(self) -> List[Any] | None:
+        if not self._items:
+            return None
+        batch = self._items
+        self.stats.record(len(batch), self._tokens)
+        self._items, self._tokens = [], 0
+        return batch
+
+
+def pack_batches(
+    texts: Sequence[str],
+    max_inputs: int | None = None,
+    max_tokens: int | None = None,
+    stats: BatchStats | None = None,
+) -> List[List[int]]:
+    """
+    Packs texts into as few requests as possible under both the input-count and the
+    per-request token limit. Items are placed longest-first (next-fit decreasing),
+    which keeps batches close to full; each batch is returned as positions into `texts`.
+    """
+    batcher = TokenBudgetBatcher(max_inputs, max_tokens, stats)
+    costs = [estimate_tokens(t) for t in texts]
+    batches: List[List[int]] = []
+    for pos in sorted(range(len(texts)), key=costs.__getitem__, reverse=True):
+        full = batcher.add(pos, costs[pos])
+        if full:
+            batches.append(full)
+    last = batcher.flush()
+    if last:
+        batches.append(last)
+    return batches
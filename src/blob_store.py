@@ -0,0 +1,103 @@
+# src/blob_store.py
+from __future__ import annotations
+import os
+import uuid
+import threading
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient, ContainerClient
+
+from .config import settings
+
+# One client (and one HTTP connection pool) per process, shared by ingest,
+# the manifest and archive_store, so TLS sessions are reused across blobs.
+_service: BlobServiceClient | None = None
+_lock = threading.Lock()
+
+
+def _pooled_transport() -> RequestsTransport:
+    session = requests.Session()
+    # retries are handled by the azure-core pipeline, not by urllib3
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.BLOB_POOL_SIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return RequestsTransport(session=session, session_owner=False)
+
+
+def get_blob_service_client() -> BlobServiceClient:
+    global _service
+    with _lock:
+        if _service is None:
+            _service = BlobServiceClient.from_connection_string(
+                settings.AZURE_BLOB_CONNECTION_STRING,
+                transport=_pooled_transport(),
+            )
+        return _service
+
+
+def get_container_client(container: str | None = None) -> ContainerClient:
+    return get_blob_service_client().get_container_client(container or settings.AZURE_BLOB_CONTAINER)
+
+
+class BlobPayload:
+    """
+    A downloaded blob, either held in memory (`data`) or spilled to the scratch
+    area (`path`). Picklable, so it can be handed to parser processes as is.
+    """
+
+    __slots__ = ("name", "data", "path")
+
+    def __init__(self, name: str, data: bytes | None = None, path: str | None = None):
+        self.name = name
+        self.data = data
+        self.path = path
+
+    @property
+    def size(self) -> int:
+        if self.data is not None:
+            return len(self.data)
+        try:
+            return os.path.getsize(self.path) if self.path else 0
+        except OSError:
+            return 0
+
+    def release(self):
+        """Frees the bytes / removes the scratch file once the blob has been parsed."""
+        self.data = None
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+_scratch_ready = False
+
+
+def _scratch_path(blob_name: str) -> Path:
+    """Unique file in the shared scratch directory, keeping the extension for loader routing."""
+    global _scratch_ready
+    root = Path(settings.INGEST_SCRATCH_DIR)
+    if not _scratch_ready:
+        root.mkdir(parents=True, exist_ok=True)
+        _scratch_ready = True
+    return root / f"{uuid.uuid4().hex}{Path(blob_name).suffix}"
+
+
+def download_blob(blob_name: str, size: int | None = None) -> BlobPayload:
+    """
+    Blobs up to BLOB_INMEMORY_MAX_BYTES are read straight into memory; larger ones are
+    fetched with parallel ranged GETs (BLOB_DOWNLOAD_CONCURRENCY) into the scratch area.
+    """
+    bc = get_container_client().get_blob_client(blob_name)
+    if size is not None and 0 < size <= settings.BLOB_INMEMORY_MAX_BYTES:
+        return BlobPayload(blob_name, data=bc.download_blob().readall())
+
+    tmp = _scratch_path(blob_name)
+    with open(tmp, "wb") as f:
+        bc.download_blob(max_concurrency=settings.BLOB_DOWNLOAD_CONCURRENCY).readinto(f)
+    return BlobPayload(blob_name, path=str(tmp))
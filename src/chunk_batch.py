@@ -0,0 +1,110 @@
+# src/chunk_batch.py
+from __future__ import annotations
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+
+class ChunkBatch:
+    """
+    Embedded chunks in columnar form: parallel lists of ids / chunkIds / contents /
+    metadata and ONE contiguous float32 (n, dim) vector matrix.
+
+    A chunk dict with `vector` as a list[float] costs ~50 KB of boxed floats at 1536
+    dims; a matrix row costs 6 KB and needs no conversion before archiving or
+    scoring. Stages from embedding onwards (archive, upload) take a ChunkBatch; vectors
+    become lists only when a search document is serialised (search_docs()).
+    """
+
+    __slots__ = ("ids", "chunk_ids", "contents", "metadata", "vectors", "created_at")
+
+    def __init__(self, ids: List[str], chunk_ids: List[str], contents: List[str],
+                 metadata: List[dict], vectors: np.ndarray | None = None,
+                 created_at: List[str | None] | None = None):
+        self.ids = ids
+        self.chunk_ids = chunk_ids
+        self.contents = contents
+        self.metadata = metadata
+        self.vectors = vectors          # None until embedded
+        self.created_at = created_at    # archive timestamps of rows carried over by compaction
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return 0 if self.vectors is None else self.vectors.shape[1]
+
+    @property
+    def sources(self) -> List[str]:
+        return [m.get("source", "") for m in self.metadata]
+
+    @property
+    def doc_types(self) -> List[str]:
+        return [m.get("type", "unknown") for m in self.metadata]
+
+    # ── building ─────────────────────────────────────────────────────────────────
+    @classmethod
+    def from_chunks(cls, chunks: Sequence[dict]) -> "ChunkBatch":
+        """From chunk dicts ({id, chunkId, content, metadata, vector?, created_at?}); vectors
+        are kept only when every chunk has one."""
+        vectors = None
+        if chunks and all(c.get("vector") is not None for c in chunks):
+            vectors = np.stack([np.asarray(c["vector"], dtype=np.float32) for c in chunks])
+        created_at = [c.get("created_at") for c in chunks]
+        return cls([c["id"] for c in chunks], [c["chunkId"] for c in chunks],
+                   [c["content"] for c in chunks], [c.get("metadata") or {} for c in chunks], vectors,
+                   created_at if any(created_at) else None)
+
+    @classmethod
+    def concat(cls, batches: Iterable["ChunkBatch"]) -> "ChunkBatch":
+        batches = [b for b in batches if len(b)]
+        if not batches:
+            return cls([], [], [], [])
+        vectors = None
+        if all(b.vectors is not None for b in batches):
+            vectors = np.concatenate([b.vectors for b in batches])
+        created_at = None
+        if any(b.created_at for b in batches):
+            created_at = [t for b in batches for t in (b.created_at or [None] * len(b))]
+        return cls([i for b in batches for i in b.ids], [i for b in batches for i in b.chunk_ids],
+                   [t for b in batches for t in b.contents], [m for b in batches for m in b.metadata],
+                   vectors, created_at)
+
+    def take(self, rows: Sequence[int]) -> "ChunkBatch":
+        rows = list(rows)
+        return ChunkBatch([self.ids[i] for i in rows], [self.chunk_ids[i] for i in rows],
+                          [self.contents[i] for i in rows], [self.metadata[i] for i in rows],
+                          None if self.vectors is None else self.vectors[rows],
+                          None if self.created_at is None else [self.created_at[i] for i in rows])
+
+    def set_vectors(self, rows: Sequence[int], vectors) -> None:
+        """Writes embedding results into `rows`; the matrix is allocated on first use."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.vectors is None:
+            self.vectors = np.zeros((len(self), vectors.shape[1]), dtype=np.float32)
+        self.vectors[list(rows)] = vectors
+
+    # ── output ───────────────────────────────────────────────────────────────────
+    def search_docs(self) -> Iterable[Dict]:
+        """Index documents one by one; the only place a vector turns into a list."""
+        for i in range(len(self)):
+            meta = self.metadata[i]
+            yield {
+                "id": self.ids[i],
+                "content": self.contents[i],
+                "contentVector": self.vectors[i].tolist(),
+                "fileName": meta.get("source", ""),
+                "chunkId": self.chunk_ids[i],
+                "docType": meta.get("type", "unknown"),
+            }
+
+    def to_chunks(self) -> List[dict]:
+        """Chunk dicts (vectors as row views of the matrix, not lists) for dict-based callers."""
+        return [{"id": self.ids[i], "chunkId": self.chunk_ids[i], "content": self.contents[i],
+                 "metadata": self.metadata[i], "vector": None if self.vectors is None else self.vectors[i]}
+                for i in range(len(self))]
+
+
+def as_chunk_batch(chunks: "ChunkBatch | Sequence[dict]") -> ChunkBatch:
+    return chunks if isinstance(chunks, ChunkBatch) else ChunkBatch.from_chunks(chunks)
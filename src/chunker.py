@@ -1,26 +1,157 @@
 # src/chunker.py
 from __future__ import annotations
-from typing import Any, List, Dict
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import atexit
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from typing import Any, Iterable, List, Dict, Sequence, Tuple
 
+from .config import settings
 
-def _normalize_to_lc_docs(items: List[Any]) -> List[Any]:
+SEPARATORS = ("\n\n", "\n", " ", "")
+
+
+class RecursiveSplitter:
+    """
+    Same output as LangChain's RecursiveCharacterTextSplitter with its defaults
+    (keep_separator=True, strip_whitespace=True, length=len): split on the first
+    separator present, merge pieces up to chunk_size with chunk_overlap carried over,
+    recurse into pieces that are still too long. Plain str.split instead of regexes and
+    a deque for the overlap window; instances are cached (see get_splitter).
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 120, separators: Sequence[str] = SEPARATORS):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+
+    def split_text(self, text: str) -> List[str]:
+        out: List[str] = []
+        self._split(text, self.separators, out)
+        return out
+
+    def _split(self, text: str, separators: Sequence[str], out: List[str]):
+        separator, rest = separators[-1], ()
+        for i, s in enumerate(separators):
+            if s == "":
+                separator = s
+                break
+            if s in text:
+                separator, rest = s, separators[i + 1:]
+                break
+
+        if separator:
+            # the separator stays at the start of the piece that follows it
+            first, *others = text.split(separator)
+            pieces = [first] + [separator + p for p in others]
+        else:
+            pieces = list(text)
+
+        good: List[str] = []
+        for piece in pieces:
+            if not piece:
+                continue
+            if len(piece) < self.chunk_size:
+                good.append(piece)
+                continue
+            if good:
+                self._merge(good, out)
+                good = []
+            if rest:
+                self._split(piece, rest, out)
+            else:
+                out.append(piece)
+        if good:
+            self._merge(good, out)
+
+    def _merge(self, pieces: List[str], out: List[str]):
+        size, overlap = self.chunk_size, self.chunk_overlap
+        window: deque = deque()
+        total = 0
+        for piece in pieces:
+            n = len(piece)
+            if total + n > size and window:
+                chunk = "".join(window).strip()
+                if chunk:
+                    out.append(chunk)
+                while total > overlap or (total + n > size and total > 0):
+                    total -= len(window.popleft())
+            window.append(piece)
+            total += n
+        chunk = "".join(window).strip()
+        if chunk:
+            out.append(chunk)
+
+
+@lru_cache(maxsize=32)
+def get_splitter(chunk_size: int = 1000, chunk_overlap: int = 120) -> RecursiveSplitter:
+    return RecursiveSplitter(chunk_size, chunk_overlap)
+
+
+# ── parallel splitting of very large texts ─────────────────────────────────────
+_pool: ProcessPoolExecutor | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: splitting runs inside ingest's pipeline threads (see parse_pool)
+        _pool = ProcessPoolExecutor(max_workers=max(1, settings.CHUNK_PARALLEL_WORKERS),
+                                    mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def _segments(text: str, target: int) -> List[str]:
+    """Cuts `text` into pieces of about `target` chars, right before a paragraph (else line) break."""
+    segments, start = [], 0
+    while len(text) - start > target:
+        cut = text.find("\n\n", start + target)
+        if cut < 0:
+            cut = text.find("\n", start + target)
+        if cut < 0:
+            break
+        segments.append(text[start:cut])
+        start = cut
+    segments.append(text[start:])
+    return segments
+
+
+def _split_segment(segment: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    return get_splitter(chunk_size, chunk_overlap).split_text(segment)
+
+
+def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 120) -> List[str]:
+    """
+    Chunks of one text. Texts of at least CHUNK_PARALLEL_MIN_CHARS (when set) are cut at
+    paragraph breaks into CHUNK_PARALLEL_SEGMENT_CHARS segments that are split on a
+    process pool; chunks next to a cut may differ slightly from a serial split.
+    """
+    if settings.CHUNK_PARALLEL_MIN_CHARS and len(text) >= settings.CHUNK_PARALLEL_MIN_CHARS:
+        segments = _segments(text, max(chunk_size, settings.CHUNK_PARALLEL_SEGMENT_CHARS))
+        if len(segments) > 1:
+            parts = _get_pool().map(_split_segment, segments, repeat(chunk_size), repeat(chunk_overlap))
+            return [c for part in parts for c in part]
+    return get_splitter(chunk_size, chunk_overlap).split_text(text)
+
+
+def _iter_texts(items: Iterable[Any]) -> Iterable[Tuple[str, dict]]:
     """
     Accepts:
       - LangChain Documents (have .page_content/.metadata)
       - dicts with keys: page_content or content, and optional metadata
-    Returns a list of LC-like objects with .page_content and .metadata attributes.
+    Yields (text, metadata) pairs.
     """
-    normalized = []
     for d in items:
         if isinstance(d, dict):
-            content = d.get("page_content") or d.get("content") or ""
-            meta = d.get("metadata", {}) or {}
-            normalized.append(type("Doc", (), {"page_content": str(content), "metadata": dict(meta)}))
+            yield str(d.get("page_content") or d.get("content") or ""), d.get("metadata") or {}
         else:
             # assume LC Document or similar object
-            normalized.append(d)
-    return normalized
+            yield str(getattr(d, "page_content", "") or ""), getattr(d, "metadata", None) or {}
 
 
 def chunk_documents(
@@ -32,18 +163,10 @@ def chunk_documents(
     Splits documents into overlapping chunks and returns serializable dicts.
     Compatible with your previous code.
     """
-    normalized = _normalize_to_lc_docs(langchain_docs_or_dicts)
-
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=size,
-        chunk_overlap=overlap,
-        separators=["\n\n", "\n", " ", ""],
-    )
-
-    chunks = splitter.split_documents(normalized)
     return [
-        {"id": None, "content": c.page_content, "metadata": dict(c.metadata or {})}
-        for c in chunks
+        {"id": None, "content": chunk, "metadata": dict(meta)}
+        for text, meta in _iter_texts(langchain_docs_or_dicts)
+        for chunk in split_text(text, size, overlap)
     ]
 
 
@@ -55,16 +178,8 @@ def split_documents(
     """
     Alias for ingest.py — returns [{page_content, metadata}] for direct ingestion.
     """
-    normalized = _normalize_to_lc_docs(items)
-
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", " ", ""],
-    )
-
-    chunks = splitter.split_documents(normalized)
     return [
-        {"page_content": c.page_content, "metadata": dict(c.metadata or {})}
-        for c in chunks
+        {"page_content": chunk, "metadata": dict(meta)}
+        for text, meta in _iter_texts(items)
+        for chunk in split_text(text, chunk_size, chunk_overlap)
     ]
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,13 +8,106 @@ class Settings:
     AZURE_SEARCH_ENDPOINT = os.getenv("AZURE_SEARCH_ENDPOINT")
     AZURE_SEARCH_API_KEY = os.getenv("AZURE_SEARCH_API_KEY")
     AZURE_SEARCH_INDEX = os.getenv("AZURE_SEARCH_INDEX", "docs-index")
+    # Uploads: parallel requests, request size budget (service limit is 16 MB), retries
+    SEARCH_UPLOAD_WORKERS = int(os.getenv("SEARCH_UPLOAD_WORKERS", "4"))
+    SEARCH_MAX_BATCH_BYTES = int(os.getenv("SEARCH_MAX_BATCH_BYTES", str(12 * 1024 * 1024)))
+    SEARCH_UPLOAD_MAX_RETRIES = int(os.getenv("SEARCH_UPLOAD_MAX_RETRIES", "5"))
+    # Blue/green rebuilds: full runs build <index>-v<n> and switch the AZURE_SEARCH_INDEX alias
+    SEARCH_BLUE_GREEN = os.getenv("SEARCH_BLUE_GREEN", "false").lower() in ("1", "true", "yes")
+    SEARCH_KEEP_VERSIONS = int(os.getenv("SEARCH_KEEP_VERSIONS", "2"))
+    SEARCH_SWAP_MIN_RATIO = float(os.getenv("SEARCH_SWAP_MIN_RATIO", "0.9"))
+    SEARCH_SWAP_COUNT_TIMEOUT_SECONDS = float(os.getenv("SEARCH_SWAP_COUNT_TIMEOUT_SECONDS", "120"))
 
     AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
     AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
     AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small")
+    # Quota of the embedding deployment, used to throttle concurrent ingest requests
+    AZURE_OPENAI_EMBEDDING_TPM = int(os.getenv("AZURE_OPENAI_EMBEDDING_TPM", "120000"))
+    AZURE_OPENAI_EMBEDDING_RPM = int(os.getenv("AZURE_OPENAI_EMBEDDING_RPM", "720"))
+    EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+    EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+    # Per-request packing limits: inputs per call and estimated tokens per call
+    EMBED_MAX_BATCH_INPUTS = int(os.getenv("EMBED_MAX_BATCH_INPUTS", "2048"))
+    EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", "32000"))
+    # Persistent embedding cache (SQLite); set EMBED_CACHE_PATH= to disable
+    EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", ".cache/embeddings.sqlite")
+    EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "500000"))
+    # Duplicate chunks within a run: "link" = indexed with their canonical chunk's vector (not
+    # embedded), "drop" = not indexed at all, "off". Near duplicates: estimated Jaccard similarity
+    # of word shingles >= DEDUP_THRESHOLD (MinHash, DEDUP_NUM_PERM hashes in DEDUP_BANDS LSH bands)
+    DEDUP_POLICY = os.getenv("DEDUP_POLICY", "off").lower()
+    DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+    DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "64"))
+    DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "8"))
+    DEDUP_SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "3"))
+    DEDUP_MEMO_VECTORS = int(os.getenv("DEDUP_MEMO_VECTORS", "20000"))
 
     AZURE_BLOB_CONNECTION_STRING = os.getenv("AZURE_BLOB_CONNECTION_STRING")
     AZURE_BLOB_CONTAINER = os.getenv("AZURE_BLOB_CONTAINER", "documents")
+    # Shared blob client: HTTP pool size, in-memory threshold, ranged download fan-out
+    BLOB_POOL_SIZE = int(os.getenv("BLOB_POOL_SIZE", "32"))
+    BLOB_INMEMORY_MAX_BYTES = int(os.getenv("BLOB_INMEMORY_MAX_BYTES", str(8 * 1024 * 1024)))
+    BLOB_DOWNLOAD_CONCURRENCY = int(os.getenv("BLOB_DOWNLOAD_CONCURRENCY", "4"))
+    INGEST_SCRATCH_DIR = os.getenv("INGEST_SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "ingest-scratch"))
+    # Embeddings archive vector encoding: float32 | float16 | int8 | pq (PQ sub-vectors 0 = dim/8,
+    # codebook trained on the first ARCHIVE_PQ_TRAIN_ROWS rows of a snapshot)
+    ARCHIVE_VECTOR_CODEC = os.getenv("ARCHIVE_VECTOR_CODEC", "float32").lower()
+    ARCHIVE_PQ_SUBVECTORS = int(os.getenv("ARCHIVE_PQ_SUBVECTORS", "0"))
+    ARCHIVE_PQ_TRAIN_ROWS = int(os.getenv("ARCHIVE_PQ_TRAIN_ROWS", "10240"))
+    # Streaming snapshot writer: staged block size, Parquet row group, NPZ in-memory spool
+    ARCHIVE_BLOCK_BYTES = int(os.getenv("ARCHIVE_BLOCK_BYTES", str(8 * 1024 * 1024)))
+    ARCHIVE_ROW_GROUP_ROWS = int(os.getenv("ARCHIVE_ROW_GROUP_ROWS", "2048"))
+    ARCHIVE_SPOOL_MAX_BYTES = int(os.getenv("ARCHIVE_SPOOL_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Streaming ingest: stages run concurrently, connected by bounded queues
+    INGEST_STREAMING = os.getenv("INGEST_STREAMING", "false").lower() in ("1", "true", "yes")
+    INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "8"))
+    # Document parsing runs in worker processes; 0 workers = parse inline
+    PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+    PARSE_LARGE_WORKERS = int(os.getenv("PARSE_LARGE_WORKERS", "1"))
+    PARSE_LARGE_FILE_BYTES = int(os.getenv("PARSE_LARGE_FILE_BYTES", str(20 * 1024 * 1024)))
+    PARSE_TIMEOUT_SECONDS = float(os.getenv("PARSE_TIMEOUT_SECONDS", "300"))
+    # Splitting: texts of at least CHUNK_PARALLEL_MIN_CHARS are split in segments on a process pool (0 = off)
+    CHUNK_PARALLEL_MIN_CHARS = int(os.getenv("CHUNK_PARALLEL_MIN_CHARS", "0"))
+    CHUNK_PARALLEL_SEGMENT_CHARS = int(os.getenv("CHUNK_PARALLEL_SEGMENT_CHARS", str(1024 * 1024)))
+    CHUNK_PARALLEL_WORKERS = int(os.getenv("CHUNK_PARALLEL_WORKERS", str(os.cpu_count() or 2)))
+    # CSV / Excel: streamed TABLE_READ_ROWS rows at a time into row-range documents (header repeated)
+    TABLE_READ_ROWS = int(os.getenv("TABLE_READ_ROWS", "10000"))
+    TABLE_DOC_MAX_CHARS = int(os.getenv("TABLE_DOC_MAX_CHARS", "900"))
+    # PDF pages with less than PDF_OCR_MIN_CHARS of text get their images OCR'd (scans),
+    # on PDF_OCR_WORKERS threads per parse process; text pages are extracted serially
+    PDF_OCR_WORKERS = int(os.getenv("PDF_OCR_WORKERS", "2"))
+    PDF_OCR_MIN_CHARS = int(os.getenv("PDF_OCR_MIN_CHARS", "16"))
+    # OCR input is downscaled to OCR_MAX_SIDE px and binarized; results are cached by image hash (empty = off)
+    OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2000"))
+    OCR_BINARIZE = os.getenv("OCR_BINARIZE", "true").lower() in ("1", "true", "yes")
+    OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", ".cache/ocr")
+    # Incremental ingest: only new/changed blobs, tracked in a manifest blob
+    INGEST_INCREMENTAL = os.getenv("INGEST_INCREMENTAL", "false").lower() in ("1", "true", "yes")
+    INGEST_MANIFEST_BLOB = os.getenv("INGEST_MANIFEST_BLOB", "ingest-state/manifest.json")
+
+    # Query API: connection pool per shared client, cache of query embeddings
+    QUERY_POOL_SIZE = int(os.getenv("QUERY_POOL_SIZE", "100"))
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "10000"))
+    QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+    QUERY_EMBED_WINDOW_MS = float(os.getenv("QUERY_EMBED_WINDOW_MS", "5"))
+    QUERY_EMBED_MAX_BATCH = int(os.getenv("QUERY_EMBED_MAX_BATCH", "16"))
+    SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "100"))
+    SEARCH_BATCH_CONCURRENCY = int(os.getenv("SEARCH_BATCH_CONCURRENCY", "8"))
+
+    # Query backend: azure | local | azure+local (local index answers when Azure fails or is slow)
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "azure")
+    SEARCH_FALLBACK_TIMEOUT_MS = float(os.getenv("SEARCH_FALLBACK_TIMEOUT_MS", "1500"))
+    LOCAL_INDEX_ARCHIVE_FORMAT = os.getenv("LOCAL_INDEX_ARCHIVE_FORMAT", "npz")
+    LOCAL_INDEX_PARTITION = os.getenv("LOCAL_INDEX_PARTITION", "")
+    # Local ANN: none (exact) | ivf; nlist 0 = 4·sqrt(n) lists
+    LOCAL_INDEX_ANN = os.getenv("LOCAL_INDEX_ANN", "none").lower()
+    ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+    ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+    ANN_CACHE_DIR = os.getenv("ANN_CACHE_DIR", ".cache/ann")
+    # Local index first pass on compressed codes: none | int8 | pq, then exact rescoring of rescore·k rows
+    LOCAL_INDEX_CODEC = os.getenv("LOCAL_INDEX_CODEC", "none").lower()
+    LOCAL_INDEX_RESCORE = int(os.getenv("LOCAL_INDEX_RESCORE", "4"))
 
     APP_PORT = int(os.getenv("APP_PORT", "8080"))
 
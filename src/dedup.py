@@ -0,0 +1,172 @@
+# src/dedup.py
+from __future__ import annotations
+import re
+import zlib
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .config import settings
+from .batching import estimate_tokens
+from .chunk_batch import ChunkBatch
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_PRIME = (1 << 31) - 1
+POLICIES = ("link", "drop", "off")
+
+
+class DedupStats:
+    """What duplicate elimination saved in a run."""
+
+    def __init__(self):
+        self.chunks = 0
+        self.exact = 0
+        self.near = 0
+        self.dropped = 0
+        self.linked = 0
+        self.tokens_saved = 0
+
+    @property
+    def duplicates(self) -> int:
+        return self.exact + self.near
+
+    def as_dict(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "exact": self.exact,
+            "near": self.near,
+            "linked": self.linked,
+            "dropped": self.dropped,
+            "tokens_saved": self.tokens_saved,
+            "duplicate_ratio": round(self.duplicates / self.chunks, 4) if self.chunks else 0.0,
+        }
+
+
+class MinHasher:
+    """MinHash signatures of word k-shingles; (a·h + b) mod 2^31-1 over all hashes at once."""
+
+    def __init__(self, num_perm: int = 64, shingle_words: int = 3, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+        self.k = shingle_words
+
+    def signature(self, text: str) -> np.ndarray | None:
+        """None for texts with fewer than k words (too short to compare by shingles)."""
+        words = _WORD.findall(text.lower())
+        if len(words) < self.k:
+            return None
+        shingles = {" ".join(words[i:i + self.k]) for i in range(len(words) - self.k + 1)}
+        h = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles),
+                        dtype=np.uint64, count=len(shingles))
+        return ((h[:, None] * self.a[None, :] + self.b[None, :]) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+class ChunkDeduper:
+    """
+    Finds chunks that repeat an earlier chunk of the run: exact duplicates by the hash
+    of their whitespace-normalised text, near duplicates by MinHash with LSH banding
+    (candidates share a band; kept when their signatures agree on >= threshold of the
+    hashes, an estimate of the shingle Jaccard similarity). The first chunk of a group
+    is its canonical chunk. Holds a hash and a signature per canonical chunk (~300 bytes).
+    """
+
+    def __init__(self, policy: str | None = None, threshold: float | None = None, num_perm: int | None = None,
+                 bands: int | None = None, shingle_words: int | None = None):
+        self.policy = (policy or settings.DEDUP_POLICY).lower()
+        if self.policy not in POLICIES:
+            raise ValueError(f"DEDUP_POLICY must be one of {POLICIES}, got {self.policy!r}")
+        self.threshold = settings.DEDUP_THRESHOLD if threshold is None else threshold
+        num_perm = num_perm or settings.DEDUP_NUM_PERM
+        self.bands = bands or settings.DEDUP_BANDS
+        if num_perm % self.bands:
+            raise ValueError(f"DEDUP_NUM_PERM ({num_perm}) must be a multiple of DEDUP_BANDS ({self.bands})")
+        self.rows = num_perm // self.bands
+        self.hasher = MinHasher(num_perm, shingle_words or settings.DEDUP_SHINGLE_WORDS)
+        self.stats = DedupStats()
+        self.dropped_ids: set = set()       # "drop": chunks left out of the index (and so out of the manifest)
+        self._exact: Dict[bytes, str] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+
+    def check(self, key: str, text: str) -> str | None:
+        """
+        The canonical key `text` duplicates, or None (then `key` becomes a canonical chunk).
+        Counts the duplicate; the caller counts its tokens as saved (saved()) once it is
+        actually not embedded.
+        """
+        self.stats.chunks += 1
+        digest = hashlib.sha256(" ".join(text.split()).encode("utf-8")).digest()
+        canonical = self._exact.get(digest)
+        if canonical is not None:
+            self.stats.exact += 1
+            return canonical
+
+        sig = self.hasher.signature(text)
+        bands = [] if sig is None else [(j, sig[j * self.rows:(j + 1) * self.rows].tobytes())
+                                        for j in range(self.bands)]
+        seen = set()
+        for band in bands:
+            for other in self._buckets.get(band, ()):
+                if other in seen:
+                    continue
+                seen.add(other)
+                if np.mean(self._signatures[other] == sig) >= self.threshold:
+                    self.stats.near += 1
+                    return other
+
+        self._exact[digest] = key
+        if sig is not None:
+            self._signatures[key] = sig
+            for band in bands:
+                self._buckets.setdefault(band, []).append(key)
+        return None
+
+    def saved(self, texts):
+        """Counts the tokens of duplicates that were dropped or got their canonical vector."""
+        self.stats.tokens_saved += sum(estimate_tokens(t) for t in texts)
+
+    def apply(self, batch: ChunkBatch) -> Tuple[ChunkBatch, Dict[int, int]]:
+        """
+        Batch mode. "drop" returns the batch without duplicates; "link" returns it whole
+        plus {duplicate row: canonical row}, for rows that should copy a vector instead
+        of being embedded.
+        """
+        rows: Dict[str, int] = {}
+        links: Dict[int, int] = {}
+        for i, (key, text) in enumerate(zip(batch.ids, batch.contents)):
+            canonical = self.check(key, text)
+            if canonical is None:
+                rows[key] = i
+            else:
+                links[i] = rows[canonical]
+        self.saved(batch.contents[i] for i in links)
+        if self.policy == "drop" and links:
+            self.stats.dropped += len(links)
+            self.dropped_ids.update(batch.ids[i] for i in links)
+            return batch.take([i for i in range(len(batch)) if i not in links]), {}
+        self.stats.linked += len(links)
+        return batch, links
+
+
+class VectorMemo:
+    """Recently embedded canonical vectors by chunk key (streaming "link"), least recently used evicted."""
+
+    def __init__(self, max_entries: int | None = None):
+        self.max_entries = max_entries or settings.DEDUP_MEMO_VECTORS
+        self._vectors: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def remember(self, batch: ChunkBatch):
+        for key, vec in zip(batch.ids, batch.vectors):
+            self._vectors[key] = vec.copy()     # a view would keep the whole batch matrix alive
+            self._vectors.move_to_end(key)
+        while len(self._vectors) > self.max_entries:
+            self._vectors.popitem(last=False)
+
+    def get(self, key: str) -> np.ndarray | None:
+        vec = self._vectors.get(key)
+        if vec is not None:
+            self._vectors.move_to_end(key)
+        return vec
@@ -0,0 +1,89 @@
+# src/embed_coalescer.py
+from __future__ import annotations
+import asyncio
+from typing import Awaitable, Callable, List, Set, Tuple
+
+
+class EmbeddingCoalescer:
+    """
+    Micro-batches concurrent query embeddings on the event loop. Texts that arrive within
+    `window_ms` of the first pending one (or until `max_batch` are pending) go out as a
+    single embeddings call, and each caller gets back only its own vectors. A caller's
+    own list is never split across calls.
+    """
+
+    def __init__(
+        self,
+        aembed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+        window_ms: float = 5.0,
+        max_batch: int = 16,
+    ):
+        self.aembed_fn = aembed_fn
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.calls = 0
+        self.inputs = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Drop-in for aembed_texts: same inputs, same output order."""
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        futs = []
+        for t in texts:
+            fut = loop.create_future()
+            self._pending.append((t, fut))
+            futs.append(fut)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return list(await asyncio.gather(*futs))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._send(batch))
+        # the loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        self.calls += 1
+        self.inputs += len(batch)
+        try:
+            vectors = await self.aembed_fn([t for t, _ in batch])
+        except BaseException as e:
+            for _, fut in batch:
+                if fut.done():
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    fut.cancel()
+                else:
+                    fut.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        if len(vectors) != len(batch):
+            err = ValueError(f"Embedding call returned {len(vectors)} vectors for {len(batch)} inputs")
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(err)
+            return
+        for (_, fut), vec in zip(batch, vectors):
+            if not fut.done():  # the caller may have gone away meanwhile
+                fut.set_result(vec)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "inputs": self.inputs,
+            "mean_batch_size": round(self.inputs / self.calls, 2) if self.calls else 0.0,
+        }
@@ -0,0 +1,138 @@
+# src/embedding_cache.py
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Sequence
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    deployment TEXT    NOT NULL,
+    dims       INTEGER NOT NULL,
+    text_sha   TEXT    NOT NULL,
+    vector     BLOB    NOT NULL,
+    last_used  REAL    NOT NULL,
+    PRIMARY KEY (deployment, dims, text_sha)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used);
+"""
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of embedding vectors in a local SQLite file.
+    Entries are keyed by (deployment, dimensions, SHA-256 of the text), so switching
+    models never returns stale vectors. Vectors are stored as raw float32 bytes.
+    When more than `max_entries` rows exist the least recently used ones are evicted.
+    hits/misses count lookups since the cache was opened (i.e. per ingestion run).
+    """
+
+    def __init__(self, path: str, deployment: str, dimensions: int, max_entries: int = 500_000):
+        self.path = path
+        self.deployment = deployment
+        self.dimensions = int(dimensions)
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, texts: Sequence[str], as_array: bool = False) -> List[List[float] | np.ndarray | None]:
+        """
+        Cached vector for each text, or None where it has not been embedded before.
+        With as_array the vectors are read-only float32 views of the stored bytes.
+        """
+        shas = [text_sha256(t) for t in texts]
+        found: dict[str, bytes] = {}
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for i in range(0, len(shas), 500):
+                part = shas[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT text_sha, vector FROM embeddings WHERE deployment=? AND dims=? "
+                    f"AND text_sha IN ({','.join('?' * len(part))})",
+                    (self.deployment, self.dimensions, *part),
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used=? WHERE deployment=? AND dims=? AND text_sha=?",
+                    [(now, self.deployment, self.dimensions, s) for s in found],
+                )
+        out: List[List[float] | None] = []
+        for s in shas:
+            blob = found.get(s)
+            if blob is None:
+                out.append(None)
+            else:
+                vec = np.frombuffer(blob, dtype=np.float32)
+                out.append(vec if as_array else vec.tolist())
+        hits = sum(v is not None for v in out)
+        self.hits += hits
+        self.misses += len(out) - hits
+        return out
+
+    def get(self, text: str, as_array: bool = False) -> List[float] | np.ndarray | None:
+        return self.get_many([text], as_array)[0]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        now = time.time()
+        rows = [
+            (self.deployment, self.dimensions, text_sha256(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        if not rows:
+            return
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings(deployment, dims, text_sha, vector, last_used) VALUES (?,?,?,?,?)",
+                rows,
+            )
+            self._db.execute("COMMIT")
+            self._count += self._db.total_changes - before
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # drop down to 90% of the bound so we don't evict on every insert
+        excess = self._count - int(self.max_entries * 0.9)
+        self._db.execute(
+            "DELETE FROM embeddings WHERE (deployment, dims, text_sha) IN "
+            "(SELECT deployment, dims, text_sha FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "entries": self._count,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,8 +1,19 @@
 # src/embeddings.py
 from __future__ import annotations
 import os
-from typing import List
-from openai import AzureOpenAI
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+import httpx
+from openai import AsyncAzureOpenAI, AzureOpenAI, APIConnectionError, APIStatusError
+
+from .config import settings
+from .batching import estimate_tokens
+
+log = logging.getLogger("embeddings")
 
 # Lazily initialized singleton
 _client: AzureOpenAI | None = None
@@ -27,6 +38,33 @@ def _get_client() -> AzureOpenAI:
         )
     return _client
 
+def create_async_client(pool_size: int | None = None) -> AsyncAzureOpenAI:
+    """
+    Async client for the query path. Create it once (FastAPI lifespan) and close it on
+    shutdown; the underlying httpx pool keeps up to `pool_size` connections alive.
+    """
+    pool_size = pool_size or settings.QUERY_POOL_SIZE
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=60),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    )
+    return AsyncAzureOpenAI(
+        api_key=_require_env("AZURE_OPENAI_API_KEY"),
+        azure_endpoint=_require_env("AZURE_OPENAI_ENDPOINT"),
+        api_version="2024-07-01-preview",
+        http_client=http_client,
+    )
+
+
+async def aembed_texts(client: AsyncAzureOpenAI, texts: List[str]) -> List[List[float]]:
+    """Async embed_texts on a shared client (see create_async_client)."""
+    if not texts:
+        return []
+    model = _require_env("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+    resp = await client.embeddings.create(model=model, input=texts)
+    return [d.embedding for d in resp.data]
+
+
 def embed_texts(texts: List[str]) -> List[List[float]]:
     """
     Returns one embedding vector per input text.
@@ -39,3 +77,151 @@ def embed_texts(texts: List[str]) -> List[List[float]]:
     resp = client.embeddings.create(model=model, input=texts)
     # preserve order
     return [d.embedding for d in resp.data]
+
+
+# ── Concurrent, rate-limited scheduler (used by ingestion) ─────────────────────
+
+# Status codes worth retrying: throttling and transient service errors
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _embed_once(texts: List[str]) -> List[List[float]]:
+    """Single embeddings call with SDK retries off; the scheduler owns retrying."""
+    model = _require_env("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+    client = _get_client().with_options(max_retries=0)
+    resp = client.embeddings.create(model=model, input=texts)
+    return [d.embedding for d in resp.data]
+
+
+class _TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute / 60` units per second.
+    Capacity is a 10 s burst, matching how Azure OpenAI evaluates TPM/RPM quotas.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute / 6.0)
+        self._level = self.capacity
+        self._clock = clock
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._level = min(self.capacity, self._level + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, amount: float, sleep: Callable[[float], None] = time.sleep):
+        # a single request larger than the burst may still go through on a full bucket
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._level >= amount:
+                    self._level -= amount
+                    return
+                wait = (amount - self._level) / self.rate
+            sleep(wait)
+
+
+def _retry_after_seconds(err: Exception) -> float | None:
+    """Reads Retry-After / retry-after-ms from a throttled response, if present."""
+    response = getattr(err, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _is_retryable(err: Exception) -> bool:
+    if isinstance(err, APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(err, APIStatusError):
+        return err.status_code in _RETRYABLE_STATUS
+    return getattr(err, "status_code", None) in _RETRYABLE_STATUS
+
+
+class EmbeddingScheduler:
+    """
+    Runs several embedding requests in flight on a thread pool while staying inside
+    the deployment's TPM/RPM quota. Throttled or transient failures are retried with
+    exponential backoff + full jitter, never sooner than the service's Retry-After.
+    Results come back in the order the batches were given.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]] | None = None,
+        max_concurrency: int | None = None,
+        tokens_per_minute: int | None = None,
+        requests_per_minute: int | None = None,
+        max_retries: int | None = None,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.embed_fn = embed_fn or _embed_once
+        self.max_concurrency = max_concurrency or settings.EMBED_MAX_CONCURRENCY
+        self.max_retries = settings.EMBED_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self._tokens = _TokenBucket(tokens_per_minute or settings.AZURE_OPENAI_EMBEDDING_TPM)
+        self._requests = _TokenBucket(requests_per_minute or settings.AZURE_OPENAI_EMBEDDING_RPM)
+
+    def _backoff(self, attempt: int, err: Exception) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = _retry_after_seconds(err)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _run_batch(self, batch: List[str]) -> List[List[float]]:
+        cost = sum(estimate_tokens(t) for t in batch)
+        attempt = 0
+        while True:
+            self._requests.acquire(1, self._sleep)
+            self._tokens.acquire(cost, self._sleep)
+            try:
+                vecs = self.embed_fn(batch)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                log.warning("Embedding request failed (%s); retry %d/%d in %.1fs",
+                            e, attempt, self.max_retries, delay)
+                self._sleep(delay)
+        if len(vecs) != len(batch):
+            raise RuntimeError(f"Embedding count mismatch: got {len(vecs)} for {len(batch)} inputs")
+        return vecs
+
+    def embed_batches(self, batches: List[List[str]]) -> List[List[List[float]]]:
+        """Embeds every batch, up to `max_concurrency` at a time; output order == input order."""
+        if not batches:
+            return []
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            return [self._run_batch(b) for b in batches]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches)),
+                                thread_name_prefix="embed") as pool:
+            return list(pool.map(self._run_batch, batches))
+
+
+_scheduler: EmbeddingScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> EmbeddingScheduler:
+    """Process-wide scheduler so every caller shares the same quota buckets."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = EmbeddingScheduler()
+        return _scheduler
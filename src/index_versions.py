@@ -0,0 +1,169 @@
+# src/index_versions.py
+"""
+Blue/green search indexes. Full rebuilds go into a new physical index
+(<AZURE_SEARCH_INDEX>-v<n>); once its document count checks out, the index alias
+AZURE_SEARCH_INDEX is switched to it in one call, so every client that uses the
+alias name (queries, incremental ingest) moves over without an empty window.
+
+    python -m src.index_versions                 # versions and the live one
+    python -m src.index_versions promote NAME    # switch the alias (e.g. roll back)
+    python -m src.index_versions gc              # delete old versions
+"""
+from __future__ import annotations
+import re
+import sys
+import time
+import logging
+from typing import List
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.search.documents.indexes.models import SearchAlias
+
+from .config import settings
+from .search_index import INDEX_NAME, ensure_index, get_index_client, get_search_client
+
+log = logging.getLogger("index_versions")
+
+_VERSION = re.compile(rf"^{re.escape(INDEX_NAME)}-v(\d+)$")
+
+
+class PromotionError(RuntimeError):
+    """A new index version failed its checks; the alias was left unchanged."""
+
+
+def versioned_name(n: int) -> str:
+    return f"{INDEX_NAME}-v{n}"
+
+
+def list_versions() -> List[str]:
+    """Physical index versions, oldest first."""
+    names = [n for n in get_index_client().list_index_names() if _VERSION.match(n)]
+    return sorted(names, key=lambda n: int(_VERSION.match(n).group(1)))
+
+
+def live_index() -> str | None:
+    """The index behind the alias; the plain AZURE_SEARCH_INDEX index before the first switch."""
+    ic = get_index_client()
+    try:
+        return ic.get_alias(INDEX_NAME).indexes[0]
+    except ResourceNotFoundError:
+        pass
+    try:
+        return ic.get_index(INDEX_NAME).name
+    except ResourceNotFoundError:
+        return None
+
+
+def alias_exists() -> bool:
+    try:
+        get_index_client().get_alias(INDEX_NAME)
+        return True
+    except ResourceNotFoundError:
+        return False
+
+
+def create_next_version() -> str:
+    """Creates the next empty version (same schema as ensure_index) and returns its name."""
+    versions = list_versions()
+    n = int(_VERSION.match(versions[-1]).group(1)) + 1 if versions else 1
+    name = versioned_name(n)
+    ensure_index(name)
+    log.info("Created index version %s", name)
+    return name
+
+
+def discard_version(index_name: str):
+    """
+    Deletes a version whose build or promotion failed, so it does not pile up (gc_versions
+    never deletes versions newer than the live one). The live index is never deleted.
+    """
+    if index_name == live_index():
+        return
+    try:
+        get_index_client().delete_index(index_name)
+        log.warning("Deleted index version %s, which was not promoted", index_name)
+    except Exception as e:
+        # the original failure matters more; the version can still be deleted by hand
+        log.error("Could not delete index version %s: %s", index_name, e)
+
+
+def document_count(index_name: str) -> int:
+    return get_search_client(index_name).get_document_count()
+
+
+def wait_for_count(index_name: str, expected: int, timeout: float | None = None) -> int:
+    """Polls the (eventually consistent) document count until it reaches `expected` or times out."""
+    timeout = settings.SEARCH_SWAP_COUNT_TIMEOUT_SECONDS if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    while True:
+        count = document_count(index_name)
+        if count >= expected or time.monotonic() >= deadline:
+            return count
+        time.sleep(min(2.0, max(0.0, deadline - time.monotonic())))
+
+
+def promote(index_name: str, expected: int | None = None, force: bool = False) -> str | None:
+    """
+    Points the alias at `index_name` and returns the previously live index. Unless
+    `force`, the new index must hold `expected` documents (when given) and at least
+    SEARCH_SWAP_MIN_RATIO of the live index's count; otherwise PromotionError.
+    """
+    previous = live_index()
+    if not force:
+        count = wait_for_count(index_name, expected or 1)
+        if count == 0 or (expected is not None and count < expected):
+            raise PromotionError(f"{index_name} holds {count} documents, expected {expected or 'some'}")
+        if previous and previous != index_name:
+            live_count = document_count(previous)
+            if count < settings.SEARCH_SWAP_MIN_RATIO * live_count:
+                raise PromotionError(f"{index_name} holds {count} documents, live {previous} holds {live_count} "
+                                     f"(SEARCH_SWAP_MIN_RATIO={settings.SEARCH_SWAP_MIN_RATIO})")
+
+    ic = get_index_client()
+    if previous == INDEX_NAME:
+        # first switch: an alias cannot share its name with an index, so the original
+        # unversioned index has to go (the only moment with a short gap)
+        log.warning("Replacing index %s with an alias of the same name", INDEX_NAME)
+        ic.delete_index(INDEX_NAME)
+        previous = None
+    ic.create_or_update_alias(SearchAlias(name=INDEX_NAME, indexes=[index_name]))
+    log.info("Alias %s → %s (was %s)", INDEX_NAME, index_name, previous)
+    return previous
+
+
+def gc_versions(keep: int | None = None) -> List[str]:
+    """
+    Deletes old versions: the live one and the keep - 1 versions before it stay
+    (SEARCH_KEEP_VERSIONS, for rollback). Versions newer than the live one (a build in
+    progress, or one that failed promotion) are never deleted. Returns the deleted names.
+    """
+    keep = max(1, keep or settings.SEARCH_KEEP_VERSIONS)
+    live = live_index()
+    versions = list_versions()
+    if live not in versions:
+        log.info("Alias does not point at a version (%s); nothing to delete", live)
+        return []
+    older = versions[:versions.index(live)]
+    deleted = older[:len(older) - (keep - 1)] if len(older) >= keep else []
+    ic = get_index_client()
+    for name in deleted:
+        ic.delete_index(name)
+        log.info("Deleted old index version %s", name)
+    return deleted
+
+
+def main(argv: List[str]):
+    if argv[:1] == ["promote"] and len(argv) == 2:
+        promote(argv[1], force=True)
+        return
+    if argv[:1] == ["gc"]:
+        print("deleted:", ", ".join(gc_versions()) or "nothing")
+        return
+    live = live_index()
+    for name in list_versions():
+        print(f"{'*' if name == live else ' '} {name}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    main(sys.argv[1:])
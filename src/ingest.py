@@ -1,90 +1,79 @@
 from __future__ import annotations
 
 import io
-import os
-import uuid
-import shutil
+import hashlib
 import logging
-import tempfile
-from pathlib import Path
 from typing import Iterable, List, Dict
 
-from azure.storage.blob import BlobServiceClient
+import numpy as np
 
 from .config import settings
-from .loaders import load_document
+from .blob_store import BlobPayload, download_blob, get_container_client
+from .parse_pool import ParsePool
 from .chunker import split_documents
-from .embeddings import embed_texts
-from .search_index import ensure_index, upload_docs, clear_index
-# archival is optional; if you don't want it, you can comment these 3 lines
-from .archive_store import (
-    to_records_with_serialized_vectors,
-    save_parquet_to_blob,
-    save_npz_to_blob,
-)
+from .batching import BatchStats, TokenBudgetBatcher, estimate_tokens, pack_batches
+from .embeddings import get_scheduler
+from .embedding_cache import EmbeddingCache
+from .chunk_batch import ChunkBatch
+from .dedup import ChunkDeduper, VectorMemo
+from .manifest import INTERNAL_PREFIXES, BlobInfo, BlobManifest
+from .pipeline import run_pipeline
+from .search_index import DIM, UploadSummary, ensure_index, upload_docs, delete_docs, clear_index
+from . import index_versions
+# archival is optional; if you don't want it, you can comment these 2 lines
+from .archive_store import default_partition
+from .archive_writer import ArchiveSnapshot
 
 log = logging.getLogger("ingest")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 
-BATCH_SIZE = 128  # tune for your AOAI throughput
 
-
-def _blob_client() -> BlobServiceClient:
-    return BlobServiceClient.from_connection_string(settings.AZURE_BLOB_CONNECTION_STRING)
+def _iter_blobs(prefix: str | None = None) -> Iterable[BlobInfo]:
+    """Lists source blobs with the etag / last-modified metadata incremental mode needs."""
+    cc = get_container_client()
+    for b in cc.list_blobs(name_starts_with=prefix or ""):
+        # skip folders / zero-length pseudo-dirs and the pipeline's own archive/state
+        if not b.name or b.name.endswith("/") or b.name.startswith(INTERNAL_PREFIXES):
+            continue
+        yield BlobInfo.from_properties(b)
 
 
 def _iter_blob_names(prefix: str | None = None) -> Iterable[str]:
-    bs = _blob_client()
-    cc = bs.get_container_client(settings.AZURE_BLOB_CONTAINER)
-    for b in cc.list_blobs(name_starts_with=prefix or ""):
-        # skip folders / zero-length pseudo-dirs
-        if not b.name or b.name.endswith("/"):
-            continue
+    for b in _iter_blobs(prefix=prefix):
         yield b.name
 
 
-def _download_blob_to_temp(blob_name: str) -> Path:
-    """Download a blob to a temp file, preserving extension for loader routing."""
-    bs = _blob_client()
-    cc = bs.get_container_client(settings.AZURE_BLOB_CONTAINER)
-    bc = cc.get_blob_client(blob_name)
-    suffix = Path(blob_name).suffix or ""
-    tmp = Path(tempfile.mkdtemp(prefix="ingest_")) / f"blob{suffix}"
-    with open(tmp, "wb") as f:
-        stream = bc.download_blob()
-        stream.readinto(f)
-    return tmp
-
+def _chunk_key(source: str, chunk_idx: int, text: str) -> str:
+    """Index key derived from source + chunk index + content hash, stable across runs."""
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha1(f"{source}|{chunk_idx}|{content_hash}".encode("utf-8")).hexdigest()
 
-def _cleanup_temp(path: Path):
-    try:
-        shutil.rmtree(path.parent, ignore_errors=True)
-    except Exception:
-        pass
 
-
-def _to_chunks_for_index(docs: List[Dict]) -> List[Dict]:
+def _to_chunks_for_index(docs: List[Dict], blob_name: str | None = None, start: int = 0) -> List[Dict]:
     """
     Input docs format expected from loaders.load_document:
         [{ "page_content": "...", "metadata": {"source": "...", "type": "...", ...} }, ...]
     Output chunks for indexing:
         [{ id, chunkId, content, metadata }, ...]
+    `blob_name` overrides the loader's source, which is only a local temp path.
+    `start` is the first chunk index, for a file that arrives in parts.
     """
     chunks = []
-    # split_documents should accept that docs format; adjust if your signature differs
+    counters: Dict[str, int] = {}   # running chunk index per source
     for ch in split_documents(docs):
-        text = ch.get("page_content") if isinstance(ch, dict) else getattr(ch, "page_content", "")
-        if not text or not str(text).strip():
+        text = ch["page_content"]
+        if not text.strip():
             continue
-        meta = ch.get("metadata", {}) if isinstance(ch, dict) else getattr(ch, "metadata", {}) or {}
-        source = meta.get("source") or "unknown"
+        meta = ch["metadata"]
+        source = blob_name or meta.get("source") or "unknown"
         # deterministic-ish chunk id per source + running index
-        chunk_idx = len([c for c in chunks if c["metadata"].get("source") == source])
+        chunk_idx = counters.get(source, start)
+        counters[source] = chunk_idx + 1
         cid = f"{source}::chunk::{chunk_idx}"
         chunks.append({
-            "id": str(uuid.uuid4()),
+            "id": _chunk_key(source, chunk_idx, text),
             "chunkId": cid,
-            "content": str(text),
+            "content": text,
             "metadata": {
                 **meta,
                 "source": source,
@@ -94,34 +83,107 @@ def _to_chunks_for_index(docs: List[Dict]) -> List[Dict]:
     return chunks
 
 
-def _embed_in_place(all_chunks: List[Dict], batch_size: int = BATCH_SIZE):
-    """Compute embeddings in batches and store under chunk['vector']."""
-    texts = [c["content"] for c in all_chunks]
-    vectors: List[List[float]] = []
+def _open_embedding_cache() -> EmbeddingCache | None:
+    """Opens the persistent embedding cache, or returns None when it is disabled/unavailable."""
+    if not settings.EMBED_CACHE_PATH:
+        return None
+    try:
+        return EmbeddingCache(
+            settings.EMBED_CACHE_PATH,
+            deployment=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+            dimensions=DIM,
+            max_entries=settings.EMBED_CACHE_MAX_ENTRIES,
+        )
+    except Exception as e:
+        log.warning("Embedding cache unavailable (embedding everything): %s", e)
+        return None
+
+
+def _close_embedding_cache(cache: EmbeddingCache | None):
+    if cache is not None:
+        log.info("Embedding cache: %s", cache.stats())
+        cache.close()
 
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        log.info(f"Embedding batch {i}-{i+len(batch)-1} / {len(texts)-1}")
-        vecs = embed_texts(batch)
-        if len(vecs) != len(batch):
-            raise RuntimeError(f"Embedding count mismatch: got {len(vecs)} for {len(batch)} inputs")
-        vectors.extend(vecs)
 
-    for c, v in zip(all_chunks, vectors):
-        c["vector"] = v
+def _open_deduper() -> ChunkDeduper | None:
+    """Duplicate chunk elimination for one run (DEDUP_POLICY), or None when it is off."""
+    if settings.DEDUP_POLICY == "off":
+        return None
+    return ChunkDeduper()
 
 
-def run_ingestion(clear: bool = True, prefix: str | None = None):
+def _forget_dropped(dedup: ChunkDeduper | None, produced: Dict[str, List[str]]):
+    """Dropped duplicates were never uploaded, so the manifest must not list them as a blob's chunks."""
+    if dedup is None or not dedup.dropped_ids:
+        return
+    for name, ids in produced.items():
+        produced[name] = [i for i in ids if i not in dedup.dropped_ids]
+
+
+def _log_dedup_stats(dedup: ChunkDeduper | None):
+    if dedup is not None:
+        log.info("Duplicate chunks (%s): %s", dedup.policy, dedup.stats.as_dict())
+
+
+def _embed_rows(batch: ChunkBatch, groups: List[List[int]], cache: EmbeddingCache | None = None):
+    """Embeds pre-packed groups of batch rows concurrently, straight into batch.vectors."""
+    if not groups:
+        return
+    # the scheduler keeps several batches in flight and returns them in order
+    results = get_scheduler().embed_batches([[batch.contents[r] for r in g] for g in groups])
+    for rows, vecs in zip(groups, results):
+        batch.set_vectors(rows, vecs)
+    if cache is not None:
+        rows = [r for g in groups for r in g]
+        cache.put_many([batch.contents[r] for r in rows], batch.vectors[rows])
+
+
+def _embed_batches(batches: List[List[Dict]], cache: EmbeddingCache | None = None) -> ChunkBatch:
+    """Embeds pre-packed batches of chunk dicts concurrently; returns them as one ChunkBatch."""
+    out = ChunkBatch.from_chunks([c for b in batches for c in b])
+    groups, start = [], 0
+    for b in batches:
+        groups.append(list(range(start, start + len(b))))
+        start += len(b)
+    _embed_rows(out, groups, cache)
+    return out
+
+
+def _log_batch_stats(stats: BatchStats):
+    log.info("Embedding batches: %s", stats.as_dict())
+
+
+def _embed_in_place(
+    batch: ChunkBatch,
+    stats: BatchStats | None = None,
+    cache: EmbeddingCache | None = None,
+    links: Dict[int, int] | None = None,
+) -> BatchStats:
     """
-    End-to-end:
-      1) (optional) clear index
-      2) ensure index exists
-      3) list blobs (optionally by prefix)
-      4) download → load_document → split → collect chunks
-      5) embed in batches
-      6) (optional) archive
-      7) upload to Azure Cognitive Search
+    Compute embeddings in token-budget batches and store them in batch.vectors.
+    Rows in `links` (duplicate row → canonical row, see ChunkDeduper.apply) are not
+    embedded; they get a copy of their canonical row's vector.
     """
+    stats = stats or BatchStats(settings.EMBED_MAX_BATCH_INPUTS, settings.EMBED_MAX_BATCH_TOKENS)
+    links = links or {}
+    rows = [r for r in range(len(batch)) if r not in links]
+    todo = rows
+    if cache is not None:
+        hits = cache.get_many([batch.contents[r] for r in rows], as_array=True)
+        cached = [(r, v) for r, v in zip(rows, hits) if v is not None]
+        if cached:
+            batch.set_vectors([r for r, _ in cached], np.stack([v for _, v in cached]))
+        todo = [r for r, v in zip(rows, hits) if v is None]
+    packed = pack_batches([batch.contents[r] for r in todo], stats=stats)
+    log.info(f"Embedding {len(todo)} texts in {len(packed)} batches "
+             f"({len(rows) - len(todo)} cached, {len(links)} duplicates linked)")
+    _embed_rows(batch, [[todo[p] for p in b] for b in packed], cache)
+    if links:
+        batch.set_vectors(list(links), batch.vectors[list(links.values())])
+    return stats
+
+
+def _prepare_index(clear: bool):
     if clear:
         log.info("Clearing index…")
         try:
@@ -133,55 +195,436 @@ def run_ingestion(clear: bool = True, prefix: str | None = None):
     log.info("Ensuring index exists…")
     ensure_index()
 
-    blob_names = list(_iter_blob_names(prefix=prefix))
-    if not blob_names:
-        log.warning("No blobs found in container '%s' with prefix '%s'", settings.AZURE_BLOB_CONTAINER, prefix or "")
+
+def run_ingestion(
+    clear: bool = True,
+    prefix: str | None = None,
+    streaming: bool | None = None,
+    incremental: bool | None = None,
+):
+    """
+    End-to-end:
+      1) (optional) clear index
+      2) ensure index exists
+      3) list blobs (optionally by prefix)
+      4) download → load_document → split → collect chunks
+      5) embed in batches
+      6) (optional) archive
+      7) upload to Azure Cognitive Search
+
+    With streaming=True (default: INGEST_STREAMING) steps 4–7 run concurrently
+    instead, see _run_streaming.
+
+    With incremental=True (default: INGEST_INCREMENTAL) the index is never cleared:
+    only blobs whose etag/last-modified differ from the manifest are processed,
+    their chunks are merged in place, and chunks of modified or removed blobs that
+    no longer exist are deleted. Full (clear=True) runs write a fresh manifest.
+    """
+    if streaming is None:
+        streaming = settings.INGEST_STREAMING
+    if incremental is None:
+        incremental = settings.INGEST_INCREMENTAL
+    if incremental and clear:
+        log.info("Incremental mode: keeping the existing index (clear ignored)")
+        clear = False
+
+    # blue/green: a full rebuild goes into a new index version, the live one keeps serving
+    blue_green = clear and (settings.SEARCH_BLUE_GREEN or index_versions.alias_exists())
+    if not blue_green:
+        _prepare_index(clear)
+
+    manifest: BlobManifest | None = None
+    removed: List[str] = []
+    if incremental:
+        manifest = BlobManifest.load()
+        blobs, removed = manifest.diff(_iter_blobs(prefix=prefix), prefix)
+        log.info("Incremental: %d new/changed blobs, %d removed blobs", len(blobs), len(removed))
+    else:
+        blobs = list(_iter_blobs(prefix=prefix))
+        if clear:
+            manifest = BlobManifest()
+
+    if incremental and not blobs and not removed:
+        log.info("Index is up to date; nothing to ingest.")
+        return
+    if not blobs and not removed:
+        log.warning("No blobs to ingest in container '%s' with prefix '%s'", settings.AZURE_BLOB_CONTAINER, prefix or "")
+        return
+
+    # blob name -> chunk ids it produced in this run (only blobs that were fully parsed)
+    produced: Dict[str, List[str]] = {}
+    target = index_versions.create_next_version() if blue_green else None
+    summary = None
+    try:
+        if blobs:
+            log.info("Found %d blobs to ingest", len(blobs))
+            if streaming:
+                summary = _run_streaming(blobs, produced, merge=incremental,
+                                         queue_depth=settings.INGEST_QUEUE_DEPTH, index_name=target)
+            else:
+                summary = _run_batch(blobs, produced, merge=incremental, index_name=target)
+        if target is not None:
+            # raises PromotionError (alias and manifest untouched) when the new version looks incomplete
+            index_versions.promote(target, expected=summary.succeeded if summary else 0)
+    except BaseException:
+        # Ctrl-C included: a version that is never promoted is never collected either
+        if target is not None:
+            index_versions.discard_version(target)
+        raise
+    if target is not None:
+        index_versions.gc_versions()
+
+    if manifest is not None:
+        _update_manifest(manifest, blobs, produced, removed)
+
+
+def _update_manifest(manifest: BlobManifest, blobs: List[BlobInfo], produced: Dict[str, List[str]], removed: List[str]):
+    """Records what each processed blob now owns and deletes chunks nobody owns anymore."""
+    by_name = {b.name: b for b in blobs}
+    orphans: List[str] = []
+    for name, ids in produced.items():
+        orphans.extend(manifest.record(by_name[name], ids))
+    for name in removed:
+        orphans.extend(manifest.forget(name))
+    if orphans:
+        log.info("Deleting %d orphaned chunks", len(orphans))
+        delete_docs(orphans)
+    manifest.save()
+
+
+def _drop_failed_blobs(batch: ChunkBatch, summary: UploadSummary, produced: Dict[str, List[str]],
+                       failed_blobs: set | None = None):
+    """
+    Blobs with chunks that could not be indexed stay out of the manifest, so they are retried next run.
+    Their names are also added to `failed_blobs`: a blob read in parts is only put in `produced`
+    when its last part is split, which can be after an earlier part failed to upload.
+    """
+    if not summary.failed_keys:
         return
+    failed = set(summary.failed_keys)
+    for source in {s for i, s in zip(batch.ids, batch.sources) if i in failed}:
+        produced.pop(source, None)
+        if failed_blobs is None or source not in failed_blobs:
+            log.warning("Blob %s had chunks that failed to index; it will be retried next run.", source)
+        if failed_blobs is not None:
+            failed_blobs.add(source)
 
-    log.info("Found %d blobs to ingest", len(blob_names))
 
+def _run_batch(blobs: List[BlobInfo], produced: Dict[str, List[str]], merge: bool = False,
+               index_name: str | None = None) -> UploadSummary | None:
     all_chunks: List[Dict] = []
 
-    for name in blob_names:
-        tmp = None
-        try:
-            log.info(f"Loading blob: {name}")
-            tmp = _download_blob_to_temp(name)
-            docs = load_document(str(tmp))  # <-- uses your unified loader (pdf/docx/txt/img/csv/xlsx)
-            if not docs:
-                log.warning("No documents parsed from %s; skipping.", name)
-                continue
-            chunks = _to_chunks_for_index(docs)
-            if not chunks:
-                log.warning("No chunks produced for %s; skipping.", name)
-                continue
-            all_chunks.extend(chunks)
-        except Exception as e:
-            log.exception("Failed processing blob %s: %s", name, e)
-        finally:
-            if tmp:
-                _cleanup_temp(Path(tmp))
+    # downloads are consumed as the parse pool frees up, files finish in any order
+    with ParsePool() as pool:
+        for name, payload, docs, err in pool.imap(_download_stage(blobs)):
+            try:
+                if err is not None:
+                    raise err
+                if not docs:
+                    log.warning("No documents parsed from %s; skipping.", name)
+                    produced[name] = []
+                    continue
+                chunks = _to_chunks_for_index(docs, blob_name=name)
+                produced[name] = [c["id"] for c in chunks]
+                if not chunks:
+                    log.warning("No chunks produced for %s; skipping.", name)
+                    continue
+                all_chunks.extend(chunks)
+            except Exception as e:
+                log.error("Failed processing blob %s: %s", name, e, exc_info=e)
+            finally:
+                payload.release()
 
     if not all_chunks:
         log.warning("No chunks to index. Exiting.")
         return
 
     log.info("Total chunks to embed: %d", len(all_chunks))
-    _embed_in_place(all_chunks, batch_size=BATCH_SIZE)
+    batch = ChunkBatch.from_chunks(all_chunks)
+    del all_chunks
+    links: Dict[int, int] = {}
+    dedup = _open_deduper()
+    if dedup is not None:
+        batch, links = dedup.apply(batch)
+        _forget_dropped(dedup, produced)
+        _log_dedup_stats(dedup)
+    cache = _open_embedding_cache()
+    try:
+        _log_batch_stats(_embed_in_place(batch, cache=cache, links=links))
+    finally:
+        _close_embedding_cache(cache)
 
     # ── Archive snapshot (optional but recommended for audits/migrations) ─────────
     try:
-        df = to_records_with_serialized_vectors(all_chunks)
-        parquet_path = save_parquet_to_blob(df)
-        npz_path = save_npz_to_blob(all_chunks)
-        log.info(f"Archived embeddings to Blob: parquet=/{parquet_path}, npz=/{npz_path}")
+        with ArchiveSnapshot() as snapshot:
+            snapshot.write(batch)
+        paths = snapshot.paths
+        log.info(f"Archived embeddings to Blob: parquet=/{paths['parquet']}, npz=/{paths['npz']}")
     except Exception as e:
         log.warning("Archival failed (continuing to index): %s", e)
 
     # ── Upload to Azure Cognitive Search ──────────────────────────────────────────
-    log.info("Uploading %d chunks to Azure Cognitive Search…", len(all_chunks))
-    upload_docs(all_chunks)
-    log.info("Ingestion complete.")
+    log.info("Uploading %d chunks to Azure Cognitive Search…", len(batch))
+    summary = upload_docs(batch, merge=merge, index_name=index_name)
+    _drop_failed_blobs(batch, summary, produced)
+    log.info("Ingestion complete: %d indexed, %d retried, %d failed.", summary.succeeded, summary.retried, summary.failed)
+    return summary
+
+
+# ── Streaming mode ─────────────────────────────────────────────────────────────
+# Each stage below runs in its own thread (see pipeline.run_pipeline). Only
+# `queue_depth` items sit between two stages, so memory depends on the queue
+# depth and batch size instead of on the size of the container.
+
+def _download_stage(blobs: Iterable[BlobInfo]):
+    """Small blobs stay in memory; large ones land in the scratch area (see blob_store)."""
+    for blob in blobs:
+        try:
+            log.info(f"Loading blob: {blob.name}")
+            yield blob.name, download_blob(blob.name, size=blob.size)
+        except Exception as e:
+            log.exception("Failed downloading blob %s: %s", blob.name, e)
+
+
+_TABLE_DOCS_PER_PART = 64     # row-range documents handed to the split stage at a time
+
+
+def _parsed(results, produced: Dict[str, List[str]]):
+    for name, payload, docs, err in results:
+        try:
+            if err is not None:
+                log.error("Failed processing blob %s: %s", name, err, exc_info=err)
+                continue
+            if not docs:
+                log.warning("No documents parsed from %s; skipping.", name)
+                produced[name] = []
+                continue
+            yield name, docs, True
+        finally:
+            payload.release()
+
+
+def _table_parts(name: str, payload: BlobPayload):
+    """(name, docs, last) parts of a CSV / Excel blob, read row range by row range."""
+    from .loaders import iter_table_documents
+    part: List[Dict] = []
+    try:
+        src = io.BytesIO(payload.data) if payload.data is not None else payload.path
+        for doc in iter_table_documents(src, name):
+            part.append(doc)
+            if len(part) >= _TABLE_DOCS_PER_PART:
+                yield name, part, False
+                part = []
+    except Exception as e:
+        # no last part: the blob stays out of the manifest and is retried next run
+        log.error("Failed processing blob %s: %s", name, e, exc_info=e)
+        return
+    finally:
+        payload.release()
+    yield name, part, True
+
+
+def _parse_stage(items: Iterable[tuple], produced: Dict[str, List[str]]):
+    """
+    Parses downloaded files on the process pool (see parse_pool.ParsePool) and yields
+    (name, docs, last). CSV and Excel blobs are read on this thread instead and passed
+    on in parts while their rows are read: a pool worker can only return a whole file.
+    """
+    from .loaders import TABLE_EXTENSIONS
+    with ParsePool() as pool:
+        for name, payload in items:
+            if name.lower().endswith(TABLE_EXTENSIONS):
+                yield from _table_parts(name, payload)
+            else:
+                yield from _parsed(pool.feed(name, payload), produced)
+        yield from _parsed(pool.drain(), produced)
+
+
+def _split_stage(items: Iterable[tuple], produced: Dict[str, List[str]]):
+    partial: Dict[str, List[str]] = {}      # chunk ids so far of files that arrive in parts
+    failed: set = set()
+    for name, docs, last in items:
+        if name in failed:
+            continue
+        ids = partial.pop(name, [])
+        try:
+            chunks = _to_chunks_for_index(docs, blob_name=name, start=len(ids))
+        except Exception as e:
+            log.exception("Failed splitting blob %s: %s", name, e)
+            failed.add(name)
+            continue
+        ids.extend(c["id"] for c in chunks)
+        if not last:
+            partial[name] = ids
+        else:
+            produced[name] = ids
+            if not ids:
+                log.warning("No chunks produced for %s; skipping.", name)
+        yield from chunks
+
+
+def _embed_stage(chunks: Iterable[Dict], stats: BatchStats, cache: EmbeddingCache | None = None,
+                 dedup: ChunkDeduper | None = None):
+    """
+    Packs the chunk stream into token-budget batches and embeds EMBED_MAX_CONCURRENCY
+    of them at a time, so the scheduler can keep several requests in flight.
+    Chunks found in the embedding cache skip the network and are passed straight on.
+    Duplicates found by `dedup` are dropped or, with policy "link", passed on with their
+    canonical chunk's vector once that one is embedded. Yields ChunkBatches.
+    """
+    batcher = TokenBudgetBatcher(stats=stats)
+    pending: List[List[Dict]] = []
+    cached: List[Dict] = []
+    linking = dedup is not None and dedup.policy == "link"
+    memo = VectorMemo() if linking else None
+    unemitted: set = set()                    # chunk ids handed to embedding and not passed on yet
+    waiting: Dict[str, List[Dict]] = {}       # canonical id → duplicates until the canonical is embedded
+
+    def emit(out: ChunkBatch):
+        """Passes `out` on, then the waiting duplicates whose canonical vectors it holds."""
+        yield out
+        if not linking:
+            return
+        unemitted.difference_update(out.ids)
+        memo.remember(out)
+        ready = []
+        if waiting:
+            for i, key in enumerate(out.ids):
+                for c in waiting.pop(key, ()):
+                    c["vector"] = out.vectors[i]
+                    ready.append(c)
+        if ready:
+            dedup.stats.linked += len(ready)
+            dedup.saved(c["content"] for c in ready)
+            yield ChunkBatch.from_chunks(ready)
+
+    for c in chunks:
+        vec = None
+        if dedup is not None:
+            canonical = dedup.check(c["id"], c["content"])
+            if canonical is not None:
+                if not linking:
+                    dedup.stats.dropped += 1
+                    dedup.dropped_ids.add(c["id"])
+                    dedup.saved([c["content"]])
+                    continue
+                if canonical in unemitted:
+                    waiting.setdefault(canonical, []).append(c)
+                    continue
+                vec = memo.get(canonical)
+                if vec is not None:
+                    dedup.stats.linked += 1
+                    dedup.saved([c["content"]])
+                # else: evicted from the memo, so this one is embedded after all
+            if linking:
+                unemitted.add(c["id"])
+        if vec is None and cache is not None:
+            vec = cache.get(c["content"], as_array=True)
+        if vec is not None:
+            c["vector"] = vec
+            cached.append(c)
+            if len(cached) >= settings.EMBED_MAX_BATCH_INPUTS:
+                yield from emit(ChunkBatch.from_chunks(cached))
+                cached = []
+            continue
+        full = batcher.add(c, estimate_tokens(c["content"]))
+        if full:
+            pending.append(full)
+            if len(pending) >= settings.EMBED_MAX_CONCURRENCY:
+                yield from emit(_embed_batches(pending, cache))
+                pending = []
+    last = batcher.flush()
+    if last:
+        pending.append(last)
+    if pending:
+        yield from emit(_embed_batches(pending, cache))
+    if cached:
+        yield from emit(ChunkBatch.from_chunks(cached))
+
+
+def _archive_stage(batches: Iterable[ChunkBatch], partition: str):
+    # One snapshot for the whole run, streamed as staged blocks; it only becomes
+    # visible if the stream ends normally (an aborted run leaves nothing behind).
+    snapshot: ArchiveSnapshot | None = None
+    try:
+        snapshot = ArchiveSnapshot(partition=partition)
+    except Exception as e:
+        log.warning("Archival failed (continuing to index): %s", e)
+    for batch in batches:
+        if snapshot is not None:
+            try:
+                snapshot.write(batch)
+            except Exception as e:
+                log.warning("Archival failed (continuing to index): %s", e)
+                snapshot = None
+        yield batch
+    if snapshot is not None:
+        try:
+            paths = snapshot.commit()
+            if paths:
+                log.info(f"Archived embeddings to Blob: parquet=/{paths['parquet']}, npz=/{paths['npz']}")
+        except Exception as e:
+            log.warning("Archival failed (continuing to index): %s", e)
+
+
+def _upload_stage(
+    batches: Iterable[ChunkBatch],
+    summary: UploadSummary,
+    produced: Dict[str, List[str]],
+    failed_blobs: set,
+    merge: bool = False,
+    index_name: str | None = None,
+):
+    for batch in batches:
+        result = upload_docs(batch, merge=merge, index_name=index_name)
+        _drop_failed_blobs(batch, result, produced, failed_blobs)
+        summary.add(result)
+        log.info("Uploaded %d chunks (%d so far, %d failed)", result.succeeded, summary.succeeded, summary.failed)
+        yield len(batch)
+
+
+def _run_streaming(
+    blobs: Iterable[BlobInfo],
+    produced: Dict[str, List[str]],
+    merge: bool = False,
+    queue_depth: int = 8,
+    index_name: str | None = None,
+) -> UploadSummary | None:
+    """download → load_document → split → embed → archive → upload, all stages concurrent."""
+    partition = default_partition()
+    summary = UploadSummary()
+    stats = BatchStats(settings.EMBED_MAX_BATCH_INPUTS, settings.EMBED_MAX_BATCH_TOKENS)
+    cache = _open_embedding_cache()
+    dedup = _open_deduper()
+    failed_blobs: set = set()
+
+    try:
+        run_pipeline(
+            blobs,
+            [
+                ("download", _download_stage),
+                ("parse", lambda items: _parse_stage(items, produced)),
+                ("split", lambda items: _split_stage(items, produced)),
+                ("embed", lambda chunks: _embed_stage(chunks, stats, cache, dedup)),
+                ("archive", lambda batches: _archive_stage(batches, partition)),
+                ("upload", lambda batches: _upload_stage(batches, summary, produced, failed_blobs, merge, index_name)),
+            ],
+            queue_depth=queue_depth,
+        )
+    finally:
+        _close_embedding_cache(cache)
+    # a table blob whose last part was split after an earlier part failed to upload
+    for name in failed_blobs:
+        produced.pop(name, None)
+    _forget_dropped(dedup, produced)
+
+    if not (summary.succeeded or summary.failed):
+        log.warning("No chunks to index. Exiting.")
+        return
+    _log_batch_stats(stats)
+    _log_dedup_stats(dedup)
+    log.info("Ingestion complete: %d indexed, %d retried, %d failed.", summary.succeeded, summary.retried, summary.failed)
+    return summary
 
 
 if __name__ == "__main__":
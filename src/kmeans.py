@@ -0,0 +1,54 @@
+# src/kmeans.py
+from __future__ import annotations
+import numpy as np
+
+# rows scored per block while assigning vectors to centroids (bounds the temp matrix)
+_ASSIGN_BLOCK = 65536
+
+
+def nearest_centroid(x: np.ndarray, centroids: np.ndarray, spherical: bool = True) -> np.ndarray:
+    """
+    Index of the closest centroid for every row of `x`: highest dot product when
+    `spherical` (unit rows and centroids), otherwise smallest Euclidean distance.
+    """
+    bias = 0.0 if spherical else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), _ASSIGN_BLOCK):
+        # argmin ||x - c||² == argmax x·c - ½||c||²
+        out[start:start + _ASSIGN_BLOCK] = np.argmax(x[start:start + _ASSIGN_BLOCK] @ centroids.T - bias, axis=1)
+    return out
+
+
+def train_kmeans(x: np.ndarray, k: int, iters: int = 20, seed: int = 0,
+                 max_train_points: int | None = None, spherical: bool = True) -> np.ndarray:
+    """
+    Lloyd's k-means; returns (k, dim) float32 centroids. Spherical (cosine, unit-length
+    centroids) by default. Trains on at most `max_train_points` sampled rows (256 per centroid).
+    """
+    rng = np.random.default_rng(seed)
+    k = max(1, min(k, len(x)))
+    max_train_points = max_train_points or 256 * k
+    sample = x if len(x) <= max_train_points else x[np.sort(rng.choice(len(x), max_train_points, replace=False))]
+    sample = np.ascontiguousarray(sample, dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = nearest_centroid(sample, centroids, spherical)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        filled = np.flatnonzero(counts)
+        starts = (np.cumsum(counts) - counts)[filled]
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        if spherical:
+            centroids[filled] = sums
+        else:
+            centroids[filled] = sums / counts[filled, None]
+        empty = counts == 0
+        if empty.any():
+            # re-seed centroids that lost all their points
+            centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = centroids / norms
+    return centroids.astype(np.float32)
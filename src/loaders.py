@@ -1,17 +1,110 @@
 # src/loaders.py
-import io, os
+import io, os, tempfile
+import datetime as dt
+from itertools import chain
+import openpyxl
 import pandas as pd
-from langchain.document_loaders import PyPDFLoader, UnstructuredWordDocumentLoader, TextLoader
-from PIL import Image
-import pytesseract
+from langchain.document_loaders import UnstructuredWordDocumentLoader, TextLoader
+
+from .config import settings
+from .ocr import image_to_text
+from .pdf_extract import extract_pdf
+
+
+# ── tables: streamed row-range documents ──────────────────────────────────────
+def _cell(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, dt.datetime):
+        return v.date().isoformat() if v.time() == dt.time() else v.isoformat(sep=" ")
+    return str(v).replace("\r", " ").replace("\n", " ")
+
+
+def _trim(row) -> tuple:
+    """Drops trailing empty cells (read-only sheets pad rows to the widest row)."""
+    end = len(row)
+    while end and (row[end - 1] is None or row[end - 1] == ""):
+        end -= 1
+    return tuple(row[:end])
+
+
+def _row_range_docs(header, rows, meta: dict, max_chars: int | None = None):
+    """
+    Groups (row number, values) pairs into documents of up to TABLE_DOC_MAX_CHARS, each
+    starting with the header line, so every chunk of a table still names its columns.
+    Only one document's rows are held at a time.
+    """
+    max_chars = max_chars or settings.TABLE_DOC_MAX_CHARS
+    head = " | ".join(_cell(h) for h in header)
+    lines, size, first, last = [], len(head), None, None
+    for n, values in rows:
+        line = " | ".join(_cell(v) for v in values)
+        if lines and size + 1 + len(line) > max_chars:
+            yield {"page_content": "\n".join([head, *lines]), "metadata": {**meta, "row_start": first, "row_end": last}}
+            lines, size = [], len(head)
+        if not lines:
+            first = n
+        lines.append(line)
+        size += 1 + len(line)
+        last = n
+    if lines:
+        yield {"page_content": "\n".join([head, *lines]), "metadata": {**meta, "row_start": first, "row_end": last}}
+
+
+def iter_csv_documents(src, source: str):
+    """Row-range documents of a CSV (path or file object), read TABLE_READ_ROWS rows at a time."""
+    with pd.read_csv(src, chunksize=settings.TABLE_READ_ROWS, dtype=str, keep_default_na=False) as reader:
+        first = next(reader, None)
+        if first is None:
+            return
+        frames = chain([first], reader)
+        rows = enumerate((r for df in frames for r in df.itertuples(index=False, name=None)), 1)
+        yield from _row_range_docs(first.columns, rows, {"source": source, "type": "csv"})
+
+
+def iter_excel_documents(src, source: str, ext: str = ".xlsx"):
+    """
+    Row-range documents of every sheet. Workbooks are read with openpyxl in read-only
+    mode (row by row); legacy .xls files go through pandas one sheet at a time.
+    Row numbers count data rows below each sheet's header (its first non-empty row).
+    """
+    if ext == ".xls":
+        for sheet, df in pd.read_excel(src, sheet_name=None).items():
+            df = df.astype(object).where(df.notna(), None)
+            rows = enumerate(df.itertuples(index=False, name=None), 1)
+            yield from _row_range_docs(df.columns, rows, {"source": source, "type": "excel", "sheet": sheet})
+        return
+    wb = openpyxl.load_workbook(src, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            it = (_trim(r) for r in ws.iter_rows(values_only=True))
+            header = next((r for r in it if r), None)
+            if header is None:
+                continue
+            rows = ((n, r) for n, r in enumerate(it, 1) if r)
+            yield from _row_range_docs(header, rows, {"source": source, "type": "excel", "sheet": ws.title})
+    finally:
+        wb.close()
+
+
+TABLE_EXTENSIONS = (".csv", ".xls", ".xlsx")
+
+
+def iter_table_documents(src, name: str):
+    """Row-range documents of a CSV or Excel file (path or file object); `name` gives the extension and the source."""
+    ext = os.path.splitext(name.lower())[1]
+    if ext == ".csv":
+        return iter_csv_documents(src, name)
+    return iter_excel_documents(src, name, ext)
+
 
 def load_document(file_path: str):
     ext = os.path.splitext(file_path.lower())[1]
     docs = []
 
     if ext == ".pdf":
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
+        # one document per page; scanned pages are OCR'd (see pdf_extract)
+        docs = extract_pdf(file_path, file_path)
 
     elif ext in [".docx", ".doc"]:
         loader = UnstructuredWordDocumentLoader(file_path)
@@ -22,19 +115,56 @@ def load_document(file_path: str):
         docs = loader.load()
 
     elif ext in [".png", ".jpg", ".jpeg"]:
-        # OCR for image files
-        text = pytesseract.image_to_string(Image.open(file_path))
+        # OCR for image files (downscaled, binarized, cached by content hash)
+        with open(file_path, "rb") as f:
+            text = image_to_text(f.read())
         docs = [{"page_content": text, "metadata": {"source": file_path, "type": "image"}}]
 
     elif ext == ".csv":
-        df = pd.read_csv(file_path)
-        text = df.to_string(index=False)
-        docs = [{"page_content": text, "metadata": {"source": file_path, "type": "csv"}}]
+        docs = list(iter_csv_documents(file_path, file_path))
 
     elif ext in [".xls", ".xlsx"]:
-        df = pd.read_excel(file_path)
-        text = df.to_string(index=False)
-        docs = [{"page_content": text, "metadata": {"source": file_path, "type": "excel"}}]
+        docs = list(iter_excel_documents(file_path, file_path, ext))
+
+    else:
+        print(f"⚠️ Unsupported file type: {ext}")
+
+    return docs
+
+
+def load_document_bytes(data: bytes, name: str):
+    """
+    In-memory variant of load_document for small blobs: no temp file for PDF, text,
+    images and tables. `name` (the blob name) routes by extension and becomes the source.
+    Formats whose loader needs a real file (Word) are spilled to a temp file.
+    """
+    ext = os.path.splitext(name.lower())[1]
+    docs = []
+
+    if ext == ".pdf":
+        docs = extract_pdf(data, name)
+
+    elif ext in [".txt", ".log"]:
+        docs = [{"page_content": data.decode("utf-8"), "metadata": {"source": name}}]
+
+    elif ext in [".png", ".jpg", ".jpeg"]:
+        text = image_to_text(data)
+        docs = [{"page_content": text, "metadata": {"source": name, "type": "image"}}]
+
+    elif ext == ".csv":
+        docs = list(iter_csv_documents(io.BytesIO(data), name))
+
+    elif ext in [".xls", ".xlsx"]:
+        docs = list(iter_excel_documents(io.BytesIO(data), name, ext))
+
+    elif ext in [".docx", ".doc"]:
+        fd, tmp = tempfile.mkstemp(suffix=ext)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            docs = load_document(tmp)
+        finally:
+            os.unlink(tmp)
 
     else:
         print(f"⚠️ Unsupported file type: {ext}")
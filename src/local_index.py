@@ -0,0 +1,228 @@
+# src/local_index.py
+from __future__ import annotations
+import json
+import logging
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from .config import settings
+from .search_index import FILTERABLE_FIELDS, filter_values
+from . import vector_codecs
+from .archive_store import list_archive_blobs, load_npz_from_blob, read_vector_table
+from .chunk_batch import ChunkBatch
+
+log = logging.getLogger("local_index")
+
+
+class LocalVectorIndex:
+    """
+    Exact cosine search over the archived vectors, held as one contiguous float32
+    matrix of unit-length rows so a query is a single matrix-vector product followed
+    by argpartition for the top k. Rows can be restricted with metadata filters on
+    FILTERABLE_FIELDS. Vector-only: the query text is not used.
+
+    After compress("int8" | "pq") a query first scores the compact codes, then rescores
+    the best `rescore`·k rows exactly, so `vectors` can stay on disk (memmap).
+    """
+
+    codec: str | None = None
+    codes: Dict[str, np.ndarray] | None = None
+    rescore: int = 1
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        vectors,
+        meta: Sequence[dict] | None = None,
+        contents: Sequence[str | None] | None = None,
+    ):
+        vecs = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vecs.ndim != 2:
+            vecs = vecs.reshape(len(ids), -1) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        self.vectors = normalize_rows(vecs)
+        self.ids = np.asarray(ids, dtype=object)
+        meta = meta if meta is not None else [{}] * len(self.ids)
+        self.columns: Dict[str, np.ndarray] = {
+            f: np.array([m.get(f) for m in meta], dtype=object) for f in FILTERABLE_FIELDS
+        }
+        self.contents = np.array(contents if contents is not None else [None] * len(self.ids), dtype=object)
+        self._pos = {k: i for i, k in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    # ── loading ──────────────────────────────────────────────────────────────────
+    @classmethod
+    def from_npz_arrays(cls, arrays: dict) -> "LocalVectorIndex":
+        meta = [json.loads(m) for m in arrays["meta"]]
+        return cls([str(i) for i in arrays["ids"]], arrays["vectors"], meta)
+
+    @classmethod
+    def from_parquet(cls, source: str | bytes) -> "LocalVectorIndex":
+        """From a Parquet snapshot (blob path or bytes); keeps content for snippets."""
+        table, vectors = read_vector_table(source, columns=["id", *FILTERABLE_FIELDS, "content", "vector"])
+        meta = table.select([c for c in FILTERABLE_FIELDS if c in table.column_names]).to_pylist()
+        return cls(table.column("id").to_pylist(), vectors, meta, table.column("content").to_pylist())
+
+    @classmethod
+    def concat(cls, parts: List["LocalVectorIndex"]) -> "LocalVectorIndex":
+        """Merges snapshot parts; when an id appears more than once the last part wins."""
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+        ids = np.concatenate([p.ids for p in parts])
+        _, first_from_end = np.unique(ids[::-1], return_index=True)
+        keep = np.sort(len(ids) - 1 - first_from_end)
+        return cls.from_arrays(
+            ids[keep],
+            np.concatenate([p.vectors for p in parts])[keep],
+            {f: np.concatenate([p.columns[f] for p in parts])[keep] for f in FILTERABLE_FIELDS},
+            np.concatenate([p.contents for p in parts])[keep],
+        )
+
+    @classmethod
+    def from_arrays(cls, ids, vectors, columns: Dict[str, np.ndarray], contents) -> "LocalVectorIndex":
+        """Wraps already-normalised rows without copying them (e.g. a read-only memmap)."""
+        out = cls.__new__(cls)
+        out.ids = np.asarray(ids, dtype=object)
+        out.vectors = vectors if isinstance(vectors, np.memmap) else np.ascontiguousarray(vectors, dtype=np.float32)
+        out.columns = {f: np.asarray(columns.get(f, [None] * len(out.ids)), dtype=object) for f in FILTERABLE_FIELDS}
+        out.contents = np.asarray(contents, dtype=object)
+        out._pos = {k: i for i, k in enumerate(out.ids)}
+        return out
+
+    def take(self, rows) -> "LocalVectorIndex":
+        """A new index holding `rows` in the given order."""
+        out = self.from_arrays(self.ids[rows], self.vectors[rows],
+                               {f: col[rows] for f, col in self.columns.items()}, self.contents[rows])
+        if self.codes is not None:
+            out.codec, out.codes, out.rescore = self.codec, vector_codecs.take_rows(self.codes, rows), self.rescore
+        return out
+
+    def compress(self, codec: str, rescore: int | None = None, codebook: np.ndarray | None = None) -> "LocalVectorIndex":
+        """Adds an int8 or PQ copy of the rows for the first scoring pass (see class docstring)."""
+        if codec not in ("int8", "pq"):
+            raise ValueError(f"Cannot search on {codec!r} codes; use int8 or pq")
+        self.codec = codec
+        self.rescore = max(1, rescore or settings.LOCAL_INDEX_RESCORE)
+        self.codes = vector_codecs.encode(np.asarray(self.vectors), codec, codebook=codebook) if len(self) else None
+        return self
+
+    @classmethod
+    def load_from_archive(cls, partition: str | None = None, fmt: str | None = None) -> "LocalVectorIndex":
+        """
+        Loads one archive snapshot (latest partition by default) from Blob.
+        NPZ loads faster; Parquet also carries the chunk text for result snippets.
+        """
+        fmt = fmt or settings.LOCAL_INDEX_ARCHIVE_FORMAT
+        paths = list_archive_blobs(fmt, partition)
+        if fmt == "npz":
+            parts = [cls.from_npz_arrays(load_npz_from_blob(p)) for p in paths]
+        else:
+            parts = [cls.from_parquet(p) for p in paths]
+        index = cls.concat(parts)
+        log.info("Loaded local index: %d vectors from %d %s file(s)", len(index), len(paths), fmt)
+        return index
+
+    @classmethod
+    def load_partitions(cls, partitions: Sequence[str], fmt: str | None = None) -> "LocalVectorIndex":
+        """Several snapshots (oldest first) merged so that later partitions win."""
+        return cls.concat([cls.load_from_archive(p, fmt) for p in partitions])
+
+    # ── queries ──────────────────────────────────────────────────────────────────
+    def filter_mask(self, filters: dict | None) -> np.ndarray | None:
+        mask = None
+        for name, value in (filters or {}).items():
+            if name not in self.columns:
+                raise ValueError(f"Cannot filter on {name!r}; filterable fields: {', '.join(FILTERABLE_FIELDS)}")
+            m = np.isin(self.columns[name], filter_values(value))
+            mask = m if mask is None else mask & m
+        return mask
+
+    def search(self, query_vector, top_k: int = 5, filters: dict | None = None) -> List[dict]:
+        """Top-k rows by cosine similarity, best first, shaped like search_index results."""
+        q = self.unit_query(query_vector)
+        if q is None or not len(self):
+            return []
+        mask = self.filter_mask(filters)
+        return self.top_k(q, np.flatnonzero(mask) if mask is not None else None, top_k)
+
+    @staticmethod
+    def unit_query(query_vector) -> np.ndarray | None:
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        return q / norm if norm else None
+
+    def top_k(self, q: np.ndarray, rows: np.ndarray | None, k: int) -> List[dict]:
+        """Exact scoring of `rows` (all rows when None) against the unit query `q`."""
+        if k <= 0 or (rows is not None and not len(rows)):
+            return []
+        if self.codes is not None:
+            rows = self._shortlist(q, rows, k * self.rescore)
+        scores = (self.vectors if rows is None else self.vectors[rows]) @ q
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        positions = top if rows is None else rows[top]
+        return [self._result(int(i), float(s)) for i, s in zip(positions, scores[top])]
+
+    def _shortlist(self, q: np.ndarray, rows: np.ndarray | None, n: int) -> np.ndarray:
+        """The `n` rows (of `rows`, or all) with the best approximate scores on the codes."""
+        codes = self.codes if rows is None else vector_codecs.take_rows(self.codes, rows)
+        approx = vector_codecs.approx_scores(q, codes, self.codec)
+        all_rows = np.arange(len(approx)) if rows is None else rows
+        if n >= len(approx):
+            return all_rows
+        return all_rows[np.argpartition(-approx, n - 1)[:n]]
+
+    def _result(self, i: int, score: float) -> dict:
+        content = self.contents[i]
+        return {
+            "id": self.ids[i],
+            "fileName": self.columns["fileName"][i],
+            "chunkId": self.columns["chunkId"][i],
+            "docType": self.columns["docType"][i],
+            "snippet": content[:400] if content else None,
+            "score": score,
+        }
+
+    # ── updates ──────────────────────────────────────────────────────────────────
+    def upsert(self, items: ChunkBatch | Iterable[dict]) -> int:
+        """Adds or replaces chunks (a ChunkBatch or {id, chunkId, content, metadata, vector}); returns the count."""
+        batch = items if isinstance(items, ChunkBatch) else ChunkBatch.from_chunks(list(items))
+        if not len(batch):
+            return 0
+        new = LocalVectorIndex(
+            batch.ids,
+            batch.vectors,
+            [{"fileName": source, "chunkId": chunk_id, "docType": doc_type}
+             for source, chunk_id, doc_type in zip(batch.sources, batch.chunk_ids, batch.doc_types)],
+            batch.contents,
+        )
+        merged = LocalVectorIndex.concat([self, new]) if len(self) else new
+        if self.codec:
+            # new rows are encoded with the existing PQ codebook (no retraining)
+            merged.compress(self.codec, self.rescore, self.codes.get("codebook") if self.codes else None)
+        self.__dict__.update(merged.__dict__)
+        return len(batch)
+
+    def delete(self, ids: Iterable[str]) -> int:
+        drop = {self._pos[i] for i in ids if i in self._pos}
+        if not drop:
+            return 0
+        keep = np.setdiff1d(np.arange(len(self)), np.fromiter(drop, dtype=np.int64))
+        self.__dict__.update(self.take(keep).__dict__)
+        return len(drop)
+
+
+def normalize_rows(vecs: np.ndarray) -> np.ndarray:
+    if not vecs.size:
+        return vecs
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vecs / norms, dtype=np.float32)
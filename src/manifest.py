@@ -0,0 +1,97 @@
+# src/manifest.py
+from __future__ import annotations
+import json
+import datetime as dt
+from typing import Dict, Iterable, List, Tuple
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from .config import settings
+from .blob_store import get_container_client
+
+# Prefixes inside the documents container written by the pipeline itself
+INTERNAL_PREFIXES = ("embeddings-archive/", "ingest-state/")
+
+
+class BlobInfo:
+    """The listing metadata incremental ingestion needs for one source blob."""
+
+    __slots__ = ("name", "etag", "last_modified", "size")
+
+    def __init__(self, name: str, etag: str, last_modified: str, size: int = 0):
+        self.name = name
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+
+    @classmethod
+    def from_properties(cls, props) -> "BlobInfo":
+        lm = props.last_modified
+        return cls(
+            name=props.name,
+            etag=(props.etag or "").strip('"'),
+            last_modified=lm.isoformat() if isinstance(lm, dt.datetime) else str(lm or ""),
+            size=int(props.size or 0),
+        )
+
+
+class BlobManifest:
+    """
+    What the index currently holds for each source blob:
+        { blob name: { "etag", "last_modified", "chunk_ids": [...] } }
+    Persisted as JSON in the documents container (INGEST_MANIFEST_BLOB) so that any
+    ingest node can pick up where the previous run stopped.
+    """
+
+    def __init__(self, entries: Dict[str, dict] | None = None):
+        self.entries: Dict[str, dict] = entries or {}
+
+    # ── persistence ──────────────────────────────────────────────────────────────
+    @staticmethod
+    def _blob():
+        return get_container_client().get_blob_client(settings.INGEST_MANIFEST_BLOB)
+
+    @classmethod
+    def load(cls) -> "BlobManifest":
+        try:
+            data = cls._blob().download_blob().readall()
+        except ResourceNotFoundError:
+            return cls()
+        return cls(json.loads(data).get("blobs", {}))
+
+    def save(self):
+        payload = {"version": 1, "updated_at": dt.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                   "blobs": self.entries}
+        self._blob().upload_blob(json.dumps(payload).encode("utf-8"), overwrite=True,
+                                 content_type="application/json")
+
+    # ── bookkeeping ──────────────────────────────────────────────────────────────
+    def is_current(self, blob: BlobInfo) -> bool:
+        e = self.entries.get(blob.name)
+        return bool(e) and e.get("etag") == blob.etag and e.get("last_modified") == blob.last_modified
+
+    def diff(self, listing: Iterable[BlobInfo], prefix: str | None = None) -> Tuple[List[BlobInfo], List[str]]:
+        """Returns (new or changed blobs, names that are in the manifest but no longer listed)."""
+        seen = set()
+        changed: List[BlobInfo] = []
+        for b in listing:
+            seen.add(b.name)
+            if not self.is_current(b):
+                changed.append(b)
+        removed = [n for n in self.entries if n.startswith(prefix or "") and n not in seen]
+        return changed, removed
+
+    def chunk_ids(self, name: str) -> List[str]:
+        return list((self.entries.get(name) or {}).get("chunk_ids", []))
+
+    def record(self, blob: BlobInfo, chunk_ids: List[str]) -> List[str]:
+        """Stores the new chunk ids for `blob`; returns ids it held before that are now orphaned."""
+        keep = set(chunk_ids)
+        orphans = [cid for cid in self.chunk_ids(blob.name) if cid not in keep]
+        self.entries[blob.name] = {"etag": blob.etag, "last_modified": blob.last_modified,
+                                   "chunk_ids": list(chunk_ids)}
+        return orphans
+
+    def forget(self, name: str) -> List[str]:
+        """Drops a removed blob; returns all of its chunk ids."""
+        return list((self.entries.pop(name, None) or {}).get("chunk_ids", []))
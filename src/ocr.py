@@ -1,8 +1,86 @@
-from PIL import Image
-import pytesseract
+# src/ocr.py
+from __future__ import annotations
+import os
+import hashlib
+import tempfile
 from io import BytesIO
 
-def image_to_text(image_bytes: bytes) -> str:
-    img = Image.open(BytesIO(image_bytes)).convert("RGB")
-    text = pytesseract.image_to_string(img, lang="eng")
-    return text.strip()
+import numpy as np
+from PIL import Image, ImageOps
+import pytesseract
+
+from .config import settings
+
+
+def _otsu_threshold(img: Image.Image) -> int:
+    """Grey level that best separates ink from paper (Otsu), from the image histogram."""
+    hist = np.asarray(img.histogram()[:256], dtype=np.float64)
+    levels = np.arange(256)
+    w0 = np.cumsum(hist)
+    w1 = w0[-1] - w0
+    m0 = np.cumsum(hist * levels)
+    mu0 = m0 / np.maximum(w0, 1)
+    mu1 = (m0[-1] - m0) / np.maximum(w1, 1)
+    return int(np.argmax(w0 * w1 * (mu0 - mu1) ** 2))
+
+
+def prepare_image(img: Image.Image, max_side: int | None = None, binarize: bool | None = None) -> Image.Image:
+    """
+    Grayscale, downscaled so the longer side is at most OCR_MAX_SIDE (never upscaled)
+    and, with OCR_BINARIZE, thresholded to black and white. Tesseract binarizes
+    internally anyway; doing it on a smaller image up front is much cheaper.
+    """
+    max_side = settings.OCR_MAX_SIDE if max_side is None else max_side
+    binarize = settings.OCR_BINARIZE if binarize is None else binarize
+    img = ImageOps.exif_transpose(img).convert("L")
+    if max_side and max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    if binarize:
+        threshold = _otsu_threshold(img)
+        img = img.point(lambda p: 255 if p > threshold else 0)
+    return img
+
+
+# ── result cache: one text file per image content hash ───────────────────────────
+# Files rather than SQLite: parse workers in several processes read and write it.
+def _cache_key(image_bytes: bytes, lang: str) -> str:
+    params = f"{lang}|{settings.OCR_MAX_SIDE}|{settings.OCR_BINARIZE}".encode("utf-8")
+    return hashlib.sha256(params + b"\0" + image_bytes).hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(settings.OCR_CACHE_DIR, key[:2], f"{key}.txt")
+
+
+def _cache_get(key: str) -> str | None:
+    try:
+        with open(_cache_path(key), encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _cache_put(key: str, text: str):
+    path = _cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)      # readers never see a partial file
+    except OSError:
+        pass                       # a cache that cannot be written only costs a re-OCR
+
+
+def image_to_text(image_bytes: bytes, lang: str = "eng") -> str:
+    """OCR of an encoded image. Results are cached in OCR_CACHE_DIR by content hash."""
+    key = _cache_key(image_bytes, lang) if settings.OCR_CACHE_DIR else None
+    if key is not None:
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+    img = prepare_image(Image.open(BytesIO(image_bytes)))
+    text = pytesseract.image_to_string(img, lang=lang).strip()
+    if key is not None:
+        _cache_put(key, text)
+    return text
@@ -0,0 +1,209 @@
+# src/parse_pool.py
+from __future__ import annotations
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from .config import settings
+
+log = logging.getLogger("parse_pool")
+
+# (key, source, docs or None, error or None); source is a path or a blob_store.BlobPayload
+ParseResult = Tuple[Any, Any, List[Dict] | None, BaseException | None]
+
+
+class ParseTimeout(TimeoutError):
+    pass
+
+
+def _to_plain_docs(docs) -> List[Dict]:
+    """LangChain Documents / dicts → picklable {page_content, metadata} dicts."""
+    out = []
+    for d in docs or []:
+        if isinstance(d, dict):
+            out.append({"page_content": d.get("page_content") or d.get("content") or "",
+                        "metadata": dict(d.get("metadata") or {})})
+        else:
+            out.append({"page_content": getattr(d, "page_content", "") or "",
+                        "metadata": dict(getattr(d, "metadata", None) or {})})
+    return out
+
+
+def parse_file(src) -> List[Dict]:
+    """
+    Worker entry point: runs the unified loader on a file path or an in-memory
+    BlobPayload and returns plain serialisable dicts.
+    """
+    from .loaders import load_document, load_document_bytes
+    if getattr(src, "data", None) is not None:
+        return _to_plain_docs(load_document_bytes(src.data, src.name))
+    return _to_plain_docs(load_document(str(getattr(src, "path", None) or src)))
+
+
+class _Lane:
+    """One process pool plus the files currently running on it (never more than its workers)."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.running: Dict[Future, Tuple[Any, Any, float]] = {}
+        self.executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: the ingest process runs pipeline threads, which fork() does not mix well with
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    @property
+    def full(self) -> bool:
+        return len(self.running) >= self.workers
+
+    def submit(self, fn: Callable[[Any], List[Dict]], key: Any, src: Any):
+        try:
+            fut = self.executor.submit(fn, src)
+        except BrokenProcessPool:
+            # a worker died (e.g. a parser crashed hard); start over with a fresh pool
+            self.executor = self._new_executor()
+            fut = self.executor.submit(fn, src)
+        # in-flight work never exceeds the worker count, so a task starts when submitted
+        self.running[fut] = (key, src, time.monotonic())
+
+    def _kill(self):
+        # ProcessPoolExecutor has no public API to terminate a busy worker
+        for p in list((getattr(self.executor, "_processes", None) or {}).values()):
+            p.terminate()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def recycle(self, fn: Callable[[Any], List[Dict]]):
+        """Kills the pool (the only way to stop a stuck parser) and resubmits its other files."""
+        survivors = list(self.running.values())
+        self._kill()
+        self.executor = self._new_executor()
+        self.running = {}
+        for key, src, _ in survivors:
+            self.submit(fn, key, src)
+
+    def close(self):
+        """Waits for an idle pool; files still running were abandoned (cancelled run), so their workers are killed."""
+        if self.running:
+            self._kill()
+            self.running = {}
+        else:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ParsePool:
+    """
+    Parses documents in worker processes so PyPDF, Unstructured, pandas and tesseract
+    use every core. Files larger than `large_file_bytes` go to a separate lane so one
+    huge file cannot occupy the whole pool, and any file that runs past `timeout`
+    seconds is abandoned (its lane is restarted) instead of stalling the run.
+    With workers=0 files are parsed inline on the calling thread.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        large_workers: int | None = None,
+        timeout: float | None = None,
+        large_file_bytes: int | None = None,
+        parse_fn: Callable[[Any], List[Dict]] = parse_file,
+    ):
+        self.workers = settings.PARSE_WORKERS if workers is None else workers
+        self.large_workers = settings.PARSE_LARGE_WORKERS if large_workers is None else large_workers
+        self.timeout = timeout or settings.PARSE_TIMEOUT_SECONDS
+        self.large_file_bytes = large_file_bytes or settings.PARSE_LARGE_FILE_BYTES
+        self.parse_fn = parse_fn
+        self._small: _Lane | None = None
+        self._large: _Lane | None = None
+        if self.workers > 0:
+            self._small = _Lane("small", self.workers)
+            self._large = _Lane("large", self.large_workers) if self.large_workers > 0 else self._small
+
+    def __enter__(self) -> "ParsePool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for lane in self._lanes():
+            lane.close()
+
+    def _lanes(self) -> List[_Lane]:
+        return list({id(l): l for l in (self._small, self._large) if l is not None}.values())
+
+    def _route(self, src) -> _Lane:
+        size = getattr(src, "size", None)
+        if size is None:
+            try:
+                size = os.path.getsize(src)
+            except OSError:
+                size = 0
+        return self._large if size > self.large_file_bytes else self._small
+
+    def _collect(self, block: bool) -> Iterator[ParseResult]:
+        """Yields finished (or timed-out) files; waits for at least one when `block`."""
+        lanes = self._lanes()
+        running = [f for l in lanes for f in l.running]
+        if not running:
+            return
+        now = time.monotonic()
+        next_deadline = min(start + self.timeout for l in lanes for _, _, start in l.running.values())
+        done, _ = wait(running, timeout=max(0.0, next_deadline - now) if block else 0,
+                       return_when=FIRST_COMPLETED)
+
+        for lane in lanes:
+            for fut in [f for f in lane.running if f in done]:
+                key, src, _ = lane.running.pop(fut)
+                # resolved before yielding: a yield inside try/except would swallow GeneratorExit
+                try:
+                    docs, err = fut.result(), None
+                except Exception as e:
+                    docs, err = None, e
+                yield key, src, docs, err
+
+        now = time.monotonic()
+        for lane in lanes:
+            expired = [f for f, (_, _, start) in lane.running.items() if now - start >= self.timeout]
+            if not expired:
+                continue
+            timed_out = [lane.running.pop(f) for f in expired]
+            log.warning("Restarting %s parse pool after %d file(s) exceeded %.0fs",
+                        lane.name, len(timed_out), self.timeout)
+            lane.recycle(self.parse_fn)
+            for key, src, _ in timed_out:
+                yield key, src, None, ParseTimeout(f"Parsing {key} exceeded {self.timeout:.0f}s")
+
+    def imap(self, items: Iterable[Tuple[Any, Any]]) -> Iterator[ParseResult]:
+        """
+        Parses (key, source) pairs and yields (key, source, docs, error) as files finish,
+        which is not necessarily input order. Exactly one of docs / error is set.
+        A source is a file path or a picklable object the parse function understands.
+        """
+        for key, src in items:
+            yield from self.feed(key, src)
+        yield from self.drain()
+
+    def feed(self, key: Any, src: Any) -> Iterator[ParseResult]:
+        """Submits one file (waiting while its lane is full) and yields the files that finished meanwhile."""
+        if self._small is None:
+            try:
+                docs, err = self.parse_fn(src), None
+            except Exception as e:
+                docs, err = None, e
+            yield key, src, docs, err
+            return
+        lane = self._route(src)
+        while lane.full:
+            yield from self._collect(block=True)
+        lane.submit(self.parse_fn, key, src)
+        yield from self._collect(block=False)
+
+    def drain(self) -> Iterator[ParseResult]:
+        """Yields the files still running as they finish."""
+        while any(l.running for l in self._lanes()):
+            yield from self._collect(block=True)
@@ -0,0 +1,90 @@
+# src/pdf_extract.py
+from __future__ import annotations
+import io
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+from pypdf import PdfReader
+
+from .config import settings
+from .ocr import image_to_text
+
+log = logging.getLogger("pdf_extract")
+
+# One OCR pool per process, shared by every PDF it parses. Threads are enough: the work
+# happens in the tesseract subprocess, and parse workers are already one process per core.
+_ocr_pool: ThreadPoolExecutor | None = None
+_ocr_pool_lock = threading.Lock()
+
+
+def _open(src: str | bytes) -> PdfReader:
+    return PdfReader(io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src)
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ThreadPoolExecutor(max_workers=settings.PDF_OCR_WORKERS, thread_name_prefix="pdf-ocr")
+        return _ocr_pool
+
+
+def _ocr(data: bytes, page_no: int) -> str:
+    try:
+        return image_to_text(data)
+    except Exception as e:
+        log.warning("OCR failed for an image on page %d: %s", page_no, e)
+        return ""
+
+
+def _page_images(page, page_no: int) -> List[bytes]:
+    """
+    Encoded images of a page with less than PDF_OCR_MIN_CHARS of text (a scan). pypdf
+    cannot render a page, but a scanned page is one image of the whole page.
+    """
+    try:
+        return [img.data for img in page.images]
+    except Exception as e:
+        log.warning("Could not read images of page %d: %s", page_no, e)
+        return []
+
+
+def _finish_page(doc: Dict, results: List[str]):
+    found = [t for t in results if t]
+    if not found:
+        return
+    text = doc["page_content"].strip()
+    doc["page_content"] = "\n\n".join(([text] if text else []) + found)
+    doc["metadata"]["ocr"] = True
+
+
+def extract_pdf(src: str | bytes, source: str) -> List[Dict]:
+    """
+    One document per page ({page_content, metadata: {source, page}}, like PyPDFLoader);
+    `src` is a path or the file's bytes. Text is extracted page by page from one reader;
+    only the images of scanned pages are OCR'd in parallel, on PDF_OCR_WORKERS threads.
+    """
+    reader = _open(src)
+    workers = settings.PDF_OCR_WORKERS
+    docs: List[Dict] = []
+    pending: OrderedDict[int, List[Future]] = OrderedDict()     # page → its images' OCR
+    for i, page in enumerate(reader.pages):
+        text = page.extract_text() or ""
+        docs.append({"page_content": text, "metadata": {"source": source, "page": i}})
+        if len(text.strip()) >= settings.PDF_OCR_MIN_CHARS:
+            continue
+        images = _page_images(page, i)
+        if workers <= 1:
+            _finish_page(docs[i], [_ocr(data, i) for data in images])
+            continue
+        pending[i] = [_pool().submit(_ocr, data, i) for data in images]
+        # a few pages per thread in flight, so a long scan does not hold every image at once
+        while len(pending) > workers * 2:
+            page_no, futures = pending.popitem(last=False)
+            _finish_page(docs[page_no], [f.result() for f in futures])
+    for page_no, futures in pending.items():
+        _finish_page(docs[page_no], [f.result() for f in futures])
+    return docs
@@ -0,0 +1,96 @@
+# src/pipeline.py
+from __future__ import annotations
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+log = logging.getLogger("pipeline")
+
+# A stage consumes the iterator of items produced upstream and yields items for
+# the next stage. Generators make batching / fan-out stages trivial to write.
+Stage = Callable[[Iterator[Any]], Iterable[Any]]
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class _Cancelled(Exception):
+    """Raised inside a stage thread when another stage has failed."""
+
+
+class _Channel:
+    """Bounded queue between two stages that gives up once the run is cancelled."""
+
+    def __init__(self, depth: int, stop: threading.Event):
+        self._q: queue.Queue = queue.Queue(maxsize=max(1, depth))
+        self._stop = stop
+
+    def put(self, item: Any):
+        while True:
+            if self._stop.is_set():
+                raise _Cancelled()
+            try:
+                self._q.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            if self._stop.is_set():
+                raise _Cancelled()
+            try:
+                item = self._q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+
+def run_pipeline(
+    source: Iterable[Any],
+    stages: List[Tuple[str, Stage]],
+    queue_depth: int = 8,
+) -> None:
+    """
+    Runs `source` and every stage in its own thread, connected by bounded queues.
+    Whatever the last stage yields is discarded, so it should do the final side effect.
+    At most `queue_depth` items wait between two stages, which bounds peak memory.
+    The first exception raised by any stage cancels the others and is re-raised here.
+    """
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    channels = [_Channel(queue_depth, stop) for _ in stages]
+
+    def _feed(items: Iterable[Any], out: _Channel | None, name: str):
+        try:
+            for item in items:
+                if out is not None:
+                    out.put(item)
+            if out is not None:
+                out.put(_DONE)
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            log.error("Pipeline stage '%s' failed: %s", name, e)
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=_feed, args=(source, channels[0], "source"), name="pipeline-source", daemon=True)]
+    for i, (name, fn) in enumerate(stages):
+        out = channels[i + 1] if i + 1 < len(channels) else None
+        threads.append(threading.Thread(
+            target=lambda fn=fn, inp=channels[i], out=out, name=name: _feed(fn(iter(inp)), out, name),
+            name=f"pipeline-{name}",
+            daemon=True,
+        ))
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
@@ -1,12 +1,56 @@
 # src/query_api.py
-from fastapi import FastAPI, Query, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, HTTPException, Request
 from pydantic import BaseModel
-from .embeddings import embed_texts
-from .search_index import vector_hybrid_search
+from .embeddings import embed_texts, aembed_texts, create_async_client
+from .embed_coalescer import EmbeddingCoalescer
+from .query_cache import QueryEmbeddingCache
+from .search_backend import create_backend
+from .search_index import get_async_search_client
 from .config import settings
+import asyncio
+import logging
 import traceback
 
-app = FastAPI(title="Vector Search Query API")
+log = logging.getLogger("query_api")
+
+# popular queries skip the Azure OpenAI round trip
+query_cache = QueryEmbeddingCache(
+    embed_texts,
+    max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.QUERY_CACHE_TTL_SECONDS,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """One pooled async search client + one async OpenAI client for the whole process."""
+    app.state.search_client = None
+    app.state.search_backend = None
+    app.state.openai_client = None
+    app.state.embed_coalescer = None
+    try:
+        app.state.openai_client = create_async_client()
+        if "azure" in settings.SEARCH_BACKEND.lower():
+            app.state.search_client = get_async_search_client()
+        app.state.search_backend = create_backend(async_client=app.state.search_client)
+        # different queries arriving together share one embeddings call
+        coalescer = EmbeddingCoalescer(
+            lambda texts: aembed_texts(app.state.openai_client, texts),
+            window_ms=settings.QUERY_EMBED_WINDOW_MS,
+            max_batch=settings.QUERY_EMBED_MAX_BATCH,
+        )
+        app.state.embed_coalescer = coalescer
+        query_cache.aembed_fn = coalescer.embed
+    except Exception as e:
+        # keep /healthz up so misconfiguration is visible instead of a crash loop
+        log.error("Search clients not initialised: %s", e)
+    yield
+    if app.state.search_client is not None:
+        await app.state.search_client.close()
+    if app.state.openai_client is not None:
+        await app.state.openai_client.close()
+
+app = FastAPI(title="Vector Search Query API", lifespan=lifespan)
 
 class SearchResponse(BaseModel):
     fileName: str | None = None
@@ -15,24 +59,85 @@ class SearchResponse(BaseModel):
     snippet: str | None = None
     score: float | None = None   # <-- make optional
 
+class BatchSearchRequest(BaseModel):
+    queries: list[str]
+    k: int = 5
+    filters: dict[str, str | list[str]] | None = None   # e.g. {"docType": ["pdf", "docx"]}
+
+class BatchSearchResult(BaseModel):
+    query: str
+    results: list[SearchResponse] = []
+    error: str | None = None
+
+def _with_defaults(results: list[dict]) -> list[dict]:
+    """Ensure all required keys exist."""
+    for r in results:
+        r.setdefault("fileName", None)
+        r.setdefault("chunkId", None)
+        r.setdefault("docType", None)
+        r.setdefault("snippet", None)
+        r.setdefault("score", None)
+    return results
+
+def _search_backend(request: Request):
+    backend = request.app.state.search_backend
+    if backend is None or query_cache.aembed_fn is None:
+        raise RuntimeError("search clients are not configured (see startup logs)")
+    return backend
+
 @app.get("/healthz")
-def health():
-    return {"status": "ok", "index": settings.AZURE_SEARCH_INDEX}
+def health(request: Request):
+    backend = request.app.state.search_backend
+    return {"status": "ok", "index": settings.AZURE_SEARCH_INDEX, "backend": backend.name if backend else None}
+
+@app.get("/metrics/query-cache")
+def query_cache_metrics(request: Request):
+    coalescer = request.app.state.embed_coalescer
+    return {**query_cache.stats(), "embed_batching": coalescer.stats() if coalescer else None}
 
 @app.get("/search", response_model=list[SearchResponse])
-def search(q: str = Query(..., description="Your query"), k: int = 5):
+async def search(
+    request: Request,
+    q: str = Query(..., description="Your query"),
+    k: int = 5,
+    docType: list[str] | None = Query(None, description="Only these document types"),
+    fileName: list[str] | None = Query(None, description="Only these source files"),
+):
+    filters = {f: v for f, v in (("docType", docType), ("fileName", fileName)) if v}
     try:
-        vec = embed_texts([q])[0]     # Azure OpenAI call
-        results = vector_hybrid_search(q, vec, top_k=k)
-        # Ensure all required keys exist
-        for r in results:
-            r.setdefault("fileName", None)
-            r.setdefault("chunkId", None)
-            r.setdefault("docType", None)
-            r.setdefault("snippet", None)
-            r.setdefault("score", None)
-        return results
+        backend = _search_backend(request)
+        vec = await query_cache.aget(q)    # Azure OpenAI call on a cache miss
+        results = await backend.asearch(q, vec, top_k=k, filters=filters or None)
+        return _with_defaults(results)
     except Exception as e:
         # Log full stack to server logs and return a clean JSON error
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Search failed: {e}")
+
+@app.post("/search/batch", response_model=list[BatchSearchResult])
+async def search_batch(request: Request, body: BatchSearchRequest):
+    """Many queries in one round trip: one embeddings call, bounded concurrent searches, input order."""
+    if len(body.queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=422,
+                            detail=f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries per batch")
+    if not body.queries:
+        return []
+    try:
+        backend = _search_backend(request)
+        vectors = await query_cache.aget_many(body.queries)
+    except Exception as e:
+        traceback.print_exc()
+        return [BatchSearchResult(query=q, error=f"Embedding failed: {e}") for q in body.queries]
+
+    gate = asyncio.Semaphore(settings.SEARCH_BATCH_CONCURRENCY)
+
+    async def one(q: str, vec: list[float]) -> BatchSearchResult:
+        async with gate:
+            try:
+                results = await backend.asearch(q, vec, top_k=body.k, filters=body.filters)
+                return BatchSearchResult(query=q, results=_with_defaults(results))
+            except Exception as e:
+                log.exception("Search failed for batch query %r", q)
+                return BatchSearchResult(query=q, error=f"Search failed: {e}")
+
+    return await asyncio.gather(*(one(q, v) for q, v in zip(body.queries, vectors)))
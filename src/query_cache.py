@@ -0,0 +1,175 @@
+# src/query_cache.py
+from __future__ import annotations
+import time
+import asyncio
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+
+def normalize_query(q: str) -> str:
+    """Cache key for a query: NFKC, collapsed whitespace, case-folded."""
+    return " ".join(unicodedata.normalize("NFKC", q).split()).casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU + TTL cache of query vectors keyed by normalized query text.
+    The key is only for lookups; on a miss the query as typed is what gets embedded.
+    Concurrent misses for the same key are single-flighted: the first caller embeds,
+    the others wait on its result, so a burst of identical queries costs one call.
+    get() serves threads with `embed_fn`; aget() serves the event loop with `aembed_fn`.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_entries: int = 10_000,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+        aembed_fn: Callable[[List[str]], Awaitable[List[List[float]]]] | None = None,
+    ):
+        self.embed_fn = embed_fn
+        self.aembed_fn = aembed_fn
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._clock = clock
+        self._data: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._ainflight: Dict[str, asyncio.Future] = {}
+        self._tasks: set = set()        # shared embed calls (the loop only keeps weak references)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _lookup(self, key: str) -> List[float] | None:
+        """Fresh cached vector for `key` (refreshing its LRU position); caller holds the lock."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        stored_at, vec = entry
+        if self._clock() - stored_at > self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return vec
+
+    def _store(self, key: str, vec: List[float]):
+        self._data[key] = (self._clock(), vec)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, query: str) -> List[float]:
+        key = normalize_query(query)
+        with self._lock:
+            vec = self._lookup(key)
+            if vec is not None:
+                self.hits += 1
+                return vec
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._inflight[key] = fut
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return fut.result()
+
+        try:
+            vec = self.embed_fn([query])[0]
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, vec)
+            self._inflight.pop(key, None)
+        fut.set_result(vec)
+        return vec
+
+    async def aget(self, query: str) -> List[float]:
+        return (await self.aget_many([query]))[0]
+
+    async def aget_many(self, queries: List[str]) -> List[List[float]]:
+        """Vectors for `queries` in order; all misses not already in flight go out in one aembed_fn call."""
+        keys = [normalize_query(q) for q in queries]
+        originals: Dict[str, str] = {}
+        for key, q in zip(keys, queries):
+            originals.setdefault(key, q)        # the first spelling seen is the one embedded
+        found: Dict[str, List[float]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        led: Dict[str, asyncio.Future] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vec = self._lookup(key)
+                if vec is not None:
+                    self.hits += 1
+                    found[key] = vec
+                elif key in self._ainflight:
+                    self.coalesced += 1
+                    waiting[key] = self._ainflight[key]
+                else:
+                    self.misses += 1
+                    led[key] = self._ainflight[key] = asyncio.get_running_loop().create_future()
+
+        if led:
+            # the call runs in its own task: cancelling the leader must not fail the other callers
+            task = asyncio.ensure_future(self._aembed_shared(led, [originals[k] for k in led]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            waiting.update(led)
+
+        for key, fut in waiting.items():
+            # shield: a waiter going away must not cancel the shared call
+            found[key] = await asyncio.shield(fut)
+        return [found[k] for k in keys]
+
+    async def _aembed_shared(self, led: Dict[str, asyncio.Future], texts: List[str]):
+        """Embeds the keys in `led` and resolves their futures, whatever the outcome."""
+        try:
+            vectors = await self.aembed_fn(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"Embedding call returned {len(vectors)} vectors for {len(texts)} queries")
+        except BaseException as e:
+            with self._lock:
+                for key in led:
+                    self._ainflight.pop(key, None)
+            for fut in led.values():
+                if isinstance(e, asyncio.CancelledError):
+                    fut.cancel()
+                else:
+                    fut.set_exception(e)
+                    fut.exception()  # mark retrieved; waiters (if any) still receive it
+            if not isinstance(e, Exception):
+                raise
+            return
+        with self._lock:
+            for key, vec in zip(led, vectors):
+                self._store(key, vec)
+                self._ainflight.pop(key, None)
+        for fut, vec in zip(led.values(), vectors):
+            fut.set_result(vec)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                # a coalesced lookup did not cost an embedding call either
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,127 @@
+# src/reindex.py
+"""
+Rebuilds a search index from the embeddings archive: no downloads, no parsing and no
+embedding calls, only Parquet rows streamed from Blob into parallel upload batches.
+
+    python -m src.reindex                          # current archive state → AZURE_SEARCH_INDEX
+    python -m src.reindex --index docs-index-new   # into another (new) index
+    python -m src.reindex --blue-green             # into a new version, then switch the alias
+    python -m src.reindex --partition y=2025/m=11/d=02/h=19
+"""
+from __future__ import annotations
+import argparse
+import logging
+import time
+from typing import Iterator, List
+
+import pandas as pd
+
+from .config import settings
+from .archive_catalog import ArchiveCatalog
+from .archive_compaction import latest_batches, live_chunk_ids, latest_rows
+from .archive_store import list_archive_blobs
+from .chunk_batch import ChunkBatch
+from .search_index import UploadSummary, ensure_index, upload_docs
+from . import index_versions
+
+log = logging.getLogger("reindex")
+
+_COLUMNS = ["id", "fileName", "chunkId", "docType", "content", "vector"]
+
+
+class IncompleteArchiveError(RuntimeError):
+    """The archive lacks chunks the ingest manifest says are live; nothing was uploaded."""
+
+
+def _all_partitions() -> List[str]:
+    """
+    Every partition needed for the latest state, oldest first: the latest compacted
+    generation plus the partitions after it, or all partitions when nothing is compacted.
+    """
+    return ArchiveCatalog.update(lambda catalog: catalog.refresh()).current("parquet")
+
+
+def _archive_files(partitions: List[str]) -> List[str]:
+    catalog = ArchiveCatalog.load()
+    files = []
+    for p in partitions:
+        entry = catalog.entries.get(f"parquet/{p}")
+        files.extend(entry["files"] if entry else list_archive_blobs("parquet", p))
+    return files
+
+
+def iter_archived_chunks(files: List[str], prune_deleted: bool = True,
+                         keys: pd.DataFrame | None = None) -> Iterator[ChunkBatch]:
+    """
+    ChunkBatches (row-group slices, vectors kept as a matrix) holding the latest version
+    of every chunk across `files` (oldest first). Which rows win is decided up front from
+    the id / created_at columns (or given as `keys`, see latest_rows), so two versions of
+    a chunk never race in parallel uploads.
+    """
+    if keys is None:
+        keys = latest_rows(files, live_chunk_ids() if prune_deleted else None)
+    yield from latest_batches(files, keys, _COLUMNS)
+
+
+def reindex_from_archive(index_name: str | None = None, partitions: List[str] | None = None,
+                         prune_deleted: bool = True, max_workers: int | None = None,
+                         blue_green: bool = False) -> UploadSummary:
+    """
+    Uploads archived chunks into `index_name` (default AZURE_SEARCH_INDEX), creating the
+    index if needed. `partitions` defaults to every partition of the current archive state,
+    newest row per chunk winning. With prune_deleted the result must cover every chunk the
+    ingest manifest lists, or IncompleteArchiveError is raised before anything is uploaded.
+    Rows are streamed into upload_docs, so batches are sized by bytes and sent
+    SEARCH_UPLOAD_WORKERS at a time with retries.
+    With blue_green the rows go into a new index version that is promoted behind the
+    alias afterwards (see index_versions); `index_name` is ignored then.
+    """
+    partitions = partitions or _all_partitions()
+    files = _archive_files(partitions)
+    if not files:
+        raise FileNotFoundError("No Parquet archive snapshot found to reindex from")
+    live = live_chunk_ids() if prune_deleted else None
+    keys = latest_rows(files, live)
+    if live is not None and len(keys) < len(live):
+        missing = sorted(live - set(keys["id"]))
+        raise IncompleteArchiveError(
+            f"Archive holds {len(keys)} of {len(live)} live chunks (missing e.g. {missing[:3]}); "
+            f"run an ingest or check the partitions before reindexing")
+    if blue_green:
+        index_name = index_versions.create_next_version()
+    else:
+        ensure_index(index_name)
+
+    t0 = time.perf_counter()
+    try:
+        # one upload_docs call over the whole stream keeps every worker busy across file boundaries
+        summary = upload_docs(iter_archived_chunks(files, keys=keys), max_workers=max_workers, index_name=index_name)
+        log.info("Reindex complete: %d indexed, %d retried, %d failed from %d files in %.1fs",
+                 summary.succeeded, summary.retried, summary.failed, len(files), time.perf_counter() - t0)
+        if blue_green:
+            index_versions.promote(index_name, expected=summary.succeeded)
+    except BaseException:
+        if blue_green:
+            index_versions.discard_version(index_name)
+        raise
+    if blue_green:
+        index_versions.gc_versions()
+    return summary
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--index", default=None, help="target index (default: AZURE_SEARCH_INDEX)")
+    ap.add_argument("--partition", nargs="+", default=None, help="archive partitions, oldest first")
+    ap.add_argument("--keep-deleted", action="store_true",
+                    help="also upload chunks that are no longer in the ingest manifest")
+    ap.add_argument("--workers", type=int, default=None, help="parallel upload requests")
+    ap.add_argument("--blue-green", action="store_true", help="build a new index version and switch the alias")
+    args = ap.parse_args()
+    summary = reindex_from_archive(args.index, args.partition, not args.keep_deleted, args.workers, args.blue_green)
+    raise SystemExit(1 if summary.failed else 0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    main()
@@ -0,0 +1,177 @@
+# src/search_backend.py
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Iterable, List
+
+from .config import settings
+from .search_index import (
+    UploadSummary,
+    delete_docs,
+    upload_docs,
+    vector_hybrid_search,
+    vector_hybrid_search_async,
+)
+
+log = logging.getLogger("search_backend")
+
+
+class SearchBackend:
+    """
+    What the query API needs from a vector store. Results are dicts with
+    fileName / chunkId / docType / snippet / score, best first.
+    """
+
+    name = "base"
+
+    def search(self, query: str, query_vector: List[float], top_k: int = 5,
+               filters: dict | None = None) -> List[dict]:
+        raise NotImplementedError
+
+    async def asearch(self, query: str, query_vector: List[float], top_k: int = 5,
+                      filters: dict | None = None) -> List[dict]:
+        return await asyncio.to_thread(self.search, query, query_vector, top_k, filters)
+
+    def upload(self, items: Iterable[dict], merge: bool = False) -> UploadSummary:
+        raise NotImplementedError
+
+    def delete(self, ids: Iterable[str]):
+        raise NotImplementedError
+
+
+class AzureSearchBackend(SearchBackend):
+    """Azure Cognitive Search; `async_client` (get_async_search_client) serves asearch."""
+
+    name = "azure"
+
+    def __init__(self, async_client=None):
+        self.async_client = async_client
+
+    def search(self, query, query_vector, top_k=5, filters=None):
+        return vector_hybrid_search(query, query_vector, top_k=top_k, filters=filters)
+
+    async def asearch(self, query, query_vector, top_k=5, filters=None):
+        if self.async_client is None:
+            return await super().asearch(query, query_vector, top_k, filters)
+        return await vector_hybrid_search_async(self.async_client, query, query_vector,
+                                                top_k=top_k, filters=filters)
+
+    def upload(self, items, merge=False):
+        return upload_docs(items, merge=merge)
+
+    def delete(self, ids):
+        delete_docs(ids)
+
+
+class LocalSearchBackend(SearchBackend):
+    """In-process index (local_index.LocalVectorIndex) built from the embeddings archive."""
+
+    name = "local"
+    inline_rows = 5_000     # indexes this small are scored on the event loop, the rest on a thread
+
+    def __init__(self, index):
+        self.index = index
+
+    def search(self, query, query_vector, top_k=5, filters=None):
+        return self.index.search(query_vector, top_k=top_k, filters=filters)
+
+    async def asearch(self, query, query_vector, top_k=5, filters=None):
+        # below ~5k rows the scan takes well under a millisecond, less than the thread hop
+        if len(self.index) <= self.inline_rows:
+            return self.search(query, query_vector, top_k, filters)
+        return await super().asearch(query, query_vector, top_k, filters)
+
+    def upload(self, items, merge=False):
+        return UploadSummary(succeeded=self.index.upsert(items))
+
+    def delete(self, ids):
+        self.index.delete(ids)
+
+
+class FallbackSearchBackend(SearchBackend):
+    """
+    Queries `primary` and answers from `fallback` when it fails or takes longer than
+    `timeout` seconds (degraded mode). Writes only go to the primary.
+    """
+
+    def __init__(self, primary: SearchBackend, fallback: SearchBackend, timeout: float):
+        self.primary = primary
+        self.fallback = fallback
+        self.timeout = timeout
+        self.name = f"{primary.name}+{fallback.name}"
+        self.fallbacks = 0
+
+    def search(self, query, query_vector, top_k=5, filters=None):
+        try:
+            return self.primary.search(query, query_vector, top_k, filters)
+        except Exception as e:
+            return self._degrade(e, self.fallback.search, query, query_vector, top_k, filters)
+
+    async def asearch(self, query, query_vector, top_k=5, filters=None):
+        try:
+            return await asyncio.wait_for(self.primary.asearch(query, query_vector, top_k, filters), self.timeout)
+        except ValueError:
+            raise  # bad filter: the fallback would reject it too
+        except Exception as e:
+            return await self._degrade(e, self.fallback.asearch, query, query_vector, top_k, filters)
+
+    def _degrade(self, err, search, *args):
+        self.fallbacks += 1
+        log.warning("%s search failed (%r); answering from %s", self.primary.name, err, self.fallback.name)
+        return search(*args)
+
+    def upload(self, items, merge=False):
+        return self.primary.upload(items, merge=merge)
+
+    def delete(self, ids):
+        self.primary.delete(ids)
+
+
+def load_local_index():
+    """
+    The archive snapshot in LOCAL_INDEX_PARTITION (when empty: the latest compacted
+    generation plus the partitions written since, or else the latest partition), searched
+    exactly or, with LOCAL_INDEX_ANN=ivf, through its persisted IVF index. LOCAL_INDEX_CODEC=int8|pq
+    adds a compressed first scoring pass with exact rescoring.
+    """
+    from .archive_catalog import current_partitions
+    from .local_index import LocalVectorIndex
+
+    fmt = settings.LOCAL_INDEX_ARCHIVE_FORMAT
+    partitions = [settings.LOCAL_INDEX_PARTITION] if settings.LOCAL_INDEX_PARTITION else current_partitions(fmt)
+    if not partitions:
+        raise FileNotFoundError("No embeddings archive snapshot found")
+    if settings.LOCAL_INDEX_ANN == "ivf":
+        from .ann_index import IVFIndex
+        # the IVF index is persisted for the oldest (largest) partition; newer rows are searched exactly beside it
+        index = IVFIndex.for_partition(partitions[0])
+        if len(partitions) > 1:
+            index.merge(LocalVectorIndex.load_partitions(partitions[1:], fmt))
+        if settings.LOCAL_INDEX_CODEC != "none":
+            index.base.compress(settings.LOCAL_INDEX_CODEC)
+        return index
+    index = LocalVectorIndex.load_partitions(partitions, fmt)
+    if settings.LOCAL_INDEX_CODEC != "none":
+        index.compress(settings.LOCAL_INDEX_CODEC)
+    return index
+
+
+def create_backend(kind: str | None = None, async_client=None) -> SearchBackend:
+    """
+    SEARCH_BACKEND: "azure", "local", or "azure+local" (Azure, falling back to the local
+    index after SEARCH_FALLBACK_TIMEOUT_MS). The local index is loaded from the archive.
+    """
+    kind = (kind or settings.SEARCH_BACKEND).lower()
+    if kind == "azure":
+        return AzureSearchBackend(async_client)
+    if kind == "local":
+        return LocalSearchBackend(load_local_index())
+    if kind == "azure+local":
+        azure = AzureSearchBackend(async_client)
+        try:
+            local = LocalSearchBackend(load_local_index())
+        except Exception as e:
+            log.warning("Local fallback index unavailable, using Azure only: %s", e)
+            return azure
+        return FallbackSearchBackend(azure, local, settings.SEARCH_FALLBACK_TIMEOUT_MS / 1000.0)
+    raise ValueError(f"Unknown SEARCH_BACKEND {kind!r} (expected azure, local or azure+local)")
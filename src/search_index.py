@@ -1,6 +1,15 @@
 # src/search_index.py
+import json
+import time
+import random
+import logging
+from dataclasses import dataclass, field
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import AzureError, HttpResponseError, ServiceRequestError, ServiceResponseError
 from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     SearchIndex,
@@ -13,8 +22,11 @@ from azure.search.documents.indexes.models import (
 )
 from azure.search.documents.models import VectorizedQuery
 
-from typing import Iterable
+from typing import Callable, Iterable, List
 from .config import settings
+from .chunk_batch import ChunkBatch
+
+log = logging.getLogger("search_index")
 
 # 1536 for text-embedding-3-small (Azure OpenAI)
 DIM = 1536
@@ -31,19 +43,49 @@ def get_index_client():
     )
 
 
-def get_search_client():
+def get_search_client(index_name: str | None = None):
     return SearchClient(
+        endpoint=settings.AZURE_SEARCH_ENDPOINT,
+        index_name=index_name or INDEX_NAME,
+        credential=AzureKeyCredential(settings.AZURE_SEARCH_API_KEY),
+    )
+
+
+def get_async_search_client(pool_size: int | None = None) -> AsyncSearchClient:
+    """
+    Async client for the query path. Create it once (FastAPI lifespan) and close it on
+    shutdown; its aiohttp connector keeps up to `pool_size` connections warm.
+    """
+    import aiohttp
+    from azure.core.pipeline.transport import AioHttpTransport
+
+    connector = aiohttp.TCPConnector(
+        limit=pool_size or settings.QUERY_POOL_SIZE,
+        keepalive_timeout=60,
+        ttl_dns_cache=300,
+    )
+    # the transport owns the session, so closing the client closes the connection pool
+    transport = AioHttpTransport(session=aiohttp.ClientSession(connector=connector), session_owner=True)
+    return AsyncSearchClient(
         endpoint=settings.AZURE_SEARCH_ENDPOINT,
         index_name=INDEX_NAME,
         credential=AzureKeyCredential(settings.AZURE_SEARCH_API_KEY),
+        transport=transport,
     )
 
 
-def ensure_index():
+def ensure_index(index_name: str | None = None):
+    index_name = index_name or INDEX_NAME
     ic = get_index_client()
     try:
         # If it exists, do nothing
-        ic.get_index(INDEX_NAME)
+        ic.get_index(index_name)
+        return
+    except Exception:
+        pass
+    try:
+        # an alias (blue/green, see index_versions) already points at a built index
+        ic.get_alias(index_name)
         return
     except Exception:
         pass
@@ -80,7 +122,7 @@ def ensure_index():
     )
 
     index = SearchIndex(
-        name=INDEX_NAME,
+        name=index_name,
         fields=fields,
         vector_search=vector_search,
     )
@@ -98,42 +140,238 @@ def clear_index():
     ensure_index()
 
 
-def upload_docs(items: Iterable[dict]):
-    sc = get_search_client()
-    batch = []
+# Per-document statuses worth retrying: version conflict, index busy, throttled, server error
+_RETRYABLE_DOC_STATUS = {409, 422, 429, 500, 503}
+# Whole-request failures worth retrying
+_RETRYABLE_BATCH_STATUS = {429, 500, 502, 503, 504}
+# Upper bound on the JSON size of one float (e.g. "-0.0123456789012345678,")
+_FLOAT_JSON_BYTES = 24
+_MAX_DOCS_PER_BATCH = 1000
+
+
+@dataclass
+class UploadSummary:
+    """Outcome of upload_docs; `retried` counts documents that needed at least one retry."""
+    succeeded: int = 0
+    retried: int = 0
+    failed: int = 0
+    failed_keys: List[str] = field(default_factory=list)
+
+    def add(self, other: "UploadSummary"):
+        self.succeeded += other.succeeded
+        self.retried += other.retried
+        self.failed += other.failed
+        self.failed_keys.extend(other.failed_keys)
+
+
+def _to_search_doc(it: dict) -> dict:
+    return {
+        "id": it["id"],
+        "content": it["content"],
+        "contentVector": it["vector"],
+        "fileName": it["metadata"].get("source", ""),
+        "chunkId": it["chunkId"],
+        "docType": it["metadata"].get("type", "unknown"),
+    }
+
+
+def _search_docs(items: Iterable[ChunkBatch | dict]) -> Iterable[dict]:
     for it in items:
-        batch.append({
-            "id": it["id"],
-            "content": it["content"],
-            "contentVector": it["vector"],
-            "fileName": it["metadata"].get("source", ""),
-            "chunkId": it["chunkId"],
-            "docType": it["metadata"].get("type", "unknown"),
-        })
-        if len(batch) == 1000:
-            sc.upload_documents(batch)
-            batch.clear()
+        if isinstance(it, ChunkBatch):
+            yield from it.search_docs()
+        else:
+            yield _to_search_doc(it)
+
+
+def _estimate_doc_bytes(doc: dict) -> int:
+    """Serialized size of a document without JSON-encoding its vector."""
+    vec = doc.get("contentVector") or []
+    rest = {k: v for k, v in doc.items() if k != "contentVector"}
+    return len(json.dumps(rest, ensure_ascii=False).encode("utf-8")) + len(vec) * _FLOAT_JSON_BYTES + 32
+
+
+def _iter_payload_batches(docs: Iterable[dict], max_bytes: int) -> Iterable[List[dict]]:
+    """Groups documents into requests under both the byte budget and the 1000-document limit."""
+    batch: List[dict] = []
+    size = 0
+    for d in docs:
+        n = _estimate_doc_bytes(d)
+        if batch and (len(batch) >= _MAX_DOCS_PER_BATCH or size + n > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(d)
+        size += n
+    if batch:
+        yield batch
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+
+
+def _send_with_retry(send: Callable[[List[dict]], list], docs: List[dict], max_retries: int) -> UploadSummary:
+    """
+    Sends one batch; resends only the documents whose IndexingResult is retryable.
+    Never raises: a batch that cannot be sent counts all its documents as failed.
+    """
+    summary = UploadSummary()
+    pending = docs
+    retried_keys = set()
+    attempt = 0
+    while pending:
+        try:
+            results = send(pending)
+        except Exception as e:
+            # dropped connections (request or response side) and throttling are worth another try
+            transient = isinstance(e, (ServiceRequestError, ServiceResponseError)) or (
+                isinstance(e, HttpResponseError) and e.status_code in _RETRYABLE_BATCH_STATUS)
+            if not transient or attempt >= max_retries:
+                if isinstance(e, AzureError):
+                    log.error("Request for %d documents failed: %s", len(pending), e)
+                else:
+                    log.exception("Request for %d documents failed unexpectedly: %s", len(pending), e)
+                summary.failed += len(pending)
+                summary.failed_keys.extend(d["id"] for d in pending)
+                break
+            retried_keys.update(d["id"] for d in pending)
+            time.sleep(_backoff(attempt))
+            attempt += 1
+            continue
+
+        by_key = {d["id"]: d for d in pending}
+        retry: List[dict] = []
+        for r in results:
+            if r.succeeded:
+                summary.succeeded += 1
+            elif r.status_code in _RETRYABLE_DOC_STATUS and attempt < max_retries:
+                retry.append(by_key[r.key])
+            else:
+                log.warning("Indexing failed for %s (%s): %s", r.key, r.status_code, r.error_message)
+                summary.failed += 1
+                summary.failed_keys.append(r.key)
+        if retry:
+            retried_keys.update(d["id"] for d in retry)
+            time.sleep(_backoff(attempt))
+            attempt += 1
+        pending = retry
+
+    summary.retried = len(retried_keys)
+    return summary
+
+
+def upload_docs(
+    items: ChunkBatch | Iterable[ChunkBatch] | Iterable[dict],
+    merge: bool = False,
+    max_workers: int | None = None,
+    max_batch_bytes: int | None = None,
+    max_retries: int | None = None,
+    index_name: str | None = None,
+) -> UploadSummary:
+    """
+    Uploads chunks (a ChunkBatch, a stream of ChunkBatches, or chunk dicts) to the index. Requests are sized by serialized bytes (not a fixed
+    document count) and up to SEARCH_UPLOAD_WORKERS of them run at once. Documents
+    whose per-item status is retryable (e.g. 503 inside a 207 response) are resent with
+    backoff; the returned summary counts succeeded / retried / failed documents.
+    With merge=True existing documents with the same key are updated in place
+    (merge_or_upload), which incremental ingestion relies on. `index_name` targets
+    another index than AZURE_SEARCH_INDEX (e.g. a reindex into a new index).
+    """
+    sc = get_search_client(index_name)
+    send = sc.merge_or_upload_documents if merge else sc.upload_documents
+    max_workers = max_workers or settings.SEARCH_UPLOAD_WORKERS
+    max_batch_bytes = max_batch_bytes or settings.SEARCH_MAX_BATCH_BYTES
+    max_retries = settings.SEARCH_UPLOAD_MAX_RETRIES if max_retries is None else max_retries
+
+    summary = UploadSummary()
+    docs = items.search_docs() if isinstance(items, ChunkBatch) else _search_docs(items)
+    batches = _iter_payload_batches(docs, max_batch_bytes)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload") as pool:
+        running = set()
+        for batch in batches:
+            # bounded fan-out: never more than 2x workers batches materialised at once
+            if len(running) >= max_workers * 2:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for f in done:
+                    summary.add(f.result())
+            running.add(pool.submit(_send_with_retry, send, batch, max_retries))
+        for f in running:
+            summary.add(f.result())
+    return summary
+
+
+def delete_docs(ids: Iterable[str], max_retries: int | None = None) -> UploadSummary:
+    """
+    Deletes documents by key, e.g. orphaned chunks of modified or removed blobs, with
+    the same per-document retries as uploads; failures are logged and counted.
+    """
+    sc = get_search_client()
+    max_retries = settings.SEARCH_UPLOAD_MAX_RETRIES if max_retries is None else max_retries
+    summary = UploadSummary()
+    batch: List[dict] = []
+    for i in ids:
+        batch.append({"id": i})
+        if len(batch) == _MAX_DOCS_PER_BATCH:
+            summary.add(_send_with_retry(sc.delete_documents, batch, max_retries))
+            batch = []
     if batch:
-        sc.upload_documents(batch)
+        summary.add(_send_with_retry(sc.delete_documents, batch, max_retries))
+    if summary.failed:
+        log.warning("Could not delete %d documents (e.g. %s)", summary.failed, summary.failed_keys[:3])
+    return summary
+
+
+_SELECT = ["fileName", "chunkId", "content", "docType"]
+# Metadata fields declared filterable in ensure_index
+FILTERABLE_FIELDS = ("fileName", "chunkId", "docType")
+
 
+def filter_values(value) -> list:
+    """A filter value is one value or a list of accepted values."""
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
 
-def vector_hybrid_search(query: str, query_vector: list[float], top_k=5):
+
+def _odata_filter(filters: dict | None) -> str | None:
+    """{"docType": ["pdf", "txt"], "fileName": "a.pdf"} → OData $filter (values ORed, fields ANDed)."""
+    clauses = []
+    for name, value in (filters or {}).items():
+        if name not in FILTERABLE_FIELDS:
+            raise ValueError(f"Cannot filter on {name!r}; filterable fields: {', '.join(FILTERABLE_FIELDS)}")
+        terms = [f"{name} eq '{str(v).replace(chr(39), chr(39) * 2)}'" for v in filter_values(value)]
+        clauses.append(terms[0] if len(terms) == 1 else "(" + " or ".join(terms) + ")")
+    return " and ".join(clauses) or None
+
+
+def _vector_query(query_vector: list[float], top_k: int) -> VectorizedQuery:
+    return VectorizedQuery(
+        vector=query_vector,
+        fields="contentVector",
+        k=top_k,
+        profile=PROFILE_NAME,   # matches your index's vector profile
+    )
+
+
+def _to_result(r) -> dict:
+    return {
+        "fileName": r.get("fileName"),
+        "chunkId": r.get("chunkId"),
+        "docType": r.get("docType"),
+        "snippet": (r.get("content") or "")[:400],
+        "score": r.get("@search.score"),
+    }
+
+
+def vector_hybrid_search(query: str, query_vector: list[float], top_k=5, filters: dict | None = None):
     sc = get_search_client()
+    odata = _odata_filter(filters)
 
     try:
         # New API (11.6.x): use vector_queries + VectorizedQuery
-        vq = VectorizedQuery(
-            vector=query_vector,
-            fields="contentVector",
-            k=top_k,
-            profile=PROFILE_NAME,   # matches your index's vector profile
-        )
-
         results = sc.search(
             search_text=query,              # keep lexical text for hybrid
-            vector_queries=[vq],            # ← new way
+            vector_queries=[_vector_query(query_vector, top_k)],   # ← new way
             top=top_k,
-            select=["fileName", "chunkId", "content", "docType"],
+            select=_SELECT,
+            filter=odata,
         )
 
     except TypeError:
@@ -142,16 +380,22 @@ def vector_hybrid_search(query: str, query_vector: list[float], top_k=5):
             search_text=query,
             vector={"value": query_vector, "fields": "contentVector", "k": top_k, "profile": PROFILE_NAME},
             top=top_k,
-            select=["fileName", "chunkId", "content", "docType"],
+            select=_SELECT,
+            filter=odata,
         )
 
-    out = []
-    for r in results:
-        out.append({
-            "fileName": r.get("fileName"),
-            "chunkId": r.get("chunkId"),
-            "docType": r.get("docType"),
-            "snippet": (r.get("content") or "")[:400],
-            "score": r.get("@search.score"),
-        })
-    return out
+    return [_to_result(r) for r in results]
+
+
+async def vector_hybrid_search_async(
+    sc: AsyncSearchClient, query: str, query_vector: list[float], top_k=5, filters: dict | None = None
+):
+    """Same query as vector_hybrid_search on a shared async client (see get_async_search_client)."""
+    results = await sc.search(
+        search_text=query,
+        vector_queries=[_vector_query(query_vector, top_k)],
+        top=top_k,
+        select=_SELECT,
+        filter=_odata_filter(filters),
+    )
+    return [_to_result(r) async for r in results]
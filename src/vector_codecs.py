@@ -0,0 +1,123 @@
+# src/vector_codecs.py
+from __future__ import annotations
+from typing import Dict
+
+import numpy as np
+
+from .kmeans import nearest_centroid, train_kmeans
+
+# Vector encodings for archive snapshots, by bytes per 1536-dim vector:
+#   float32  6144   exact
+#   float16  3072   ~1e-3 relative error
+#   int8     1540   one float32 scale per vector (max |x| → 127)
+#   pq        192   product quantization: one uint8 code per sub-vector + a shared codebook
+CODECS = ("float32", "float16", "int8", "pq")
+
+
+def check_codec(codec: str) -> str:
+    if codec not in CODECS:
+        raise ValueError(f"Unknown vector codec {codec!r}; expected one of {', '.join(CODECS)}")
+    return codec
+
+
+# ── int8 ─────────────────────────────────────────────────────────────────────────
+def int8_encode(vectors: np.ndarray):
+    """Per-vector symmetric scaling; returns (codes int8 (n, d), scales float32 (n,))."""
+    v = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(v).max(axis=1) / 127.0 if len(v) else np.zeros(0, dtype=np.float32)
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(v / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def int8_decode(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+
+
+def int8_scores(q: np.ndarray, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Approximate dot products of q with every encoded row, without decoding them."""
+    return (codes @ q.astype(np.float32)) * scales
+
+
+# ── product quantization ─────────────────────────────────────────────────────────
+def default_pq_subvectors(dim: int) -> int:
+    """Largest divisor of `dim` that is at most dim / 8 (192 for 1536 dims → 32x smaller)."""
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def pq_train(vectors: np.ndarray, subvectors: int | None = None, ks: int = 256,
+             iters: int = 15, seed: int = 0) -> np.ndarray:
+    """Trains one k-means codebook per sub-space; returns (m, ks, dim / m) float32."""
+    v = np.asarray(vectors, dtype=np.float32)
+    dim = v.shape[1]
+    m = subvectors or default_pq_subvectors(dim)
+    if dim % m:
+        raise ValueError(f"PQ sub-vectors ({m}) must divide the dimension ({dim})")
+    ks = min(ks, len(v))
+    sub = v.reshape(len(v), m, dim // m)
+    return np.stack([train_kmeans(sub[:, j], ks, iters=iters, seed=seed + j, spherical=False)
+                     for j in range(m)])
+
+
+def pq_encode(vectors: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+    """uint8 codes (n, m): index of the closest codeword in each sub-space."""
+    m, _, dsub = codebook.shape
+    sub = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), m, dsub)
+    return np.stack([nearest_centroid(sub[:, j], codebook[j], spherical=False) for j in range(m)],
+                    axis=1).astype(np.uint8)
+
+
+def pq_decode(codes: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+    m = codebook.shape[0]
+    return codebook[np.arange(m), codes.astype(np.int64)].reshape(len(codes), -1)
+
+
+def pq_scores(q: np.ndarray, codes: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+    """Asymmetric distance computation: q · decoded row via an (m, ks) lookup table."""
+    m, _, dsub = codebook.shape
+    table = np.einsum("jkd,jd->jk", codebook, q.astype(np.float32).reshape(m, dsub))
+    return table[np.arange(m), codes.astype(np.int64)].sum(axis=1)
+
+
+# ── whole snapshots ──────────────────────────────────────────────────────────────
+def encode(vectors: np.ndarray, codec: str, codebook: np.ndarray | None = None,
+           pq_subvectors: int | None = None) -> Dict[str, np.ndarray]:
+    """(n, d) float32 → the arrays a snapshot stores for `codec` (see decode)."""
+    v = np.asarray(vectors, dtype=np.float32)
+    codec = check_codec(codec)
+    if codec == "float32":
+        return {"vectors": v}
+    if codec == "float16":
+        return {"vectors": v.astype(np.float16)}
+    if codec == "int8":
+        codes, scales = int8_encode(v)
+        return {"codes": codes, "scales": scales}
+    codebook = codebook if codebook is not None else pq_train(v, pq_subvectors)
+    return {"codes": pq_encode(v, codebook), "codebook": codebook}
+
+
+def decode(arrays: Dict[str, np.ndarray], codec: str) -> np.ndarray:
+    """Snapshot arrays written by encode → (n, d) float32."""
+    codec = check_codec(codec)
+    if codec in ("float32", "float16"):
+        return np.asarray(arrays["vectors"], dtype=np.float32)
+    if codec == "int8":
+        return int8_decode(arrays["codes"], arrays["scales"])
+    return pq_decode(arrays["codes"], arrays["codebook"])
+
+
+def approx_scores(q: np.ndarray, arrays: Dict[str, np.ndarray], codec: str) -> np.ndarray:
+    """q · row for every encoded row, computed on the codes (no full decode for int8 / pq)."""
+    if codec == "int8":
+        return int8_scores(q, arrays["codes"], arrays["scales"])
+    if codec == "pq":
+        return pq_scores(q, arrays["codes"], arrays["codebook"])
+    return np.asarray(arrays["vectors"], dtype=np.float32) @ q
+
+
+def take_rows(arrays: Dict[str, np.ndarray], rows) -> Dict[str, np.ndarray]:
+    """Row subset of encoded arrays; the PQ codebook is shared, not sliced."""
+    return {k: (v if k == "codebook" else v[rows]) for k, v in arrays.items()}
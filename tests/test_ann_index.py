@@ -0,0 +1,121 @@
+import shutil
+import types
+
+import numpy as np
+from azure.core.exceptions import ResourceNotFoundError
+
+from src import ann_index
+from src.ann_index import IVFIndex
+from src.config import settings
+from src.kmeans import train_kmeans
+from src.local_index import LocalVectorIndex, normalize_rows
+
+# --- Helpers -----------------------------------------------------------------
+
+def clustered_index(n: int = 2000, dim: int = 32, clusters: int = 20, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vecs = centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim))
+    meta = [{"docType": "pdf" if i % 3 else "txt"} for i in range(n)]
+    return LocalVectorIndex([f"id{i}" for i in range(n)], vecs, meta)
+
+def ids(hits):
+    return [h["id"] for h in hits]
+
+class FakeContainer:
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob_client(self, name):
+        blobs = self.blobs
+
+        def download_blob(max_concurrency=None):
+            if name not in blobs:
+                raise ResourceNotFoundError(name)
+            return types.SimpleNamespace(readall=lambda: blobs[name], readinto=lambda f: f.write(blobs[name]))
+
+        def upload_blob(data, overwrite=False, max_concurrency=None):
+            blobs[name] = data.read()
+
+        return types.SimpleNamespace(download_blob=download_blob, upload_blob=upload_blob)
+
+# --- Tests -------------------------------------------------------------------
+
+def test_kmeans_returns_unit_centroids():
+    x = normalize_rows(np.random.default_rng(0).normal(size=(500, 8)).astype(np.float32))
+    c = train_kmeans(x, 10, iters=5)
+    assert c.shape == (10, 8)
+    assert np.allclose(np.linalg.norm(c, axis=1), 1.0, atol=1e-5)
+
+def test_euclidean_kmeans_finds_separated_blobs():
+    rng = np.random.default_rng(0)
+    x = np.concatenate([rng.normal(loc=m, scale=0.1, size=(100, 2)) for m in (-5.0, 5.0)])
+    c = np.sort(train_kmeans(x, 2, spherical=False)[:, 0])
+    assert np.allclose(c, [-5.0, 5.0], atol=0.1)
+
+def test_recall_grows_with_nprobe_and_full_probe_is_exact():
+    base = clustered_index()
+    ivf = IVFIndex.build(base, nlist=40)
+    queries = np.random.default_rng(1).normal(size=(30, 32))
+
+    def recall(nprobe):
+        return np.mean([len(set(ids(ivf.search(q, 10, nprobe=nprobe))) & set(ids(base.search(q, 10)))) / 10
+                        for q in queries])
+
+    assert recall(1) <= recall(8) <= recall(40) == 1.0
+    assert recall(8) >= 0.8
+    q = queries[0]
+    assert ids(ivf.search(q, 5, filters={"docType": "txt"}, nprobe=40)) == \
+        ids(base.search(q, 5, filters={"docType": "txt"}))
+
+def test_save_and_memory_mapped_load(tmp_path):
+    base = clustered_index(n=300)
+    ivf = IVFIndex.build(base, nlist=8, nprobe=3)
+    ivf.save(tmp_path)
+
+    loaded = IVFIndex.load(tmp_path)
+    assert isinstance(loaded.base.vectors, np.memmap)
+    assert loaded.nprobe == 3 and loaded.nlist == 8
+    q = base.vectors[7]
+    assert ids(loaded.search(q, 5)) == ids(ivf.search(q, 5))
+    assert loaded.search(q, 1)[0]["id"] == "id7"
+
+def test_upserts_and_newer_rows_leave_the_persisted_lists_alone(tmp_path):
+    base = clustered_index(n=300)
+    base.contents[:] = [None if i % 2 else f"text {i}" for i in range(300)]
+    IVFIndex.build(base, nlist=8, nprobe=1).save(tmp_path)
+    ivf = IVFIndex.load(tmp_path)
+    vec = ivf.centroids[3] * 2
+    newer = LocalVectorIndex(["new", "id5"], [vec, -base.vectors[5]], [{"docType": "txt"}] * 2)
+
+    assert ivf.merge(newer) == 2
+    assert isinstance(ivf.base.vectors, np.memmap) and len(ivf.base) == 300
+    assert len(ivf) == 301
+    assert ivf.search(vec, 1)[0]["id"] == "new"
+    assert ivf.search(base.vectors[5], 1, nprobe=8)[0]["id"] != "id5"     # the replaced row is masked
+    assert ivf.delete(["new", "id7"]) == 2 and len(ivf) == 299
+    assert "id7" not in ids(ivf.search(base.vectors[7], 5, nprobe=8))
+    assert ivf.search(base.vectors[8], 1, nprobe=8)[0]["snippet"] == "text 8"
+    assert ivf.search(base.vectors[9], 1, nprobe=8)[0]["snippet"] is None
+
+def test_persisted_index_is_rebuilt_when_the_partition_gains_files(tmp_path, monkeypatch):
+    container, files, builds = FakeContainer(), ["p/vectors-1.npz"], []
+
+    def load_from_archive(partition, fmt=None):
+        builds.append(list(files))
+        return clustered_index(n=100 * len(files))
+
+    monkeypatch.setattr(settings, "ANN_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "ANN_NLIST", 4)
+    monkeypatch.setattr(ann_index, "get_container_client", lambda: container)
+    monkeypatch.setattr(ann_index, "list_archive_blobs", lambda fmt, partition: list(files))
+    monkeypatch.setattr(ann_index.LocalVectorIndex, "load_from_archive", load_from_archive)
+
+    assert len(IVFIndex.for_partition("p")) == 100
+    assert len(IVFIndex.for_partition("p")) == 100 and len(builds) == 1     # local copy reused
+
+    files.append("p/vectors-2.npz")                                         # a later run in the same hour
+    assert len(IVFIndex.for_partition("p")) == 200 and len(builds) == 2
+
+    shutil.rmtree(tmp_path / "p")                                           # another host: downloads, no build
+    assert len(IVFIndex.for_partition("p")) == 200 and len(builds) == 2
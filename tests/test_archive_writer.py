@@ -0,0 +1,359 @@
+import io
+import types
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+from src import archive_compaction, archive_store, archive_writer, reindex
+from src.archive_catalog import ArchiveCatalog, current_partitions
+from src.archive_store import latest_partition, list_archive_blobs, read_npz, read_vector_table, to_vector_table
+from src.archive_writer import ArchiveSnapshot
+from src.chunk_batch import ChunkBatch
+from src.config import settings
+from src.search_index import UploadSummary
+
+# --- Helpers -----------------------------------------------------------------
+
+class FakeBlob:
+    def __init__(self, container, name):
+        self.container, self.name = container, name
+
+    def stage_block(self, block_id, data):
+        self.container.staged.setdefault(self.name, {})[block_id] = bytes(data)
+
+    def commit_block_list(self, blocks):
+        staged = self.container.staged.get(self.name, {})
+        self.container.put(self.name, b"".join(staged[b.id] for b in blocks))
+
+    def upload_blob(self, data, overwrite=False, content_type=None, etag=None, match_condition=None):
+        if not overwrite and self.name in self.container.blobs:
+            raise ResourceExistsError(self.name)
+        if etag is not None and self.container.etags.get(self.name) != etag:
+            raise ResourceModifiedError(f"{self.name}: condition not met")      # 412
+        self.container.put(self.name, data.read() if hasattr(data, "read") else bytes(data))
+
+    def download_blob(self, offset=0, length=None):
+        if self.name not in self.container.blobs:
+            raise ResourceNotFoundError(self.name)
+        data = self.container.blobs[self.name]
+        return types.SimpleNamespace(readall=lambda: data[offset:None if length is None else offset + length],
+                                     properties=types.SimpleNamespace(etag=self.container.etags[self.name]))
+
+    def get_blob_properties(self):
+        return types.SimpleNamespace(size=len(self.container.blobs[self.name]))
+
+    def delete_blob(self):
+        del self.container.blobs[self.name], self.container.etags[self.name]
+
+
+class FakeContainer:
+    """Committed blobs are listed; staged blocks are not, like the real service."""
+
+    def __init__(self):
+        self.blobs, self.staged, self.etags = {}, {}, {}
+        self.writes = 0
+
+    def put(self, name, data):
+        self.writes += 1
+        self.blobs[name], self.etags[name] = data, f'"{self.writes}"'
+
+    def get_blob_client(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, name_starts_with=""):
+        return [types.SimpleNamespace(name=n) for n in sorted(self.blobs) if n.startswith(name_starts_with)]
+
+
+@pytest.fixture
+def container(monkeypatch):
+    fake = FakeContainer()
+    monkeypatch.setattr(archive_store, "get_container_client", lambda *a: fake)
+    monkeypatch.setattr(settings, "ARCHIVE_BLOCK_BYTES", 4096)
+    monkeypatch.setattr(settings, "ARCHIVE_ROW_GROUP_ROWS", 100)
+    return fake
+
+def make_chunks(n, dim=16, start=0):
+    rng = np.random.default_rng(start)
+    return [{"id": f"id{i}", "chunkId": f"s::chunk::{i}", "content": f"text {i}",
+             "vector": rng.normal(size=dim).astype(np.float32).tolist(),
+             "metadata": {"source": "s.txt", "type": "txt"}} for i in range(start, start + n)]
+
+# --- Tests -------------------------------------------------------------------
+
+@pytest.mark.parametrize("codec", ["float32", "int8", "pq"])
+def test_snapshot_streams_blocks_and_round_trips(container, codec, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_PQ_TRAIN_ROWS", 256)   # pq: trained before the last batch
+    chunks = make_chunks(700)
+    with ArchiveSnapshot(partition="y=2024/m=01/d=01/h=00", codec=codec) as snap:
+        for i in range(0, 700, 128):
+            snap.write(chunks[i:i + 128])
+        assert not container.blobs                       # nothing visible before the commit
+        assert sum(len(b) for b in container.staged.values()) > 1   # blocks staged while writing
+
+    expected = np.array([c["vector"] for c in chunks], dtype=np.float32)
+    tol = {"float32": 0, "int8": 0.05, "pq": 4.0}[codec]
+
+    (parquet_path,) = list_archive_blobs("parquet", "y=2024/m=01/d=01/h=00")
+    table, vecs = read_vector_table(container.blobs[parquet_path])
+    assert table.column("id").to_pylist() == [c["id"] for c in chunks]
+    assert np.abs(vecs - expected).max() <= tol + 1e-6
+
+    (npz_path,) = list_archive_blobs("npz")
+    arrays = read_npz(container.blobs[npz_path])
+    assert arrays["ids"].tolist() == [c["id"] for c in chunks] and str(arrays["codec"]) == codec
+    assert np.abs(arrays["vectors"] - expected).max() <= tol + 1e-6
+
+def test_pq_codebook_is_trained_once_on_a_full_sample(container, monkeypatch):
+    trained = []
+    pq_train = archive_writer.vector_codecs.pq_train
+    monkeypatch.setattr(archive_writer.vector_codecs, "pq_train", lambda v, m=None: trained.append(len(v)) or pq_train(v, m))
+    monkeypatch.setattr(settings, "ARCHIVE_PQ_TRAIN_ROWS", 500)
+    chunks = make_chunks(700)
+    with ArchiveSnapshot(partition="y=2024/m=01/d=01/h=03", codec="pq") as snap:
+        snap.write(chunks[:1])                      # a tiny first batch is only held back
+        for i in range(1, 700, 100):
+            snap.write(chunks[i:i + 100])
+        assert snap._pq_sample is None and not snap._pq_held
+
+    assert trained == [500]                         # the sample is cut inside the batch that fills it
+    (npz_path,) = list_archive_blobs("npz")
+    arrays = read_npz(container.blobs[npz_path])
+    assert arrays["ids"].tolist() == [c["id"] for c in chunks]
+    (parquet_path,) = list_archive_blobs("parquet")
+    _, vecs = read_vector_table(container.blobs[parquet_path])
+    assert np.array_equal(vecs, arrays["vectors"])  # both files decode with the same codebook
+
+def test_snapshot_takes_chunk_batches(container):
+    chunks = make_chunks(250)
+    with ArchiveSnapshot(partition="y=2024/m=01/d=01/h=02", formats=("parquet",)) as snap:
+        snap.write(ChunkBatch.from_chunks(chunks[:130]))
+        snap.write(chunks[130:])
+
+    (path,) = list_archive_blobs("parquet", "y=2024/m=01/d=01/h=02")
+    table, vecs = read_vector_table(container.blobs[path])
+    assert table.column("id").to_pylist() == [c["id"] for c in chunks]
+    assert np.array_equal(vecs, np.array([c["vector"] for c in chunks], dtype=np.float32))
+
+def test_failed_or_unfinished_snapshot_is_never_visible(container):
+    with pytest.raises(RuntimeError):
+        with ArchiveSnapshot(partition="y=2024/m=01/d=01/h=01") as snap:
+            snap.write(make_chunks(50))
+            raise RuntimeError("ingest crashed")
+    assert latest_partition("npz") is None
+
+    # a legacy partition (no markers) stays readable
+    container.put("embeddings-archive/npz/y=2023/m=12/d=31/h=23/vectors.npz", b"")
+    assert latest_partition("npz") == "y=2023/m=12/d=31/h=23"
+
+def test_interrupted_commit_is_hidden_then_resumed(container, monkeypatch):
+    snap = ArchiveSnapshot(partition="y=2024/m=01/d=01/h=02", formats=("npz",))
+    snap.write(make_chunks(300))
+
+    def crash(*a, **k):
+        raise ConnectionError("lost connection")
+    monkeypatch.setattr(archive_writer, "_finish_commit", crash)
+    with pytest.raises(ConnectionError):
+        snap.commit()
+    monkeypatch.undo()
+    monkeypatch.setattr(archive_store, "get_container_client", lambda *a: container)
+
+    assert latest_partition("npz") is None and list_archive_blobs("npz", "y=2024/m=01/d=01/h=02") == []
+    assert archive_writer.resume_pending_commits() == 1
+    assert archive_writer.resume_pending_commits() == 0
+    (path,) = list_archive_blobs("npz")
+    assert len(read_npz(container.blobs[path])["ids"]) == 300
+
+def test_concurrent_commits_to_one_partition_keep_both_runs(container, monkeypatch):
+    hour = "y=2024/m=01/d=01/h=04"
+    first = ArchiveSnapshot(partition=hour, formats=("parquet",))
+    first.write(make_chunks(20))
+    second = ArchiveSnapshot(partition=hour, formats=("parquet",))
+    second.write(make_chunks(10, start=20))
+    merge, raced = archive_writer._merge_marker, []
+
+    def racing(earlier, record):
+        if not raced:
+            raced.append(True)
+            second.commit()         # lands between the first run's read and its write of the marker
+        return merge(earlier, record)
+
+    monkeypatch.setattr(archive_writer, "_merge_marker", racing)
+    first.commit()
+
+    files = sorted([first.paths["parquet"], second.paths["parquet"]])
+    assert list_archive_blobs("parquet", hour) == files
+    assert ArchiveCatalog.load().entries[f"parquet/{hour}"]["files"] == files
+    assert not [n for n in container.blobs if "_pending" in n]
+
+# --- Tests for compaction and the catalog --------------------------------------
+
+def test_catalog_updates_retry_instead_of_overwriting(container):
+    def record_p1(catalog):
+        if not catalog.entries:
+            ArchiveCatalog.update(lambda other: other.record("parquet", "p2", ["p2/a.parquet"]))
+        catalog.record("parquet", "p1", ["p1/a.parquet"])
+
+    ArchiveCatalog.update(record_p1)
+
+    assert sorted(ArchiveCatalog.load().entries) == ["parquet/p1", "parquet/p2"]
+
+def versioned(ids, version, hour):
+    chunks = make_chunks(len(ids))
+    for c, i in zip(chunks, ids):
+        c.update(id=f"id{i:03d}", content=f"v{version}", created_at=f"2024-01-01T{hour:02d}:30:00Z")
+    return chunks
+
+def write_partition(partition, chunks):
+    with ArchiveSnapshot(partition=partition) as snap:
+        snap.write(chunks)
+
+def test_compaction_keeps_latest_version_per_chunk(container, monkeypatch):
+    monkeypatch.setattr(archive_compaction, "live_chunk_ids", lambda: {f"id{i:03d}" for i in range(149)})
+    write_partition("y=2024/m=01/d=01/h=00", versioned(range(100), 1, 0))
+    write_partition("y=2024/m=01/d=01/h=01", versioned(range(50, 150), 2, 1))
+    write_partition("y=2024/m=01/d=01/h=02", versioned(range(10), 3, 2))
+
+    gen = archive_compaction.compact_archive()
+    catalog = ArchiveCatalog.load()
+    assert catalog.current("parquet") == [gen] and catalog.current("npz") == [gen]
+
+    (path,) = list_archive_blobs("parquet", gen)
+    table, _ = read_vector_table(container.blobs[path], columns=["id", "content", "created_at"])
+    rows = {r["id"]: r for r in table.to_pylist()}
+    assert len(table) == len(rows)
+    assert sorted(rows) == sorted(f"id{i:03d}" for i in range(149))                # id149 was deleted
+    assert rows["id005"]["content"] == "v3" and rows["id060"]["content"] == "v2" and rows["id020"]["content"] == "v1"
+    assert rows["id000"]["created_at"] == "2024-01-01T02:30:00Z"                    # original timestamp kept
+
+def test_compaction_streams_row_groups_and_keeps_vectors(container, monkeypatch):
+    monkeypatch.setattr(archive_compaction, "live_chunk_ids", lambda: None)
+    monkeypatch.setattr(settings, "ARCHIVE_ROW_GROUP_ROWS", 16)
+    old, new = versioned(range(100), 1, 0), versioned(range(30, 60), 2, 1)
+    write_partition("y=2024/m=01/d=01/h=00", old)
+    write_partition("y=2024/m=01/d=01/h=01", new)
+    reads = []
+    iter_tables = archive_compaction.iter_vector_tables
+
+    def counting(path, batch_rows, columns):
+        for table, vectors in iter_tables(path, batch_rows, columns):
+            reads.append(table.num_rows)
+            yield table, vectors
+    monkeypatch.setattr(archive_compaction, "iter_vector_tables", counting)
+
+    gen = archive_compaction.compact_archive()
+
+    assert max(reads) <= 16 and sum(reads) == 130
+    (path,) = list_archive_blobs("parquet", gen)
+    table, vectors = read_vector_table(container.blobs[path], columns=["id", "content", "vector"])
+    expected = {c["id"]: c["vector"] for c in old + new}       # later partition wins
+    assert sorted(table.column("id").to_pylist()) == sorted(expected)
+    for i, vec in zip(table.column("id").to_pylist(), vectors):
+        np.testing.assert_allclose(vec, expected[i], rtol=1e-6)
+
+def test_runs_in_the_same_hour_add_files_to_the_partition(container, monkeypatch):
+    monkeypatch.setattr(archive_compaction, "live_chunk_ids", lambda: None)
+    hour = "y=2024/m=01/d=01/h=03"
+    write_partition(hour, versioned(range(20), 1, 3))
+    write_partition(hour, versioned(range(20, 25), 1, 3))
+
+    assert len(list_archive_blobs("parquet", hour)) == 2
+    assert ArchiveCatalog.load().entries[f"npz/{hour}"]["rows"] == 25
+    gen = archive_compaction.compact_archive()
+    (path,) = list_archive_blobs("parquet", gen)
+    assert read_vector_table(container.blobs[path], columns=["id"])[0].num_rows == 25
+
+    write_partition(hour, versioned(range(25, 30), 1, 3))        # a third run after the compaction
+    assert ArchiveCatalog.load().current("parquet") == [gen, hour]
+    gen2 = archive_compaction.compact_archive()
+    (path,) = list_archive_blobs("parquet", gen2)
+    assert read_vector_table(container.blobs[path], columns=["id"])[0].num_rows == 30
+
+def test_catalog_tracks_new_partitions_and_deletes_merged_ones(container, monkeypatch):
+    monkeypatch.setattr(archive_compaction, "live_chunk_ids", lambda: None)
+    write_partition("y=2024/m=01/d=01/h=00", versioned(range(20), 1, 0))
+    gen1 = archive_compaction.compact_archive()
+    assert archive_compaction.compact_archive() is None                              # nothing new
+
+    write_partition("y=2024/m=01/d=01/h=05", versioned(range(5), 2, 5))
+    assert ArchiveCatalog.load().current("parquet") == [gen1, "y=2024/m=01/d=01/h=05"]
+    catalog = ArchiveCatalog.load()
+    assert catalog.partitions("parquet", since="2024-01-01T03:00:00Z") == ["y=2024/m=01/d=01/h=05"]
+
+    gen2 = archive_compaction.compact_archive(delete_inputs=True)
+    assert ArchiveCatalog.load().current("parquet") == [gen2]
+    assert not [n for n in container.blobs if "/h=00/" in n or gen1 in n]
+    assert current_partitions("npz") == [gen2]
+
+def test_refresh_catalogs_legacy_partitions_from_parquet_footers(container):
+    buf = io.BytesIO()
+    pq.write_table(to_vector_table(versioned(range(30), 1, 7)), buf)
+    container.put("embeddings-archive/parquet/y=2023/m=06/d=01/h=07/vectors.parquet", buf.getvalue())
+
+    catalog = ArchiveCatalog()
+    assert catalog.refresh() == 1
+    entry = catalog.entries["parquet/y=2023/m=06/d=01/h=07"]
+    assert entry["rows"] == 30 and entry["min_created_at"] == "2024-01-01T07:30:00Z"
+    assert current_partitions("parquet") == ["y=2023/m=06/d=01/h=07"]
+
+# --- Tests for reindexing from the archive -----------------------------------
+
+def test_reindex_uploads_latest_rows_without_embedding(container, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_ROW_GROUP_ROWS", 16)
+    write_partition("y=2024/m=01/d=01/h=00", versioned(range(40), 1, 0))
+    write_partition("y=2024/m=01/d=01/h=01", versioned(range(30, 50), 2, 1))
+    uploaded, targets = {}, []
+
+    def fake_upload(items, max_workers=None, index_name=None):
+        targets.append(index_name)
+        for batch in items:
+            assert isinstance(batch, ChunkBatch) and len(batch) <= 16                # row-group slices
+            for doc in batch.search_docs():
+                assert doc["id"] not in uploaded                                     # one version per chunk
+                uploaded[doc["id"]] = doc
+        return UploadSummary(succeeded=len(uploaded))
+
+    monkeypatch.setattr(reindex, "ensure_index", lambda name=None: targets.append(name))
+    monkeypatch.setattr(reindex, "upload_docs", fake_upload)
+    summary = reindex.reindex_from_archive("docs-index-v2", prune_deleted=False,
+                                           partitions=["y=2024/m=01/d=01/h=00", "y=2024/m=01/d=01/h=01"])
+
+    assert summary.succeeded == 50 and targets == ["docs-index-v2", "docs-index-v2"]
+    assert uploaded["id035"]["content"] == "v2" and uploaded["id010"]["content"] == "v1"
+    assert len(uploaded["id010"]["contentVector"]) == 16
+
+def test_reindex_reads_every_partition_and_checks_the_manifest(container, monkeypatch):
+    write_partition("y=2024/m=01/d=01/h=00", versioned(range(40), 1, 0))
+    write_partition("y=2024/m=01/d=01/h=01", versioned(range(30, 50), 2, 1))
+    uploaded = []
+    monkeypatch.setattr(reindex, "ensure_index", lambda name=None: None)
+    monkeypatch.setattr(reindex, "upload_docs", lambda items, max_workers=None, index_name=None:
+                        UploadSummary(succeeded=len(uploaded.extend(i for b in items for i in b.ids) or uploaded)))
+
+    monkeypatch.setattr(reindex, "live_chunk_ids", lambda: {f"id{i:03d}" for i in range(45)})
+    assert reindex.reindex_from_archive().succeeded == 45                            # both hours, not the latest only
+
+    monkeypatch.setattr(reindex, "live_chunk_ids", lambda: {f"id{i:03d}" for i in range(60)})
+    with pytest.raises(reindex.IncompleteArchiveError):
+        reindex.reindex_from_archive()
+    assert len(uploaded) == 45
+
+def test_blue_green_reindex_deletes_the_version_it_could_not_promote(container, monkeypatch):
+    from src import index_versions
+    write_partition("y=2024/m=01/d=01/h=00", versioned(range(20), 1, 0))
+    discarded = []
+
+    def refuse(name, expected=None):
+        raise index_versions.PromotionError(f"{name} looks incomplete")
+
+    monkeypatch.setattr(reindex, "upload_docs", lambda items, max_workers=None, index_name=None:
+                        UploadSummary(succeeded=sum(len(b) for b in items)))
+    monkeypatch.setattr(index_versions, "create_next_version", lambda: "docs-index-v2")
+    monkeypatch.setattr(index_versions, "promote", refuse)
+    monkeypatch.setattr(index_versions, "discard_version", discarded.append)
+    monkeypatch.setattr(index_versions, "gc_versions", lambda: pytest.fail("gc after a failed promotion"))
+
+    with pytest.raises(index_versions.PromotionError):
+        reindex.reindex_from_archive(prune_deleted=False, blue_green=True)
+    assert discarded == ["docs-index-v2"]
@@ -0,0 +1,50 @@
+from src.batching import BatchStats, TokenBudgetBatcher, estimate_tokens, pack_batches
+
+# --- Tests for estimate_tokens -----------------------------------------------
+
+def test_estimate_tokens_is_positive_and_grows_with_length():
+    assert estimate_tokens("") == 1
+    short = estimate_tokens("hello world")
+    long = estimate_tokens("hello world " * 100)
+    assert 1 <= short < long
+
+# --- Tests for pack_batches --------------------------------------------------
+
+def test_pack_batches_respects_token_and_input_limits():
+    texts = ["word " * n for n in (5, 400, 30, 250, 10, 120, 3, 60)] * 5
+    stats = BatchStats(max_inputs=6, max_tokens=600)
+    batches = pack_batches(texts, max_inputs=6, max_tokens=600, stats=stats)
+
+    # every text lands in exactly one batch
+    assert sorted(p for b in batches for p in b) == list(range(len(texts)))
+    for b in batches:
+        assert len(b) <= 6
+        assert sum(estimate_tokens(texts[p]) for p in b) <= 600
+    assert stats.batches == len(batches)
+    assert stats.inputs == len(texts)
+
+def test_pack_batches_uses_fewer_calls_for_short_texts():
+    short = ["ok"] * 500
+    batches = pack_batches(short, max_inputs=2048, max_tokens=8000)
+    assert len(batches) == 1
+
+def test_pack_batches_oversized_text_gets_its_own_batch():
+    texts = ["x " * 5000, "small"]
+    batches = pack_batches(texts, max_inputs=10, max_tokens=100)
+    assert [0] in batches and [1] in batches
+
+# --- Tests for TokenBudgetBatcher / BatchStats -------------------------------
+
+def test_batcher_streams_items_and_reports_fill_ratio():
+    batcher = TokenBudgetBatcher(max_inputs=100, max_tokens=10)
+    out = []
+    for i in range(7):
+        full = batcher.add(f"c{i}", 4)
+        if full:
+            out.append(full)
+    out.append(batcher.flush())
+
+    assert out == [["c0", "c1"], ["c2", "c3"], ["c4", "c5"], ["c6"]]
+    stats = batcher.stats.as_dict()
+    assert stats["batches"] == 4
+    assert stats["token_fill_ratio"] == round(28 / 40, 4)
@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pytest
+
+import src.ingest as ingest
+import src.search_index as search_index
+from src.chunk_batch import ChunkBatch
+from src.embedding_cache import EmbeddingCache
+
+# --- Helpers -----------------------------------------------------------------
+
+def make_chunks(n, start=0):
+    return [{"id": f"k{i}", "chunkId": f"s{i % 2}::chunk::{i}", "content": f"text {i}",
+             "metadata": {"source": f"s{i % 2}", "type": "txt"}} for i in range(start, start + n)]
+
+class FakeScheduler:
+    def __init__(self):
+        self.calls = []
+
+    def embed_batches(self, batches):
+        self.calls.append(batches)
+        return [[[float(t.split()[-1]), 1.0, 0.0] for t in b] for b in batches]
+
+# --- Tests -------------------------------------------------------------------
+
+def test_batch_is_columnar_and_slices():
+    chunks = make_chunks(4)
+    for i, c in enumerate(chunks):
+        c["vector"] = [float(i)] * 3
+    batch = ChunkBatch.from_chunks(chunks)
+
+    assert batch.vectors.dtype == np.float32 and batch.vectors.shape == (4, 3)
+    assert batch.sources == ["s0", "s1", "s0", "s1"]
+    part = batch.take([3, 1])
+    assert part.ids == ["k3", "k1"] and part.vectors[:, 0].tolist() == [3.0, 1.0]
+
+    merged = ChunkBatch.concat([part, ChunkBatch.from_chunks(make_chunks(1, start=9))])
+    assert len(merged) == 3 and merged.vectors is None       # one side not embedded yet
+
+def test_search_docs_serialise_vectors_as_lists():
+    batch = ChunkBatch.from_chunks(make_chunks(2))
+    batch.set_vectors([1, 0], [[1.0, 2.0], [3.0, 4.0]])
+
+    docs = list(batch.search_docs())
+    assert docs[0] == {"id": "k0", "content": "text 0", "contentVector": [3.0, 4.0],
+                       "fileName": "s0", "chunkId": "s0::chunk::0", "docType": "txt"}
+    json.dumps(docs)
+    assert docs == [search_index._to_search_doc(dict(c, vector=d["contentVector"]))
+                    for c, d in zip(make_chunks(2), docs)]
+
+def test_embed_in_place_fills_matrix_from_cache_and_scheduler(tmp_path, monkeypatch):
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(ingest, "get_scheduler", lambda: scheduler)
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"), deployment="d", dimensions=3)
+    cache.put_many(["text 1"], [[-1.0, -1.0, -1.0]])
+
+    batch = ChunkBatch.from_chunks(make_chunks(3))
+    ingest._embed_in_place(batch, cache=cache)
+
+    assert batch.vectors.tolist() == [[0.0, 1.0, 0.0], [-1.0, -1.0, -1.0], [2.0, 1.0, 0.0]]
+    assert [t for b in scheduler.calls[0] for t in b] == ["text 0", "text 2"]
+    assert cache.get("text 2", as_array=True) == pytest.approx(np.array([2.0, 1.0, 0.0]))
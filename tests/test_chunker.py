@@ -82,3 +82,42 @@ def test_split_documents_robust_to_bad_inputs(bad):
     docs = [d for d in docs if d and ("page_content" in d or "content" in d)]
     chunks = split_documents(docs, chunk_size=50, chunk_overlap=10)
     assert isinstance(chunks, list)  # Should not explode
+
+# --- Tests for the splitter engine -------------------------------------------
+
+def test_splitter_matches_langchain_recursive_splitter():
+    import random
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from src.chunker import RecursiveSplitter
+
+    rng = random.Random(7)
+    pieces = ["a", "bb", "word ", "  ", "\n", "\n\n", " ", "x" * 60, "e\n \n"]
+    for _ in range(300):
+        text = "".join(rng.choices(pieces, k=rng.randint(0, 200)))
+        size = rng.randint(5, 120)
+        overlap = rng.randint(0, size)
+        expected = RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap).split_text(text)
+        assert RecursiveSplitter(size, overlap).split_text(text) == expected
+
+def test_segments_cut_before_paragraph_breaks():
+    from src.chunker import _segments
+
+    text = "\n\n".join(f"paragraph {i} " * 5 for i in range(200))
+    segments = _segments(text, 1000)
+
+    assert "".join(segments) == text and len(segments) > 1
+    assert all(s.startswith("\n\n") for s in segments[1:])
+
+def test_chunk_ids_count_per_source():
+    from src.ingest import _to_chunks_for_index
+
+    docs = [{"page_content": TEXT, "metadata": {"source": "a"}},
+            {"page_content": TEXT, "metadata": {"source": "b"}},
+            {"page_content": TEXT, "metadata": {"source": "a"}}]
+    per_doc = len(split_documents(docs[:1]))
+    chunks = _to_chunks_for_index(docs)
+
+    assert [c["chunkId"] for c in chunks if c["metadata"]["source"] == "a"] == \
+        [f"a::chunk::{i}" for i in range(2 * per_doc)]
+    assert chunks[per_doc]["chunkId"] == "b::chunk::0"
+    assert len({c["id"] for c in chunks}) == len(chunks)
@@ -0,0 +1,110 @@
+import random
+
+import numpy as np
+
+import src.ingest as ingest
+from src.batching import BatchStats, estimate_tokens
+from src.chunk_batch import ChunkBatch
+from src.dedup import ChunkDeduper
+
+# --- Helpers -----------------------------------------------------------------
+
+WORDS = ["party", "notice", "contract", "terminate", "days", "written", "agreement", "shall", "data",
+         "policy", "retention", "access", "review", "supplier", "customer", "payment", "invoice", "term"]
+
+def prose(seed, n=120):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) + str(rng.randint(0, 50)) for _ in range(n))
+
+def make_chunks(texts):
+    return [{"id": f"k{i}", "chunkId": f"s::chunk::{i}", "content": t, "metadata": {"source": "s", "type": "txt"}}
+            for i, t in enumerate(texts)]
+
+class FakeScheduler:
+    def __init__(self):
+        self.texts = []
+
+    def embed_batches(self, batches):
+        self.texts.extend(t for b in batches for t in b)
+        return [[[float(len(t)), float(sum(map(ord, t)) % 997), 1.0] for t in b] for b in batches]
+
+# --- Tests -------------------------------------------------------------------
+
+def test_exact_and_near_duplicates_map_to_first_chunk():
+    base = prose(1)
+    words = base.split()
+    near = " ".join(words[:60] + ["amended7"] + words[60:])       # one word inserted
+    dedup = ChunkDeduper(policy="link", threshold=0.8)
+
+    assert dedup.check("a", base) is None
+    assert dedup.check("b", prose(2)) is None
+    assert dedup.check("c", "  " + base.replace(" ", "\n", 3)) == "a"    # whitespace only
+    assert dedup.check("d", near) == "a"
+    assert dedup.check("e", prose(3)) is None
+    assert (dedup.stats.exact, dedup.stats.near, dedup.stats.chunks) == (1, 1, 5)
+
+def test_batch_links_duplicates_to_canonical_vectors(monkeypatch):
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(ingest, "get_scheduler", lambda: scheduler)
+    texts = [prose(1), prose(2), prose(1), prose(2) + " footer", "short", "short"]
+    dedup = ChunkDeduper(policy="link", threshold=0.8)
+
+    batch, links = dedup.apply(ChunkBatch.from_chunks(make_chunks(texts)))
+    ingest._embed_in_place(batch, links=links)
+
+    assert links == {2: 0, 3: 1, 5: 4}
+    assert sorted(scheduler.texts) == sorted([texts[0], texts[1], "short"])
+    assert np.array_equal(batch.vectors[[2, 3, 5]], batch.vectors[[0, 1, 4]])
+    assert dedup.stats.linked == 3 and dedup.stats.tokens_saved > 0
+
+def test_drop_policy_removes_duplicates():
+    dedup = ChunkDeduper(policy="drop")
+    batch, links = dedup.apply(ChunkBatch.from_chunks(make_chunks([prose(1), prose(1), prose(2)])))
+
+    assert batch.ids == ["k0", "k2"] and links == {}
+    assert dedup.stats.dropped == 1
+
+def test_streaming_links_duplicates_after_canonical_is_embedded(monkeypatch):
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(ingest, "get_scheduler", lambda: scheduler)
+    texts = [prose(i % 4) for i in range(10)]
+    dedup = ChunkDeduper(policy="link")
+    stats = BatchStats(4, 100_000)
+    monkeypatch.setattr(ingest.settings, "EMBED_MAX_BATCH_INPUTS", 4)
+
+    out = ChunkBatch.concat(ingest._embed_stage(iter(make_chunks(texts)), stats, dedup=dedup))
+
+    assert sorted(out.ids) == sorted(f"k{i}" for i in range(10))
+    assert len(scheduler.texts) == 4 and dedup.stats.linked == 6
+    assert dedup.stats.tokens_saved == sum(estimate_tokens(t) for t in texts[4:])
+    by_id = dict(zip(out.ids, out.vectors))
+    assert all(np.array_equal(by_id[f"k{i}"], by_id[f"k{i % 4}"]) for i in range(10))
+
+def test_duplicates_of_evicted_canonicals_are_embedded_and_not_counted_as_saved(monkeypatch):
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(ingest, "get_scheduler", lambda: scheduler)
+    monkeypatch.setattr(ingest.settings, "EMBED_MAX_BATCH_INPUTS", 2)
+    monkeypatch.setattr(ingest.settings, "EMBED_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(ingest.settings, "DEDUP_MEMO_VECTORS", 1)
+    texts = [prose(0), prose(1), prose(2), prose(3), prose(0), prose(3)]
+    dedup = ChunkDeduper(policy="link")
+
+    out = ChunkBatch.concat(ingest._embed_stage(iter(make_chunks(texts)), BatchStats(2, 100_000), dedup=dedup))
+
+    assert sorted(out.ids) == sorted(f"k{i}" for i in range(6))
+    assert sorted(scheduler.texts) == sorted(texts[:5])       # k0 was evicted from the memo, k3 was not
+    assert dedup.stats.exact == 2 and dedup.stats.linked == 1
+    assert dedup.stats.tokens_saved == estimate_tokens(texts[5])
+
+def test_dropped_duplicates_are_left_out_of_the_manifest(monkeypatch):
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(ingest, "get_scheduler", lambda: scheduler)
+    chunks = make_chunks([prose(1), prose(2), prose(1)])
+    produced = {"s": [c["id"] for c in chunks]}
+    dedup = ChunkDeduper(policy="drop")
+
+    out = ChunkBatch.concat(ingest._embed_stage(iter(chunks), BatchStats(4, 100_000), dedup=dedup))
+    ingest._forget_dropped(dedup, produced)
+
+    assert out.ids == ["k0", "k1"]
+    assert produced == {"s": ["k0", "k1"]}
@@ -0,0 +1,64 @@
+import asyncio
+
+from src.embed_coalescer import EmbeddingCoalescer
+
+# --- Helpers -----------------------------------------------------------------
+
+class FakeAsyncEmbedder:
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("embeddings down")
+        return [[float(len(t))] for t in texts]
+
+# --- Tests -------------------------------------------------------------------
+
+def test_concurrent_queries_share_one_call_and_keep_their_vectors():
+    emb = FakeAsyncEmbedder()
+    co = EmbeddingCoalescer(emb, window_ms=20, max_batch=64)
+
+    async def burst():
+        return await asyncio.gather(*(co.embed(["q" * n]) for n in range(1, 6)))
+
+    out = asyncio.run(burst())
+    assert len(emb.calls) == 1
+    assert out == [[[float(n)]] for n in range(1, 6)]
+    assert co.stats() == {"calls": 1, "inputs": 5, "mean_batch_size": 5.0}
+
+def test_max_batch_closes_a_batch_early():
+    emb = FakeAsyncEmbedder()
+    co = EmbeddingCoalescer(emb, window_ms=200, max_batch=3)
+
+    async def burst():
+        return await asyncio.wait_for(asyncio.gather(*(co.embed([str(i)]) for i in range(7))), 5)
+
+    out = asyncio.run(burst())
+    assert [len(c) for c in emb.calls] == [3, 3, 1]
+    assert [v[0] for v in out] == [[1.0]] * 7
+
+def test_failure_reaches_every_caller_in_the_batch():
+    co = EmbeddingCoalescer(FakeAsyncEmbedder(fail=True), window_ms=5)
+
+    async def burst():
+        return await asyncio.gather(*(co.embed([str(i)]) for i in range(3)), return_exceptions=True)
+
+    out = asyncio.run(burst())
+    assert all(isinstance(e, RuntimeError) for e in out)
+
+def test_short_embedding_response_fails_every_caller():
+    async def short(texts):
+        return [[1.0]] * (len(texts) - 1)
+
+    co = EmbeddingCoalescer(short, window_ms=5)
+
+    async def burst():
+        return await asyncio.wait_for(asyncio.gather(*(co.embed([str(i)]) for i in range(3)),
+                                                     return_exceptions=True), 5)
+
+    out = asyncio.run(burst())
+    assert all(isinstance(e, ValueError) for e in out)
@@ -0,0 +1,58 @@
+import pytest
+
+from src import embedding_cache
+from src.embedding_cache import EmbeddingCache
+
+# --- Helpers -----------------------------------------------------------------
+
+def open_cache(tmp_path, **kw):
+    return EmbeddingCache(
+        str(tmp_path / "cache" / "emb.sqlite"),
+        deployment=kw.pop("deployment", "text-embedding-3-small"),
+        dimensions=kw.pop("dimensions", 3),
+        **kw,
+    )
+
+# --- Tests -------------------------------------------------------------------
+
+def test_cache_roundtrip_and_counters(tmp_path):
+    cache = open_cache(tmp_path)
+    assert cache.get_many(["a", "b"]) == [None, None]
+
+    cache.put_many(["a", "b"], [[0.5, 1.0, -2.0], [0.25, 0.0, 3.0]])
+    out = cache.get_many(["b", "c", "a"])
+    assert out[0] == pytest.approx([0.25, 0.0, 3.0])
+    assert out[1] is None
+    assert out[2] == pytest.approx([0.5, 1.0, -2.0])
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 3, 2)
+
+def test_cache_persists_across_instances(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put_many(["persist me"], [[1.0, 2.0, 3.0]])
+    cache.close()
+
+    reopened = open_cache(tmp_path)
+    assert reopened.get("persist me") == pytest.approx([1.0, 2.0, 3.0])
+    assert len(reopened) == 1
+
+def test_cache_is_keyed_by_deployment_and_dimensions(tmp_path):
+    open_cache(tmp_path).put_many(["t"], [[1.0, 1.0, 1.0]])
+
+    assert open_cache(tmp_path, deployment="text-embedding-3-large").get("t") is None
+    assert open_cache(tmp_path, dimensions=1536).get("t") is None
+
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(clock)))
+    cache = open_cache(tmp_path, max_entries=10)
+    for i in range(10):
+        cache.put_many([f"t{i}"], [[float(i)] * 3])    # t0 oldest … t9 newest
+    cache.get("t0")  # touch so it is the most recently used
+    cache.put_many(["new"], [[9.0, 9.0, 9.0]])
+
+    # 11 entries > 10: trimmed to 90% of the bound, oldest first (t1, t2)
+    assert len(cache) == 9
+    assert cache.get("t1") is None and cache.get("t2") is None
+    assert all(cache.get(k) is not None for k in ["t0", "new", *(f"t{i}" for i in range(3, 10))])
@@ -0,0 +1,105 @@
+import threading
+import time
+import pytest
+
+from src.embeddings import EmbeddingScheduler, _TokenBucket
+
+# --- Helpers -----------------------------------------------------------------
+
+class FakeThrottled(Exception):
+    """Duck-types an openai APIStatusError carrying a 429 + Retry-After header."""
+    status_code = 429
+
+    def __init__(self, retry_after: str):
+        super().__init__("429 Too Many Requests")
+        self.response = type("Resp", (), {"headers": {"retry-after": retry_after}})()
+
+def fake_embed(texts):
+    # slower for short batches so completion order differs from submission order
+    time.sleep(0.01 * (5 - min(len(texts), 5)))
+    return [[float(len(t))] for t in texts]
+
+def make_scheduler(embed_fn, sleeps=None, **kw):
+    return EmbeddingScheduler(
+        embed_fn=embed_fn,
+        max_concurrency=kw.pop("max_concurrency", 4),
+        tokens_per_minute=kw.pop("tokens_per_minute", 10_000_000),
+        requests_per_minute=kw.pop("requests_per_minute", 100_000),
+        max_retries=kw.pop("max_retries", 3),
+        sleep=(sleeps.append if sleeps is not None else time.sleep),
+        **kw,
+    )
+
+# --- Tests for EmbeddingScheduler --------------------------------------------
+
+def test_scheduler_preserves_batch_order():
+    batches = [["a" * n] * n for n in range(1, 9)]
+    out = make_scheduler(fake_embed).embed_batches(batches)
+    assert [len(b) for b in out] == list(range(1, 9))
+    assert [b[0][0] for b in out] == [float(n) for n in range(1, 9)]
+
+def test_scheduler_runs_requests_concurrently():
+    in_flight, peak = 0, 0
+    lock = threading.Lock()
+
+    def slow(texts):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return [[0.0] for _ in texts]
+
+    make_scheduler(slow, max_concurrency=3).embed_batches([["x"]] * 9)
+    assert peak == 3
+
+def test_scheduler_honors_retry_after_on_429():
+    calls = []
+    sleeps = []
+
+    def flaky(texts):
+        calls.append(texts)
+        if len(calls) < 3:
+            raise FakeThrottled(retry_after="7")
+        return [[1.0] for _ in texts]
+
+    out = make_scheduler(flaky, sleeps=sleeps, max_concurrency=1).embed_batches([["q"]])
+    assert out == [[[1.0]]]
+    assert len(calls) == 3
+    assert sum(1 for s in sleeps if s >= 7) == 2
+
+def test_scheduler_does_not_retry_client_errors():
+    calls = []
+
+    def bad(texts):
+        calls.append(texts)
+        raise ValueError("400 bad request")
+
+    with pytest.raises(ValueError):
+        make_scheduler(bad, sleeps=[]).embed_batches([["q"]])
+    assert len(calls) == 1
+
+def test_scheduler_gives_up_after_max_retries():
+    def always_throttled(texts):
+        raise FakeThrottled(retry_after="1")
+
+    with pytest.raises(FakeThrottled):
+        make_scheduler(always_throttled, sleeps=[], max_retries=2).embed_batches([["q"]])
+
+# --- Tests for _TokenBucket --------------------------------------------------
+
+def test_token_bucket_waits_when_empty():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(s):
+        sleeps.append(s)
+        now[0] += s
+
+    bucket = _TokenBucket(per_minute=600, clock=lambda: now[0])  # 10/s, burst 100
+    bucket.acquire(100, sleep)
+    assert sleeps == []
+    bucket.acquire(20, sleep)
+    assert sum(sleeps) == pytest.approx(2.0)
@@ -0,0 +1,129 @@
+import io
+import os
+
+import openpyxl
+import pytest
+
+from src.config import settings
+from src.loaders import load_document, load_document_bytes
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+# --- Helpers -----------------------------------------------------------------
+
+def text_of(docs):
+    return "".join(d["page_content"] if isinstance(d, dict) else d.page_content for d in docs)
+
+# --- Tests for load_document_bytes -------------------------------------------
+
+@pytest.mark.parametrize("name", ["sample.pdf", "sample.txt", "sample.csv", "sample.xlsx"])
+def test_in_memory_loader_matches_file_loader(name):
+    path = os.path.join(DATA, name)
+    with open(path, "rb") as f:
+        in_memory = load_document_bytes(f.read(), f"container/{name}")
+
+    assert in_memory, "Expected at least one document"
+    assert all(d["metadata"]["source"] == f"container/{name}" for d in in_memory)
+    assert text_of(in_memory).split() == text_of(load_document(path)).split()
+
+# --- Tests for tabular loaders -------------------------------------------------
+
+def test_csv_streams_row_range_documents_with_header(monkeypatch):
+    monkeypatch.setattr(settings, "TABLE_READ_ROWS", 7)       # several read steps per document
+    monkeypatch.setattr(settings, "TABLE_DOC_MAX_CHARS", 200)
+    lines = ["id,name,note"] + [f"{i},item {i},line one\nline two" if i == 5 else f"{i},item {i},ok"
+                                for i in range(1, 101)]
+    data = "\n".join(lines).replace("line one\nline two", '"line one\nline two"').encode()
+
+    docs = load_document_bytes(data, "tables/items.csv")
+
+    assert len(docs) > 3
+    assert all(d["page_content"].startswith("id | name | note\n") for d in docs)
+    assert all(len(d["page_content"]) <= 200 for d in docs)
+    ranges = [(d["metadata"]["row_start"], d["metadata"]["row_end"]) for d in docs]
+    assert ranges[0][0] == 1 and ranges[-1][1] == 100
+    assert all(b[0] == a[1] + 1 for a, b in zip(ranges, ranges[1:]))
+    assert "5 | item 5 | line one line two" in docs[0]["page_content"]
+
+def test_excel_reads_every_sheet(tmp_path):
+    wb = openpyxl.Workbook()
+    wb.active.title = "Policies"
+    wb.active.append(["ID", "Name"])
+    wb.active.append([1, "Security"])
+    other = wb.create_sheet("Owners")
+    other.append([None, None])                                 # blank rows above the header
+    other.append(["Team", "Lead"])
+    other.append(["IT", "Ada"])
+    wb.create_sheet("Empty")
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    docs = load_document_bytes(buf.getvalue(), "tables/book.xlsx")
+
+    assert [(d["metadata"]["sheet"], d["page_content"]) for d in docs] == [
+        ("Policies", "ID | Name\n1 | Security"), ("Owners", "Team | Lead\nIT | Ada")]
+    assert all(d["metadata"]["type"] == "excel" for d in docs)
+
+def test_table_blobs_stream_through_parse_and_split_in_parts(monkeypatch):
+    from src import ingest
+    from src.blob_store import BlobPayload
+    monkeypatch.setattr(settings, "PARSE_WORKERS", 0)
+    monkeypatch.setattr(settings, "TABLE_DOC_MAX_CHARS", 100)
+    monkeypatch.setattr(ingest, "_TABLE_DOCS_PER_PART", 4)
+    data = "\n".join(["id,name"] + [f"{i},item {i}" for i in range(1, 201)]).encode()
+    produced = {}
+
+    parts = list(ingest._parse_stage([("t/items.csv", BlobPayload("t/items.csv", data=data))], produced))
+    chunks = list(ingest._split_stage(iter(parts), produced))
+
+    assert len(parts) > 2 and [last for _, _, last in parts] == [False] * (len(parts) - 1) + [True]
+    whole = ingest._to_chunks_for_index(load_document_bytes(data, "t/items.csv"), blob_name="t/items.csv")
+    assert [c["id"] for c in chunks] == [c["id"] for c in whole] == produced["t/items.csv"]
+
+def test_table_blob_with_a_failed_early_part_stays_out_of_the_manifest(monkeypatch):
+    import threading
+    import numpy as np
+    from src import ingest
+    from src.blob_store import BlobPayload
+    from src.chunk_batch import ChunkBatch
+    from src.manifest import BlobInfo
+    from src.search_index import UploadSummary
+    monkeypatch.setattr(settings, "PARSE_WORKERS", 0)
+    monkeypatch.setattr(settings, "TABLE_DOC_MAX_CHARS", 100)
+    monkeypatch.setattr(ingest, "_TABLE_DOCS_PER_PART", 4)
+    data = "\n".join(["id,name"] + [f"{i},item {i}" for i in range(1, 201)]).encode()
+    first_upload = threading.Event()
+
+    def download(blobs):
+        for b in blobs:
+            yield b.name, BlobPayload(b.name, data=data)
+
+    def embed(chunks, stats, cache=None, dedup=None):
+        batch = []
+        for c in chunks:
+            batch.append({**c, "vector": np.zeros(4)})
+            if len(batch) == 8:
+                yield ChunkBatch.from_chunks(batch)
+                batch = []
+                first_upload.wait(5)      # the first part fails before the last one is split
+        if batch:
+            yield ChunkBatch.from_chunks(batch)
+
+    def upload(batch, merge=False, index_name=None):
+        if not first_upload.is_set():
+            first_upload.set()
+            return UploadSummary(failed=len(batch), failed_keys=list(batch.ids))
+        return UploadSummary(succeeded=len(batch))
+
+    monkeypatch.setattr(ingest, "_download_stage", download)
+    monkeypatch.setattr(ingest, "_embed_stage", embed)
+    monkeypatch.setattr(ingest, "_archive_stage", lambda batches, partition: batches)
+    monkeypatch.setattr(ingest, "upload_docs", upload)
+    monkeypatch.setattr(ingest, "_open_embedding_cache", lambda: None)
+    monkeypatch.setattr(ingest, "_open_deduper", lambda: None)
+    produced = {}
+
+    summary = ingest._run_streaming([BlobInfo("t/items.csv", "1", "t")], produced, queue_depth=1)
+
+    assert summary.failed == 8 and summary.succeeded > 0
+    assert "t/items.csv" not in produced
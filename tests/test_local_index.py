@@ -0,0 +1,122 @@
+import asyncio
+import io
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from src.local_index import LocalVectorIndex
+from src.search_backend import FallbackSearchBackend, LocalSearchBackend, SearchBackend
+from src.search_index import _odata_filter
+
+# --- Helpers -----------------------------------------------------------------
+
+def make_index(n: int = 200, dim: int = 16, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vecs = rng.normal(size=(n, dim)).astype(np.float32)
+    meta = [{"fileName": f"f{i % 10}.pdf", "chunkId": f"f{i % 10}.pdf::chunk::{i}",
+             "docType": "pdf" if i % 2 else "txt"} for i in range(n)]
+    return LocalVectorIndex([f"id{i}" for i in range(n)], vecs, meta), vecs, meta
+
+def brute_force(vecs, q, k):
+    sims = (vecs @ q) / (np.linalg.norm(vecs, axis=1) * np.linalg.norm(q))
+    return [f"id{i}" for i in np.argsort(-sims)[:k]]
+
+class FailingBackend(SearchBackend):
+    name = "broken"
+
+    async def asearch(self, query, query_vector, top_k=5, filters=None):
+        raise ConnectionError("down")
+
+class SlowBackend(SearchBackend):
+    name = "slow"
+
+    async def asearch(self, query, query_vector, top_k=5, filters=None):
+        await asyncio.sleep(1)
+        return [{"chunkId": "remote"}]
+
+# --- Tests for LocalVectorIndex ----------------------------------------------
+
+def test_top_k_matches_exact_cosine_ranking():
+    index, vecs, _ = make_index()
+    q = np.random.default_rng(1).normal(size=16).astype(np.float32)
+
+    hits = index.search(q, top_k=7)
+    assert [h["id"] for h in hits] == brute_force(vecs, q, 7)
+    assert all(a["score"] >= b["score"] for a, b in zip(hits, hits[1:]))
+
+def test_filters_restrict_candidates():
+    index, vecs, meta = make_index()
+    q = vecs[3]
+
+    hits = index.search(q, top_k=50, filters={"docType": "pdf", "fileName": ["f3.pdf", "f5.pdf"]})
+    assert hits and all(h["docType"] == "pdf" and h["fileName"] in ("f3.pdf", "f5.pdf") for h in hits)
+    assert hits[0]["id"] == "id3"
+    assert len(hits) == 40
+    assert index.search(q, filters={"docType": "xlsx"}) == []
+    with pytest.raises(ValueError):
+        index.search(q, filters={"content": "x"})
+
+def test_loads_npz_snapshot_and_last_part_wins():
+    _, vecs, meta = make_index(n=4, dim=3)
+    buf = io.BytesIO()
+    np.savez_compressed(buf, ids=np.array(["a", "b", "c", "d"]), vectors=vecs,
+                        meta=np.array([json.dumps(m) for m in meta], dtype=object))
+    buf.seek(0)
+    with np.load(buf, allow_pickle=True) as npz:
+        first = LocalVectorIndex.from_npz_arrays({k: npz[k] for k in ("ids", "vectors", "meta")})
+
+    newer = LocalVectorIndex(["b"], [[0.0, 0.0, 1.0]], [{"chunkId": "new-b"}])
+    index = LocalVectorIndex.concat([first, newer])
+
+    assert len(index) == 4
+    assert index.search([0.0, 0.0, 1.0], top_k=1)[0]["chunkId"] == "new-b"
+
+def test_upsert_and_delete():
+    index = LocalVectorIndex([], np.zeros((0, 0)))
+    chunk = {"id": "x", "chunkId": "s::chunk::0", "content": "hello", "vector": [1.0, 0.0],
+             "metadata": {"source": "s", "type": "txt"}}
+    backend = LocalSearchBackend(index)
+
+    assert backend.upload([chunk, dict(chunk, id="y", vector=[0.0, 1.0])]).succeeded == 2
+    assert backend.search("", [0.1, 1.0], top_k=1)[0]["id"] == "y"
+    assert backend.search("", [1.0, 0.0], top_k=1)[0]["snippet"] == "hello"
+    backend.delete(["y", "missing"])
+    assert [h["id"] for h in backend.search("", [0.1, 1.0], top_k=5)] == ["x"]
+
+# --- Tests for backends ------------------------------------------------------
+
+def test_fallback_answers_locally_on_error_and_timeout():
+    index, vecs, _ = make_index(n=20, dim=4)
+    local = LocalSearchBackend(index)
+
+    for primary in (FailingBackend(), SlowBackend()):
+        backend = FallbackSearchBackend(primary, local, timeout=0.05)
+        hits = asyncio.run(backend.asearch("q", vecs[0], top_k=3))
+        assert hits[0]["id"] == "id0"
+        assert backend.fallbacks == 1
+
+def test_large_local_index_is_searched_off_the_event_loop(monkeypatch):
+    index, vecs, _ = make_index(n=20, dim=4)
+    backend = LocalSearchBackend(index)
+    threads = []
+    search = backend.search
+    monkeypatch.setattr(backend, "search", lambda *a: threads.append(threading.get_ident()) or search(*a))
+
+    async def run():
+        await backend.asearch("q", vecs[0])
+        backend.inline_rows = 10
+        await backend.asearch("q", vecs[0])
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads[0] == loop_thread and threads[1] != loop_thread
+
+def test_odata_filter():
+    assert _odata_filter(None) is None
+    assert _odata_filter({"docType": "pdf"}) == "docType eq 'pdf'"
+    assert _odata_filter({"fileName": ["a'b.pdf", "c.pdf"], "docType": "pdf"}) == \
+        "(fileName eq 'a''b.pdf' or fileName eq 'c.pdf') and docType eq 'pdf'"
+    with pytest.raises(ValueError):
+        _odata_filter({"content": "x"})
@@ -0,0 +1,44 @@
+from src.manifest import BlobInfo, BlobManifest
+from src.ingest import _chunk_key, _to_chunks_for_index
+
+# --- Tests for BlobManifest --------------------------------------------------
+
+def test_manifest_diff_finds_new_changed_and_removed():
+    m = BlobManifest()
+    m.record(BlobInfo("docs/a.pdf", "e1", "2024-01-01T00:00:00"), ["a1", "a2"])
+    m.record(BlobInfo("docs/b.pdf", "e1", "2024-01-01T00:00:00"), ["b1"])
+    m.record(BlobInfo("other/c.pdf", "e1", "2024-01-01T00:00:00"), ["c1"])
+
+    listing = [
+        BlobInfo("docs/a.pdf", "e1", "2024-01-01T00:00:00"),   # unchanged
+        BlobInfo("docs/new.txt", "e9", "2024-02-01T00:00:00"),  # new
+    ]
+    changed, removed = m.diff(listing, prefix="docs/")
+
+    assert [b.name for b in changed] == ["docs/new.txt"]
+    # other/c.pdf is outside the prefix, so it is not considered removed
+    assert removed == ["docs/b.pdf"]
+
+def test_manifest_record_returns_orphaned_ids():
+    m = BlobManifest()
+    blob = BlobInfo("a.txt", "e1", "t1")
+    assert m.record(blob, ["x", "y", "z"]) == []
+
+    changed = BlobInfo("a.txt", "e2", "t2")
+    assert not m.is_current(changed)
+    assert m.record(changed, ["x", "w"]) == ["y", "z"]
+    assert m.is_current(changed)
+    assert m.forget("a.txt") == ["x", "w"]
+    assert m.forget("a.txt") == []
+
+# --- Tests for deterministic chunk keys --------------------------------------
+
+def test_chunk_keys_are_deterministic_and_content_sensitive():
+    docs = [{"page_content": "Hello world. " * 200, "metadata": {"source": "/tmp/ingest_x/blob.txt"}}]
+    first = _to_chunks_for_index(docs, blob_name="docs/hello.txt")
+    second = _to_chunks_for_index(docs, blob_name="docs/hello.txt")
+
+    assert [c["id"] for c in first] == [c["id"] for c in second]
+    assert len({c["id"] for c in first}) == len(first)
+    assert all(c["metadata"]["source"] == "docs/hello.txt" for c in first)
+    assert _chunk_key("docs/hello.txt", 0, "a") != _chunk_key("docs/hello.txt", 0, "b")
@@ -1,7 +1,16 @@
-from src.ocr import image_to_text
-from PIL import Image, ImageDraw, ImageFont
+import os
 from io import BytesIO
 
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+from pypdf import PdfReader, PdfWriter
+
+from src import ocr
+from src.config import settings
+from src.loaders import load_document_bytes
+from src.ocr import image_to_text
+from src.pdf_extract import extract_pdf
+
 def test_ocr_roundtrip():
     img = Image.new("RGB",(300,100),"white")
     d = ImageDraw.Draw(img)
@@ -9,3 +18,70 @@ def test_ocr_roundtrip():
     buf = BytesIO(); img.save(buf, format="PNG")
     text = image_to_text(buf.getvalue())
     assert "Hello" in text
+
+# --- Helpers -----------------------------------------------------------------
+
+@pytest.fixture
+def fake_tesseract(tmp_path, monkeypatch):
+    """Records the images tesseract would see; answers with their size."""
+    seen = []
+    def image_to_string(img, lang="eng"):
+        seen.append(img)
+        return f" text {img.size[0]}x{img.size[1]} \n"
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", image_to_string)
+    monkeypatch.setattr(settings, "OCR_CACHE_DIR", str(tmp_path / "ocr"))
+    return seen
+
+def scan(text="Scanned page", size=(3000, 1200)):
+    img = Image.new("RGB", size, (235, 235, 225))
+    ImageDraw.Draw(img).text((40, 500), text, fill=(30, 30, 40))
+    return img
+
+# --- Tests for preprocessing and the OCR cache -------------------------------
+
+def test_images_are_downscaled_and_binarized(fake_tesseract, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_MAX_SIDE", 1500)
+    buf = BytesIO(); scan().save(buf, format="PNG")
+
+    assert image_to_text(buf.getvalue()) == "text 1500x600"
+    (img,) = fake_tesseract
+    assert img.mode == "L" and set(img.getdata()) == {0, 255}
+
+def test_ocr_results_are_cached_by_content(fake_tesseract):
+    a, b = BytesIO(), BytesIO()
+    scan("one").save(a, format="PNG")
+    scan("two").save(b, format="PNG")
+
+    first = [image_to_text(a.getvalue()), image_to_text(b.getvalue()), image_to_text(a.getvalue())]
+    assert first[0] == first[2] and len(fake_tesseract) == 2
+
+# --- Tests for PDF extraction ------------------------------------------------
+
+def test_scanned_pdf_pages_fall_back_to_ocr(fake_tesseract, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_MAX_SIDE", 1000)
+    buf = BytesIO()
+    scan().save(buf, format="PDF", save_all=True, append_images=[scan("second")])
+
+    docs = load_document_bytes(buf.getvalue(), "scans/contract.pdf")
+
+    assert [d["metadata"] for d in docs] == [{"source": "scans/contract.pdf", "page": i, "ocr": True} for i in (0, 1)]
+    assert all(d["page_content"] == "text 1000x400" for d in docs)
+
+def test_only_scanned_pages_are_ocred_and_page_order_is_kept(fake_tesseract, monkeypatch):
+    sample = PdfReader(os.path.join(os.path.dirname(__file__), "data", "sample.pdf"))
+    scans = BytesIO()
+    scan().save(scans, format="PDF", save_all=True, append_images=[scan(size=(2000, 800)) for _ in range(8)])
+    writer = PdfWriter()
+    for i, scanned in enumerate(PdfReader(scans).pages):
+        writer.add_page(scanned)
+        writer.add_page(sample.pages[0])
+    buf = BytesIO(); writer.write(buf)
+
+    monkeypatch.setattr(settings, "PDF_OCR_WORKERS", 1)
+    serial = extract_pdf(buf.getvalue(), "mixed.pdf")
+    monkeypatch.setattr(settings, "PDF_OCR_WORKERS", 3)
+    parallel = extract_pdf(buf.getvalue(), "mixed.pdf")
+
+    assert parallel == serial and [d["metadata"]["page"] for d in parallel] == list(range(18))
+    assert [bool(d["metadata"].get("ocr")) for d in parallel] == [True, False] * 9
+    assert all(d["page_content"] == "text 2000x800" for d in parallel[::2])
@@ -0,0 +1,62 @@
+import os
+import time
+
+from src.parse_pool import ParsePool, ParseTimeout
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+# --- Helpers -----------------------------------------------------------------
+
+def slow_parse(path: str):
+    """Module-level so worker processes can unpickle it."""
+    if path.endswith("hang.txt"):
+        time.sleep(60)
+    return [{"page_content": open(path, encoding="utf-8").read(), "metadata": {"source": path}}]
+
+# --- Tests -------------------------------------------------------------------
+
+def test_parse_pool_returns_plain_dicts():
+    items = [("txt", os.path.join(DATA, "sample.txt")), ("csv", os.path.join(DATA, "sample.csv"))]
+    with ParsePool(workers=2, large_workers=0) as pool:
+        results = {key: (docs, err) for key, _, docs, err in pool.imap(items)}
+
+    assert set(results) == {"txt", "csv"}
+    for docs, err in results.values():
+        assert err is None
+        assert isinstance(docs, list) and docs
+        assert all(isinstance(d, dict) and set(d) == {"page_content", "metadata"} for d in docs)
+
+def test_parse_pool_times_out_stuck_file_and_keeps_going(tmp_path):
+    hang = tmp_path / "hang.txt"
+    hang.write_text("never returns")
+    ok = [tmp_path / f"ok{i}.txt" for i in range(3)]
+    for p in ok:
+        p.write_text("fine")
+
+    items = [("hang", str(hang))] + [(p.name, str(p)) for p in ok]
+    with ParsePool(workers=2, large_workers=0, timeout=3, parse_fn=slow_parse) as pool:
+        results = {key: (docs, err) for key, _, docs, err in pool.imap(items)}
+
+    assert isinstance(results["hang"][1], ParseTimeout)
+    assert all(results[p.name][0][0]["page_content"] == "fine" for p in ok)
+
+def test_parse_pool_inline_mode(tmp_path):
+    p = tmp_path / "a.txt"
+    p.write_text("inline")
+    with ParsePool(workers=0, parse_fn=slow_parse) as pool:
+        [(key, _, docs, err)] = list(pool.imap([("a", str(p))]))
+    assert key == "a" and err is None and docs[0]["page_content"] == "inline"
+
+def test_parse_pool_closed_early_does_not_wait_for_running_files(tmp_path):
+    hang = tmp_path / "hang.txt"
+    hang.write_text("never returns")
+    ok = tmp_path / "ok.txt"
+    ok.write_text("fine")
+
+    t0 = time.monotonic()
+    with ParsePool(workers=2, large_workers=0, timeout=60, parse_fn=slow_parse) as pool:
+        results = pool.imap([("ok", str(ok)), ("hang", str(hang))])
+        assert next(results)[0] == "ok"
+        results.close()                      # e.g. the streaming pipeline was cancelled
+
+    assert time.monotonic() - t0 < 30
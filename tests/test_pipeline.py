@@ -0,0 +1,63 @@
+import threading
+import pytest
+
+from src.pipeline import run_pipeline
+
+# --- Helpers -----------------------------------------------------------------
+
+def collect_into(out: list):
+    def _sink(items):
+        for it in items:
+            out.append(it)
+            yield it
+    return _sink
+
+# --- Tests -------------------------------------------------------------------
+
+def test_pipeline_runs_stages_in_order():
+    out = []
+    run_pipeline(
+        range(10),
+        [
+            ("double", lambda items: (i * 2 for i in items)),
+            ("sink", collect_into(out)),
+        ],
+        queue_depth=2,
+    )
+    assert out == [i * 2 for i in range(10)]
+
+def test_pipeline_queue_depth_bounds_items_in_flight():
+    produced = []
+    consumed = []
+    gate = threading.Event()
+
+    def source():
+        for i in range(50):
+            produced.append(i)
+            yield i
+
+    def slow_sink(items):
+        gate.wait(timeout=5)
+        for it in items:
+            consumed.append(it)
+            yield it
+
+    t = threading.Thread(target=run_pipeline, args=(source(), [("sink", slow_sink)]), kwargs={"queue_depth": 3})
+    t.start()
+    # give the source time to fill the queue while the sink is blocked
+    t.join(timeout=0.5)
+    # queue holds 3, plus one item blocked in put()
+    assert len(produced) <= 4
+    gate.set()
+    t.join(timeout=5)
+    assert consumed == list(range(50))
+
+def test_pipeline_reraises_stage_error():
+    def boom(items):
+        for it in items:
+            if it == 3:
+                raise ValueError("bad item")
+            yield it
+
+    with pytest.raises(ValueError, match="bad item"):
+        run_pipeline(range(1000), [("boom", boom), ("sink", collect_into([]))], queue_depth=2)
@@ -0,0 +1,101 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src import query_api
+from src.config import settings
+from src.query_cache import QueryEmbeddingCache
+
+# --- Helpers -----------------------------------------------------------------
+
+class FakeAsyncEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.calls = []
+
+    async def asearch(self, query, vector, top_k=5, filters=None):
+        self.calls.append((query, vector, top_k, filters))
+        if query in self.broken:
+            raise RuntimeError("backend down")
+        return [{"fileName": f"{query}.txt", "chunkId": f"{query}-0", "score": vector[0]}]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """TestClient without the lifespan, so no Azure clients are created."""
+    emb = FakeAsyncEmbedder()
+    backend = FakeBackend(broken={"broken query"})
+    monkeypatch.setattr(query_api, "query_cache", QueryEmbeddingCache(lambda t: [], aembed_fn=emb))
+    monkeypatch.setattr(query_api.app.state, "search_backend", backend, raising=False)
+    return TestClient(query_api.app), emb, backend
+
+# --- Tests -------------------------------------------------------------------
+
+def test_batch_results_come_back_in_input_order(api):
+    client, _, backend = api
+    queries = ["alpha", "be", "gamma ray", "d"]
+    r = client.post("/search/batch", json={"queries": queries, "k": 3, "filters": {"docType": ["pdf"]}})
+
+    assert r.status_code == 200
+    body = r.json()
+    assert [b["query"] for b in body] == queries
+    assert [b["results"][0]["chunkId"] for b in body] == [f"{q}-0" for q in queries]
+    assert [b["results"][0]["score"] for b in body] == [float(len(q)) for q in queries]
+    assert all(b["error"] is None for b in body)
+    assert all(c[2] == 3 and c[3] == {"docType": ["pdf"]} for c in backend.calls)
+
+def test_batch_embeds_every_query_in_one_call(api):
+    client, emb, _ = api
+    r = client.post("/search/batch", json={"queries": ["one", "two", "One", "three"]})
+
+    assert r.status_code == 200
+    assert len(emb.calls) == 1
+    assert sorted(emb.calls[0]) == ["one", "three", "two"]
+
+def test_failed_search_sets_error_on_that_query_only(api):
+    client, _, _ = api
+    r = client.post("/search/batch", json={"queries": ["fine", "broken query", "also fine"]})
+
+    assert r.status_code == 200
+    body = r.json()
+    assert body[1]["results"] == []
+    assert "backend down" in body[1]["error"]
+    assert body[0]["error"] is None and body[2]["error"] is None
+    assert body[0]["results"] and body[2]["results"]
+
+def test_failed_embedding_sets_error_on_every_query(api):
+    client, _, _ = api
+
+    async def broken(texts):
+        raise RuntimeError("openai down")
+
+    query_api.query_cache.aembed_fn = broken
+    r = client.post("/search/batch", json={"queries": ["a", "b"]})
+
+    assert r.status_code == 200
+    assert all("openai down" in b["error"] for b in r.json())
+
+def test_too_many_queries_is_rejected(api, monkeypatch):
+    client, emb, backend = api
+    monkeypatch.setattr(settings, "SEARCH_BATCH_MAX_QUERIES", 3)
+    r = client.post("/search/batch", json={"queries": ["a", "b", "c", "d"]})
+
+    assert r.status_code == 422
+    assert emb.calls == [] and backend.calls == []
+
+def test_empty_batch_returns_empty_list(api):
+    client, emb, _ = api
+    r = client.post("/search/batch", json={"queries": []})
+
+    assert r.status_code == 200 and r.json() == []
+    assert emb.calls == []
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from src.query_cache import QueryEmbeddingCache, normalize_query
+
+# --- Helpers -----------------------------------------------------------------
+
+class FakeEmbedder:
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.delay = delay
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        time.sleep(self.delay)
+        return [[float(len(t)), 1.0] for t in texts]
+
+# --- Tests -------------------------------------------------------------------
+
+def test_normalize_query_collapses_case_and_whitespace():
+    assert normalize_query("  Vendor   CONTRACT\ttermination ") == "vendor contract termination"
+
+def test_cache_hits_skip_embedder():
+    emb = FakeEmbedder()
+    cache = QueryEmbeddingCache(emb)
+    v1 = cache.get("Termination clause")
+    v2 = cache.get("termination   clause")
+
+    assert v1 == v2
+    assert len(emb.calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_cache_entries_expire_after_ttl():
+    now = [0.0]
+    emb = FakeEmbedder()
+    cache = QueryEmbeddingCache(emb, ttl_seconds=10, clock=lambda: now[0])
+    cache.get("q")
+    now[0] = 11
+    cache.get("q")
+    assert len(emb.calls) == 2
+
+def test_cache_evicts_least_recently_used():
+    emb = FakeEmbedder()
+    cache = QueryEmbeddingCache(emb, max_entries=2)
+    cache.get("a"); cache.get("b"); cache.get("a"); cache.get("c")
+    assert cache.stats()["entries"] == 2
+    cache.get("a")           # still cached
+    cache.get("b")           # was evicted
+    assert [c[0] for c in emb.calls] == ["a", "b", "c", "b"]
+
+def test_concurrent_identical_queries_share_one_call():
+    emb = FakeEmbedder(delay=0.2)
+    cache = QueryEmbeddingCache(emb)
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(cache.get("same query"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(emb.calls) == 1
+    assert len(out) == 8 and all(v == out[0] for v in out)
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] + stats["hits"] == 7
+
+def test_failed_embedding_is_not_cached():
+    calls = []
+
+    def flaky(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return [[1.0]]
+
+    cache = QueryEmbeddingCache(flaky)
+    with pytest.raises(RuntimeError):
+        cache.get("q")
+    assert cache.get("q") == [1.0]
+
+def test_async_identical_queries_share_one_call():
+    calls = []
+
+    async def aembed(texts):
+        calls.append(list(texts))
+        await asyncio.sleep(0.05)
+        return [[float(len(t))] for t in texts]
+
+    cache = QueryEmbeddingCache(lambda texts: pytest.fail("sync path used"), aembed_fn=aembed)
+
+    async def burst():
+        return await asyncio.gather(*(cache.aget("Same  Query") for _ in range(10)))
+
+    out = asyncio.run(burst())
+    assert calls == [["Same  Query"]]
+    assert all(v == [11.0] for v in out)
+    assert cache.stats()["coalesced"] == 9
+
+def test_aget_many_embeds_all_misses_in_one_call():
+    calls = []
+
+    async def aembed(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    cache = QueryEmbeddingCache(FakeEmbedder(), aembed_fn=aembed)
+
+    async def run():
+        await cache.aget("b")
+        return await cache.aget_many(["aaa", "b", "AAA", "cc"])
+
+    out = asyncio.run(run())
+    # "b" was cached, "AAA" normalizes to "aaa": one call for the two new keys
+    assert calls == [["b"], ["aaa", "cc"]]
+    assert out == [[3.0], [1.0], [3.0], [2.0]]
+
+def test_embedder_gets_the_query_as_typed():
+    emb = FakeEmbedder()
+    calls = []
+
+    async def aembed(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    cache = QueryEmbeddingCache(emb, aembed_fn=aembed)
+    cache.get("Azure  Straße SLA")
+    assert cache.get("azure strasse sla") == [17.0, 1.0]     # same key, no second call
+    assert emb.calls == [["Azure  Straße SLA"]]
+
+    asyncio.run(cache.aget_many(["Vendor  Terms", "vendor terms", "Other"]))
+    assert calls == [["Vendor  Terms", "Other"]]
+
+def test_cancelled_leader_does_not_fail_the_other_callers():
+    calls = []
+
+    async def aembed(texts):
+        calls.append(list(texts))
+        await asyncio.sleep(0.05)
+        return [[float(len(t))] for t in texts]
+
+    cache = QueryEmbeddingCache(FakeEmbedder(), aembed_fn=aembed)
+
+    async def run():
+        leader = asyncio.ensure_future(cache.aget("same"))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.aget("same"))
+        await asyncio.sleep(0.01)
+        leader.cancel()                                   # e.g. the client disconnected
+        return await follower, leader.cancelled()
+
+    assert asyncio.run(run()) == ([4.0], True)
+    assert calls == [["same"]]
+
+def test_short_embedding_response_fails_instead_of_hanging():
+    async def short(texts):
+        return [[1.0]]
+
+    cache = QueryEmbeddingCache(FakeEmbedder(), aembed_fn=short)
+
+    async def run():
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(cache.aget_many(["a", "b"]), 1)
+        return await asyncio.wait_for(cache.aget("b"), 1)    # not stuck in flight
+
+    assert asyncio.run(run()) == [1.0]
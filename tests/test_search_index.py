@@ -1,4 +1,15 @@
-from src.search_index import ensure_index
+import re
+import threading
+import types
+
+import pytest
+from azure.core.exceptions import ResourceNotFoundError, ServiceResponseError
+
+import src.search_index as search_index
+from src import index_versions
+from src.chunk_batch import ChunkBatch
+from src.config import settings
+from src.search_index import ensure_index, upload_docs
 
 def test_index_create_idempotent():
     # This will pass if env not set; just ensure no exceptions raised when missing creds
@@ -7,3 +18,180 @@ def test_index_create_idempotent():
     except Exception:
         # acceptable in CI without Azure creds
         assert True
+
+# --- Tests for upload_docs ----------------------------------------------------
+
+def make_chunk(i: int, dim: int = 8):
+    return {"id": f"k{i}", "chunkId": f"src::chunk::{i}", "content": f"text {i}",
+            "vector": [0.1] * dim, "metadata": {"source": "src", "type": "txt"}}
+
+class FakeSearchClient:
+    """Records upload requests; documents listed in `flaky` fail once with a 503."""
+
+    def __init__(self, flaky=(), broken=()):
+        self.requests = []
+        self.flaky = set(flaky)
+        self.broken = set(broken)
+        self._lock = threading.Lock()
+
+    def upload_documents(self, docs):
+        with self._lock:
+            self.requests.append([d["id"] for d in docs])
+            out = []
+            for d in docs:
+                if d["id"] in self.flaky:
+                    self.flaky.discard(d["id"])
+                    out.append(types.SimpleNamespace(key=d["id"], succeeded=False, status_code=503, error_message="busy"))
+                elif d["id"] in self.broken:
+                    out.append(types.SimpleNamespace(key=d["id"], succeeded=False, status_code=400, error_message="bad"))
+                else:
+                    out.append(types.SimpleNamespace(key=d["id"], succeeded=True, status_code=201, error_message=None))
+            return out
+
+    merge_or_upload_documents = upload_documents
+
+def test_upload_docs_sizes_batches_by_bytes(monkeypatch):
+    fake = FakeSearchClient()
+    monkeypatch.setattr(search_index, "get_search_client", lambda *a: fake)
+    one_doc = search_index._estimate_doc_bytes(search_index._to_search_doc(make_chunk(0, dim=1536)))
+
+    summary = upload_docs([make_chunk(i, dim=1536) for i in range(20)], max_batch_bytes=one_doc * 5 + 1)
+
+    assert summary.succeeded == 20
+    assert all(len(r) <= 5 for r in fake.requests)
+    assert sorted(k for r in fake.requests for k in r) == sorted(f"k{i}" for i in range(20))
+
+def test_upload_docs_takes_a_stream_of_chunk_batches(monkeypatch):
+    fake = FakeSearchClient()
+    monkeypatch.setattr(search_index, "get_search_client", lambda *a: fake)
+    batches = (ChunkBatch.from_chunks([make_chunk(i) for i in range(j, j + 3)]) for j in range(0, 9, 3))
+
+    summary = upload_docs(batches)
+
+    assert summary.succeeded == 9
+    assert sorted(k for r in fake.requests for k in r) == sorted(f"k{i}" for i in range(9))
+
+def test_upload_docs_retries_only_failed_keys(monkeypatch):
+    fake = FakeSearchClient(flaky={"k3", "k7"}, broken={"k9"})
+    monkeypatch.setattr(search_index, "get_search_client", lambda *a: fake)
+    monkeypatch.setattr(search_index, "_backoff", lambda attempt: 0)
+
+    summary = upload_docs([make_chunk(i) for i in range(10)], max_workers=2)
+
+    assert (summary.succeeded, summary.retried, summary.failed) == (9, 2, 1)
+    assert summary.failed_keys == ["k9"]
+    assert sorted(fake.requests[-1]) == ["k3", "k7"]
+
+def test_upload_docs_counts_failed_requests_instead_of_raising(monkeypatch):
+    fake = FakeSearchClient()
+    calls = []
+
+    def send(docs):
+        calls.append(docs[0]["id"])
+        if docs[0]["id"] == "k0" and calls.count("k0") == 1:
+            raise ServiceResponseError("connection dropped mid-response")
+        if docs[0]["id"] == "k2":
+            raise KeyError("bug in the client")
+        return fake.upload_documents(docs)
+
+    monkeypatch.setattr(search_index, "get_search_client", lambda *a: types.SimpleNamespace(upload_documents=send))
+    monkeypatch.setattr(search_index, "_backoff", lambda attempt: 0)
+    one_doc = search_index._estimate_doc_bytes(search_index._to_search_doc(make_chunk(0)))
+
+    summary = upload_docs([make_chunk(i) for i in range(4)], max_batch_bytes=one_doc + 1)
+
+    assert (summary.succeeded, summary.retried, summary.failed) == (3, 1, 1)
+    assert summary.failed_keys == ["k2"]
+
+def test_delete_docs_retries_failed_documents(monkeypatch):
+    fake = FakeSearchClient(flaky={"k1"}, broken={"k2"})
+    fake.delete_documents = fake.upload_documents
+    monkeypatch.setattr(search_index, "get_search_client", lambda *a: fake)
+    monkeypatch.setattr(search_index, "_backoff", lambda attempt: 0)
+
+    summary = search_index.delete_docs(["k0", "k1", "k2"])
+
+    assert (summary.succeeded, summary.failed, summary.failed_keys) == (2, 1, ["k2"])
+    assert fake.requests == [["k0", "k1", "k2"], ["k1"]]
+
+# --- Tests for blue/green index versions ----------------------------------------
+
+class FakeIndexClient:
+    """Indexes with document counts and aliases, like the service's index management API."""
+
+    def __init__(self, counts):
+        self.counts = dict(counts)
+        self.aliases = {}
+
+    def list_index_names(self):
+        return list(self.counts)
+
+    def get_index(self, name):
+        if name not in self.counts:
+            raise ResourceNotFoundError(name)
+        return types.SimpleNamespace(name=name)
+
+    def get_alias(self, name):
+        if name not in self.aliases:
+            raise ResourceNotFoundError(name)
+        return types.SimpleNamespace(name=name, indexes=[self.aliases[name]])
+
+    def create_or_update_alias(self, alias):
+        assert alias.name not in self.counts            # the service rejects alias/index name clashes
+        self.aliases[alias.name] = alias.indexes[0]
+
+    def delete_index(self, name):
+        del self.counts[name]
+
+@pytest.fixture
+def indexes(monkeypatch):
+    fake = FakeIndexClient({"docs-index": 100})
+    monkeypatch.setattr(index_versions, "INDEX_NAME", "docs-index")
+    monkeypatch.setattr(index_versions, "_VERSION", re.compile(r"^docs-index-v(\d+)$"))
+    monkeypatch.setattr(index_versions, "get_index_client", lambda: fake)
+    monkeypatch.setattr(index_versions, "ensure_index", lambda name: fake.counts.setdefault(name, 0))
+    monkeypatch.setattr(index_versions, "document_count", lambda name: fake.counts[name])
+    monkeypatch.setattr(settings, "SEARCH_SWAP_COUNT_TIMEOUT_SECONDS", 0)
+    return fake
+
+def test_promote_switches_alias_from_the_original_index(indexes):
+    v1 = index_versions.create_next_version()
+    indexes.counts[v1] = 95
+
+    assert index_versions.promote(v1, expected=95) is None
+    assert indexes.aliases == {"docs-index": "docs-index-v1"} and "docs-index" not in indexes.counts
+    assert index_versions.live_index() == "docs-index-v1"
+
+def test_incomplete_version_is_not_promoted(indexes):
+    indexes.aliases["docs-index"] = "docs-index-v1"
+    indexes.counts.update({"docs-index-v1": 100})
+    del indexes.counts["docs-index"]
+    v2 = index_versions.create_next_version()
+
+    indexes.counts[v2] = 40
+    with pytest.raises(index_versions.PromotionError):
+        index_versions.promote(v2, expected=50)               # uploads not all visible
+    with pytest.raises(index_versions.PromotionError):
+        index_versions.promote(v2, expected=40)               # far smaller than the live index
+    assert index_versions.live_index() == "docs-index-v1"
+    assert index_versions.promote(v2, force=True) == "docs-index-v1"
+
+def test_gc_keeps_live_and_previous_versions(indexes, monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_KEEP_VERSIONS", 2)
+    del indexes.counts["docs-index"]
+    indexes.counts.update({f"docs-index-v{i}": 10 for i in (1, 2, 3, 4, 10)})
+    indexes.aliases["docs-index"] = "docs-index-v4"
+
+    assert index_versions.gc_versions() == ["docs-index-v1", "docs-index-v2"]
+    assert index_versions.list_versions() == ["docs-index-v3", "docs-index-v4", "docs-index-v10"]   # v10 is newer
+
+def test_discard_version_deletes_a_failed_build_but_never_the_live_index(indexes):
+    indexes.aliases["docs-index"] = "docs-index-v1"
+    indexes.counts.update({"docs-index-v1": 100})
+    del indexes.counts["docs-index"]
+    v2 = index_versions.create_next_version()
+
+    index_versions.discard_version(v2)
+    index_versions.discard_version("docs-index-v1")
+
+    assert index_versions.list_versions() == ["docs-index-v1"]
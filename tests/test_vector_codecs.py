@@ -0,0 +1,143 @@
+import base64
+import io
+import types
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from src import archive_store, vector_codecs
+from src.archive_store import decode_vector_b64, read_npz, read_vector_table, to_vector_table
+from src.local_index import LocalVectorIndex, normalize_rows
+
+# --- Helpers -----------------------------------------------------------------
+
+def unit_vectors(n: int = 600, dim: int = 64, seed: int = 0):
+    return normalize_rows(np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32))
+
+def make_chunks(vecs):
+    return [{"id": f"id{i}", "chunkId": f"s::chunk::{i}", "content": f"text {i}", "vector": v.tolist(),
+             "metadata": {"source": "s.txt", "type": "txt"}} for i, v in enumerate(vecs)]
+
+def stored_bytes(arrays):
+    return sum(a.nbytes for k, a in arrays.items() if k != "codebook")
+
+# --- Tests for codecs --------------------------------------------------------
+
+@pytest.mark.parametrize("codec,max_err,min_ratio", [
+    ("float32", 0.0, 1), ("float16", 1e-3, 2), ("int8", 1e-2, 3.7), ("pq", 0.9, 30),
+])
+def test_encode_decode_roundtrip(codec, max_err, min_ratio):
+    vecs = unit_vectors()
+    enc = vector_codecs.encode(vecs, codec)
+    dec = vector_codecs.decode(enc, codec)
+
+    assert dec.shape == vecs.shape and dec.dtype == np.float32
+    assert np.abs(dec - vecs).max() <= max_err + 1e-6
+    assert vecs.nbytes / stored_bytes(enc) >= min_ratio
+    q = vecs[0]
+    assert np.allclose(vector_codecs.approx_scores(q, enc, codec), dec @ q, atol=1e-4)
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        vector_codecs.encode(unit_vectors(4), "bf16")
+
+# --- Tests for archive snapshots ---------------------------------------------
+
+@pytest.mark.parametrize("codec", vector_codecs.CODECS)
+def test_parquet_snapshot_roundtrip_each_codec(codec):
+    vecs = unit_vectors(300, 32)
+    buf = io.BytesIO()
+    pq.write_table(to_vector_table(make_chunks(vecs), codec=codec), buf)
+
+    table, dec = read_vector_table(buf.getvalue())
+    assert "vector" not in table.column_names and table.num_rows == 300
+    assert dec.shape == vecs.shape and dec.dtype == np.float32
+    tol = {"float32": 0, "float16": 1e-3, "int8": 2e-2, "pq": 1.0}[codec]
+    assert np.abs(dec - vecs).max() <= tol + 1e-6
+
+    _, raw = read_vector_table(buf.getvalue(), decode=False)
+    assert raw.dtype == {"float32": np.float32, "float16": np.float16, "int8": np.int8, "pq": np.uint8}[codec]
+
+def test_float32_vectors_are_zero_copy_and_projection_skips_them():
+    vecs = unit_vectors(50, 16)
+    buf = io.BytesIO()
+    pq.write_table(to_vector_table(make_chunks(vecs), codec="float32"), buf)
+
+    _, view = read_vector_table(buf.getvalue(), columns=["id", "vector"])
+    assert not view.flags.writeable and not view.flags.owndata   # a view on the Arrow buffer
+    assert np.array_equal(view, vecs)
+
+    table, none = read_vector_table(buf.getvalue(), columns=["id", "chunkId"])
+    assert none is None and table.column_names == ["id", "chunkId"]
+
+def test_reads_older_base64_snapshots():
+    vecs = unit_vectors(5, 8)
+    df = pd.DataFrame({"id": list("abcde"),
+                       "vector_b64": [base64.b64encode(v.tobytes()).decode() for v in vecs]})
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+
+    table, dec = read_vector_table(buf.getvalue())
+    assert np.array_equal(dec, vecs)
+    assert np.array_equal(decode_vector_b64(df["vector_b64"][2]), vecs[2])
+
+def test_npz_records_codec_and_reads_old_snapshots():
+    vecs = unit_vectors(10, 8)
+    buf = io.BytesIO()
+    np.savez_compressed(buf, ids=np.array(["a"] * 10), meta=np.array(["{}"] * 10, dtype=object),
+                        codec=np.array("int8"), **vector_codecs.encode(vecs, "int8"))
+    arrays = read_npz(buf.getvalue())
+    assert arrays["codec"] == "int8" and arrays["codes"].dtype == np.int8
+    assert np.abs(arrays["vectors"] - vecs).max() < 2e-2
+
+    old = io.BytesIO()
+    np.savez_compressed(old, ids=np.array(["a"] * 10), vectors=vecs, meta=np.array(["{}"] * 10, dtype=object))
+    arrays = read_npz(old.getvalue())
+    assert arrays["codec"] == "float32" and np.array_equal(arrays["vectors"], vecs)
+
+# --- Tests for compressed search with rescoring -------------------------------
+
+def test_rescoring_recovers_recall_on_pq_codes():
+    vecs = unit_vectors(2000, 64)
+    exact = LocalVectorIndex([f"id{i}" for i in range(len(vecs))], vecs)
+    queries = unit_vectors(30, 64, seed=1)
+    truth = [{h["id"] for h in exact.search(q, 10)} for q in queries]
+
+    def recall(rescore):
+        index = LocalVectorIndex([f"id{i}" for i in range(len(vecs))], vecs).compress("pq", rescore=rescore)
+        return np.mean([len({h["id"] for h in index.search(q, 10)} & t) / 10 for q, t in zip(queries, truth)])
+
+    assert recall(1) < recall(10)
+    assert recall(10) >= 0.9
+
+def test_metadata_projection_downloads_only_the_needed_ranges(monkeypatch):
+    vecs = unit_vectors(2000, 256)
+    buf = io.BytesIO()
+    pq.write_table(to_vector_table(make_chunks(vecs), codec="float32"), buf)
+    data = buf.getvalue()
+    fetched = []
+
+    class FakeDownload:
+        def __init__(self, chunk):
+            self.chunk = chunk
+
+        def readall(self):
+            return self.chunk
+
+    class FakeBlob:
+        def get_blob_properties(self):
+            return types.SimpleNamespace(size=len(data))
+
+        def download_blob(self, offset=0, length=None):
+            chunk = data[offset:None if length is None else offset + length]
+            fetched.append(len(chunk))
+            return FakeDownload(chunk)
+
+    container = types.SimpleNamespace(get_blob_client=lambda name: FakeBlob())
+    monkeypatch.setattr(archive_store, "get_container_client", lambda *a: container)
+
+    df = archive_store.load_parquet_from_blob("p/vectors.parquet", columns=["id", "chunkId"])
+    assert df["id"].tolist()[:2] == ["id0", "id1"]
+    assert sum(fetched) < vecs.nbytes / 10